@@ -26,3 +26,31 @@ PPO_PARAMS = {
 
 # 默认训练步数（可在主流程按实验需要覆盖）
 TOTAL_TIMESTEPS = 50000
+
+# 训练采样的并行环境数与后端（dummy / subprocess / native），n_steps 与 batch_size 会按环境数换算
+N_ENVS = 1
+ENV_BACKEND = "dummy"
+
+# 训练期异步验证：从训练窗口末尾切出 validation_days 个交易日作为验证集（0 表示关闭）
+EVAL_PARAMS = {
+    "validation_days": 0,
+    "eval_freq": 10000,         # 每隔多少环境步评估一次权重快照
+    "patience": None,           # 连续多少次评估夏普无提升即提前停止；None 表示不早停
+    "min_delta": 0.0,           # 夏普提升不超过该值视为无提升
+    "max_drawdown": None,       # 验证最大回撤超过该值（如 0.5）视为发散并停止
+    "use_best": True,           # 训练结束后载入验证夏普最高的 checkpoint
+}
+
+# 种群训练（PBT）：种群成员并行训练，每 ready_steps 步在验证窗口上评估一次，
+# 排名后 exploit_quantile 的成员复制前 exploit_quantile 成员的权重，并扰动 perturb_keys 中的超参数
+PBT_PARAMS = {
+    "validation_days": 252,     # EVAL_PARAMS 未切验证集时，PBT 自行从训练窗口末尾切出的交易日数
+    "ready_steps": 10000,       # 每代训练步数；总步数仍为 TOTAL_TIMESTEPS
+    "exploit_quantile": 0.25,
+    "perturb_factors": (0.8, 1.2),
+    "perturb_keys": {           # 参数 -> 扰动后的取值范围
+        "learning_rate": (1e-6, 1e-2),
+        "ent_coef": (1e-5, 0.1),
+        "clip_range": (0.05, 0.4),
+    },
+}
@@ -7,6 +7,13 @@ BASE_DIR = r"D:/AAA_Petercjk/RL_Quant_Trading"
 DATA_RAW_DIR = os.path.join(BASE_DIR, "data", "raw")
 DATA_PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
 
+# 环境行情张量缓存（按数据与指标配置哈希分目录）
+ENV_CACHE_DIR = os.path.join(DATA_PROCESSED_DIR, "env_cache")
+
+# 回测明细表（actions / trades / positions / account）的输出格式："csv" 或 "parquet"（zstd 压缩，需 pyarrow）
+# 下游脚本均改用 read_backtest_table 读取后再切换为 parquet
+BACKTEST_TABLE_FORMAT = "csv"
+
 DATA_PATH = {
     "raw": os.path.join(DATA_RAW_DIR, "40_pool.csv"),
     "processed": os.path.join(DATA_PROCESSED_DIR, "processed_40_pool.csv"),
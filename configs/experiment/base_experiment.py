@@ -63,6 +63,24 @@ def init_base_experiment(hyperparams_dict=None):
         print(f"INFO: 检测到同名文件夹，将沿用当前目录进行调试: {EXP_DIR}")
 
 
+def resume_experiment(exp_dir):
+    """
+    续跑：将 EXP_DIR / EXP_PATHS 指向已有实验目录。
+    EXP_PATHS 原地更新，其他模块已导入的引用同步生效。
+    """
+    global EXP_NAME, EXP_DIR
+    EXP_DIR = os.path.abspath(exp_dir)
+    EXP_NAME = os.path.basename(EXP_DIR)
+    EXP_PATHS.update(
+        {
+            "root": EXP_DIR,
+            "model": os.path.join(EXP_DIR, "checkpoints"),
+            "log": os.path.join(EXP_DIR, "logs"),
+            "plot": os.path.join(EXP_DIR, "plots"),
+            "table": os.path.join(EXP_DIR, "tables"),
+        }
+    )
+
 
 def finalize_experiment(account_value_df, stats):
     # 将最终回测指标写入 Markdown
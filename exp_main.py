@@ -1,4 +1,5 @@
-﻿import os
+﻿import argparse
+import os
 import sys
 import numpy as np
 import pandas as pd
@@ -7,8 +8,9 @@ import torch
 import time
 import shutil
 from datetime import datetime
-from configs.agent.ppo import PPO_PARAMS
-from configs.base_config import DATA_PATH, TIME_WINDOW, TECHNICAL_INDICATORS
+from stable_baselines3 import PPO
+from configs.agent.ppo import EVAL_PARAMS, PBT_PARAMS, PPO_PARAMS, TOTAL_TIMESTEPS
+from configs.base_config import DATA_PATH, TIME_WINDOW, ENV_CACHE_DIR, TECHNICAL_INDICATORS
 from src.envs.env_stocktrading import StockTradingEnv
 
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -23,132 +25,20 @@ from configs.experiment.base_experiment import (
     init_base_experiment,
     finalize_experiment,
     plot_comparison,
+    resume_experiment,
 )
+from src.training.backtest_records import read_backtest_table
+from src.training.benchmarks import build_equal_weight_benchmark, build_topk_momentum_benchmark
+from src.training.evaluation import split_validation_window
+from src.training.manifest import RunManifest
+from src.training.parallel import run_with_retries
+from src.training.pbt import run_pbt
 from src.training.train_agent import AgentTrainer
 
-
-def _prepare_price_pivot(trade_df: pd.DataFrame) -> pd.DataFrame:
-    """将长表行情转换为 date x ticker 的收盘价矩阵。"""
-    pivot = trade_df.pivot(index="date", columns="tic", values="close").sort_index()
-    return pivot
-
-
-def build_equal_weight_benchmark(
-    trade_df: pd.DataFrame,
-    initial_amount: float = 10_000,
-    rebalance_window: int = 5,  #对齐5日调仓频率
-    buy_cost_pct: float = 0.001,
-    sell_cost_pct: float = 0.001,
-):
-    """Benchmark1：全股票等权 + 每5日再平衡 + 双边手续费。"""
-    price_pivot = _prepare_price_pivot(trade_df)
-    if price_pivot.empty:
-        empty = pd.DataFrame(columns=["date", "account_value"])
-        return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
-
-    daily_ret = price_pivot.pct_change().fillna(0.0)
-    n_assets = price_pivot.shape[1]
-    target_w = np.full(n_assets, 1.0 / n_assets, dtype=np.float64)
-
-    nav = float(initial_amount)
-    weights = np.zeros(n_assets, dtype=np.float64)
-    turnover_sum = 0.0
-    total_fee_amount = 0.0
-    rows = [{"date": price_pivot.index[0], "account_value": nav}]
-
-    for i in range(1, len(price_pivot.index)):
-        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-        nav *= 1.0 + float(np.dot(weights, r))
-
-        # 每日股价变动导致权重漂移
-        gross_weights = weights * (1.0 + r)
-        gross_sum = float(np.sum(gross_weights))
-        drift_w = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-        weights = drift_w
-
-        # 修改核心：仅在 rebalance_window 的倍数日进行再平衡操作
-        if i % rebalance_window == 0:
-            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
-            fee_amount = nav * fee_ratio
-            nav *= max(0.0, 1.0 - fee_ratio)
-
-            turnover_sum += buy_turnover + sell_turnover
-            total_fee_amount += fee_amount
-            weights = target_w.copy()
-
-        rows.append({"date": price_pivot.index[i], "account_value": nav})
-
-    stats = {
-        "turnover_ratio": turnover_sum,
-        "cost_ratio": total_fee_amount / float(initial_amount),
-    }
-    return pd.DataFrame(rows), stats
-
-
-def build_topk_momentum_benchmark(
-    trade_df: pd.DataFrame,
-    initial_amount: float = 10_000,
-    top_k: int = 5,
-    rebalance_window: int = 5,
-    momentum_window: int = 20,
-    buy_cost_pct: float = 0.001,
-    sell_cost_pct: float = 0.001,
-):
-    """Benchmark2：Top-K动量 + 每5日调仓 + 双边手续费。"""
-    price_pivot = _prepare_price_pivot(trade_df)
-    if price_pivot.empty:
-        empty = pd.DataFrame(columns=["date", "account_value"])
-        return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
-
-    daily_ret = price_pivot.pct_change().fillna(0.0)
-    close_np = price_pivot.to_numpy(dtype=np.float64)
-    n_assets = close_np.shape[1]
-    top_k = int(max(1, min(top_k, n_assets)))
-
-    nav = float(initial_amount)
-    weights = np.zeros(n_assets, dtype=np.float64)
-    turnover_sum = 0.0
-    total_fee_amount = 0.0
-    rows = [{"date": price_pivot.index[0], "account_value": nav}]
-
-    for i in range(1, len(price_pivot.index)):
-        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-        nav *= 1.0 + float(np.dot(weights, r))
-
-        gross_weights = weights * (1.0 + r)
-        gross_sum = float(np.sum(gross_weights))
-        drift_w = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-        weights = drift_w
-
-        # 每 rebalance_window 天调仓一次，使用到 t-1 为止可见信息打分
-        if i % rebalance_window == 0:
-            lookback_end = i - 1
-            lookback_start = max(0, lookback_end - momentum_window)
-            momentum = close_np[lookback_end] / np.maximum(close_np[lookback_start], 1e-8) - 1.0
-
-            select_idx = np.argsort(momentum)[::-1][:top_k]
-            target_w = np.zeros(n_assets, dtype=np.float64)
-            target_w[select_idx] = 1.0 / float(top_k)
-
-            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
-            fee_amount = nav * fee_ratio
-            nav *= max(0.0, 1.0 - fee_ratio)
-
-            turnover_sum += buy_turnover + sell_turnover
-            total_fee_amount += fee_amount
-            weights = target_w
-
-        rows.append({"date": price_pivot.index[i], "account_value": nav})
-
-    stats = {
-        "turnover_ratio": turnover_sum,
-        "cost_ratio": total_fee_amount / float(initial_amount),
-    }
-    return pd.DataFrame(rows), stats
+# 多 seed 并行训练的进程数；None 表示按 CPU 核数自动确定
+MAX_WORKERS = None
+# 单个 seed 失败后的重试次数
+MAX_RETRIES = 1
 
 
 def compute_six_metrics(
@@ -187,7 +77,152 @@ def compute_six_metrics(
     }
 
 
-def run_experiment_pipeline():
+def run_seed(
+    seed: int,
+    train_df: pd.DataFrame,
+    trade_df: pd.DataFrame,
+    seed_paths: dict,
+    initial_amount: float,
+    total_timesteps: int,
+    do_backtesting: bool,
+    eval_df: pd.DataFrame = None,
+    profile: bool = False,
+) -> dict:
+    """子进程任务：训练并回测单个 seed，模型与回测表写入 seed_paths，仅返回汇总指标。"""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    start_time = time.time()
+    for p in seed_paths.values():
+        os.makedirs(p, exist_ok=True)
+
+    trainer = AgentTrainer(train_df, trade_df, seed_paths)
+    model = trainer.run_training(total_timesteps=total_timesteps, eval_data=eval_df, profile=profile)
+    model_path = os.path.join(seed_paths["model"], f"ppo_seed{seed}.zip")
+    model.save(model_path)
+    summary = {
+        "seed": seed,
+        "model_path": model_path,
+        "train_time_min": (time.time() - start_time) / 60.0,
+        "steps_per_s": trainer.throughput.get("steps_per_s"),
+        "val_sharpe": trainer.eval_summary.get("best_sharpe"),
+        "stop_reason": trainer.eval_summary.get("stop_reason"),
+        "artifacts": {"checkpoint": model_path},
+    }
+    if not do_backtesting:
+        return summary
+
+    df_account_value, _ = trainer.run_backtest(model)
+    account_value_path = os.path.join(seed_paths["table"], "account_value.csv")
+    df_account_value.to_csv(account_value_path, index=False)
+
+    # 读取回测明细计算成本
+    df_trades = read_backtest_table(seed_paths["table"], "trades")
+    if df_trades is not None:
+        summary["artifacts"]["backtest_trades"] = trainer.backtest_paths["trades"]
+        rl_turn_ratio = float(df_trades["trade_notional"].sum()) / float(initial_amount)
+        rl_cost_ratio = float(df_trades["trade_fee"].sum()) / float(initial_amount)
+    else:
+        rl_turn_ratio, rl_cost_ratio = 0.0, 0.0
+
+    rl_metrics = compute_six_metrics(df_account_value, initial_amount, rl_turn_ratio, rl_cost_ratio)
+    summary.update(
+        {
+            "sharpe": float(rl_metrics["夏普比率"]),
+            "drawdown": float(rl_metrics["最大回撤"].strip('%')),
+            "time_min": (time.time() - start_time) / 60.0,
+            "account_value_path": account_value_path,
+        }
+    )
+    summary["artifacts"]["account_value"] = account_value_path
+    return summary
+
+
+def run_pbt_experiment(
+    seeds: list,
+    train_df: pd.DataFrame,
+    eval_df: pd.DataFrame,
+    trade_df: pd.DataFrame,
+    initial_amount: float,
+    max_retries: int,
+    benchmarks: dict,
+    bm_mom_metrics: dict,
+    profile: bool = False,
+):
+    """种群训练模式：以 seeds 为种群成员做 PBT，末代验证夏普最高的成员即本轮基准模型，随后回测、保存与画图。"""
+    start_time = time.time()
+    pbt_paths = {
+        "model": os.path.join(EXP_PATHS["model"], "pbt"),
+        "log": os.path.join(EXP_PATHS["log"], "pbt"),
+        "table": os.path.join(EXP_PATHS["table"], "pbt"),
+    }
+    best = run_pbt(
+        seeds, train_df, eval_df, pbt_paths, TOTAL_TIMESTEPS,
+        manifest=RunManifest(EXP_PATHS["root"]), max_retries=max_retries, max_workers=MAX_WORKERS,
+        profile=profile,
+    )
+    print(f"\nPBT 完成 [耗时: {(time.time() - start_time) / 60.0:.2f} 分钟]，历史见 {best['history_path']}")
+    if best["steps_per_s"]:
+        print(f"平均训练吞吐: {best['steps_per_s']:.0f} steps/s")
+    print(f"最优成员 {best['member']} (Seed {best['seed']}) 验证夏普: {best['val_sharpe']:.4f} | 超参数: {best['ppo_params']}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    pbt_model_name = f"ppo_agent_pbt_{timestamp}_member{best['member']}.zip"
+    shutil.copyfile(best["model_path"], os.path.join(EXP_PATHS["model"], pbt_model_name))
+    print(f"已保存 PBT 最优模型为: {pbt_model_name}")
+
+    if not TASK_CONTROL["do_backtesting"]:
+        return
+
+    trainer = AgentTrainer(train_df, trade_df, pbt_paths)
+    model = PPO.load(best["model_path"], device=PPO_PARAMS["device"])
+    df_account_value, _ = trainer.run_backtest(model)
+    df_account_value.to_csv(os.path.join(pbt_paths["table"], "account_value.csv"), index=False)
+
+    df_trades = read_backtest_table(pbt_paths["table"], "trades")
+    if df_trades is not None:
+        rl_turn_ratio = float(df_trades["trade_notional"].sum()) / float(initial_amount)
+        rl_cost_ratio = float(df_trades["trade_fee"].sum()) / float(initial_amount)
+    else:
+        rl_turn_ratio, rl_cost_ratio = 0.0, 0.0
+    rl_metrics = compute_six_metrics(df_account_value, initial_amount, rl_turn_ratio, rl_cost_ratio)
+    print("\n================ PBT 实验结论 ================")
+    print(f"PBT 最优模型回测夏普: {rl_metrics['夏普比率']} (Top5 动量基准: {bm_mom_metrics['夏普比率']})")
+    print(f"PBT 最优模型最大回撤: {rl_metrics['最大回撤']}")
+    print("==============================================")
+
+    if TASK_CONTROL["do_plotting"]:
+        print("INFO: 正在生成对比图表 (展示 PBT 最优模型的净值曲线)...")
+        try:
+            plot_comparison(df_account_value, benchmarks)
+            print("SUCCESS: 曲线对比图已保存。")
+        except Exception as e:
+            print(f"ERROR: 绘图失败: {e}")
+
+        perf_stats = {
+            "PBT_最优成员": f"Member {best['member']} (Seed {best['seed']}，验证夏普 {best['val_sharpe']:.4f})",
+            "PBT_最优超参数": str(best["ppo_params"]),
+        }
+        for k, v in rl_metrics.items():
+            perf_stats[f"PBT_{k}"] = v
+        perf_stats["---"] = "---"
+        for k, v in bm_mom_metrics.items():
+            perf_stats[f"Top5动量Benchmark_{k}"] = v
+
+        finalize_experiment(df_account_value, perf_stats)
+        print(f"SUCCESS: 实验报告已更新至: {EXP_PATHS['root']}")
+
+
+def run_experiment_pipeline(
+    resume_dir: str = None, max_retries: int = MAX_RETRIES, pbt: bool = False, profile: bool = False
+):
+    """
+    多 seed 基础实验主流程。
+    resume_dir 指定已有实验目录时续跑：清单中已完成且产物校验通过的 seed 直接复用其汇总指标。
+    pbt=True 时各 seed 不再独立训练，而是组成种群做 PBT（见 run_pbt_experiment）。
+    profile=True 时记录训练吞吐（各 seed 的 log 目录下 throughput.csv|json）。
+    """
     initial_amount = 10_000
     buy_cost_pct = 0.001
     sell_cost_pct = 0.001
@@ -203,6 +238,13 @@ def run_experiment_pipeline():
         if train_df.empty or trade_df.empty:
             print("ERROR: 训练集或回测集为空，请检查时间窗口")
             return
+        # 从训练窗口末尾切出验证集，用于训练期异步评估与早停
+        eval_df = None
+        if EVAL_PARAMS["validation_days"] > 0:
+            train_df, eval_df = split_validation_window(train_df, EVAL_PARAMS["validation_days"])
+        elif pbt:
+            # PBT 依赖验证夏普做成员间的选择，总是需要验证集
+            train_df, eval_df = split_validation_window(train_df, PBT_PARAMS["validation_days"])
     except Exception as e:
         print(f"ERROR: 加载 processed 数据失败: {e}")
         return
@@ -217,6 +259,7 @@ def run_experiment_pipeline():
         buy_cost_pct=[buy_cost_pct] * stock_dim,
         sell_cost_pct=[sell_cost_pct] * stock_dim,
         tech_indicator_list=TECHNICAL_INDICATORS,
+        cache_dir=ENV_CACHE_DIR,
     )
 
     # 3. 动态组装超参数字典，确保滴水不漏地记录所有环境细节
@@ -224,7 +267,9 @@ def run_experiment_pipeline():
         "Train_Window": f"{TIME_WINDOW['train_start']} to {TIME_WINDOW['train_end']}",
         "Test_Window": f"{TIME_WINDOW['trade_start']} to {TIME_WINDOW['trade_end']}",
         "PPO_Params": str(PPO_PARAMS),
-        "Total_Timesteps": 50000,
+        "Total_Timesteps": TOTAL_TIMESTEPS,
+        "Eval_Params": str(EVAL_PARAMS),
+        "Training_Mode": f"PBT {PBT_PARAMS}" if pbt else "Independent seeds",
         "Environment_Core": f"Top_K={tmp_env.top_k}, Rebalance={tmp_env.rebalance_window} days, Lot_Size={tmp_env.lot_size}",
         "Reward_Shaping": f"Risk_Penalty={tmp_env.risk_penalty}, Turnover_Penalty={tmp_env.turnover_penalty}, Scaling={tmp_env.reward_scaling}",
         "Trading_Costs": f"Buy: {buy_cost_pct}, Sell: {sell_cost_pct}, Initial_Amount: {initial_amount}",
@@ -233,6 +278,8 @@ def run_experiment_pipeline():
     }
 
     # 4. 初始化实验目录并写入日志
+    if resume_dir:
+        resume_experiment(resume_dir)
     try:
         init_base_experiment(hyperparams_dict=hyperparams_log)
         print(f"SUCCESS: 实验目录初始化成功，输出路径: {EXP_PATHS['root']}")
@@ -240,8 +287,6 @@ def run_experiment_pipeline():
         print(f"ERROR: 实验目录初始化失败: {e}")
         return
 
-    trainer = AgentTrainer(train_df, trade_df, EXP_PATHS)
-
     print("\nINFO: 正在计算 Benchmarks...")
     df_bm_equal, bm_equal_stats = build_equal_weight_benchmark(
         trade_df, initial_amount=initial_amount, rebalance_window=5,
@@ -260,75 +305,78 @@ def run_experiment_pipeline():
     df_bm_equal.to_csv(os.path.join(table_dir, "benchmark_equal_weight.csv"), index=False)
     df_bm_mom.to_csv(os.path.join(table_dir, "benchmark_top5_momentum.csv"), index=False)
 
-    print(f"\n开始多随机种子实验，共计 {len(SEEDS)} 轮。")
-    print("--------------------------------------------------")
-    
-    seed_results = []
-    
-    # 用一个字典临时在内存中保留所有模型和净值数据
-    seed_artifacts = {}
-
-    for idx, seed in enumerate(SEEDS, 1):
-        print(f"\n[进度 {idx}/{len(SEEDS)}] 正在执行 Seed = {seed} ...")
-        
-        random.seed(seed)
-        np.random.seed(seed)
-        torch.manual_seed(seed)
-
-        start_time = time.time()
+    if not TASK_CONTROL["do_training"]:
+        print("INFO: 训练已关闭，跳过多 seed 实验。")
+        return
 
-        if TASK_CONTROL["do_training"]:
-            print(f"   正在训练 PPO 模型...")
-            try:
-                model = trainer.run_training(total_timesteps=50000)
-                train_time_sec = time.time() - start_time
-                print(f"   Seed {seed} 训练完成！[耗时: {train_time_sec/60:.2f} 分钟]")
-            except Exception as e:
-                print(f"   训练失败: {e}")
-                return
-        else:
-            model = None
+    if pbt:
+        print(f"\n开始种群训练（PBT），种群规模 {len(SEEDS)}（进程池并行）。")
+        print("--------------------------------------------------")
+        run_pbt_experiment(
+            SEEDS, train_df, eval_df, trade_df, initial_amount, max_retries,
+            {
+                "Benchmark: Equal-Weight (5-day)": df_bm_equal,
+                "Benchmark: Top5 Momentum (5-day)": df_bm_mom,
+            },
+            bm_mom_metrics,
+            profile=profile,
+        )
+        return
 
-        if TASK_CONTROL["do_backtesting"]:
-            if model is None: return
-            
-            print(f"   正在执行回测 (2019-2021)...")
-            try:
-                df_account_value, _ = trainer.run_backtest(model)
-                
-                # 读取回测明细计算成本
-                trade_csv = os.path.join(table_dir, "backtest_trades.csv")
-                if os.path.exists(trade_csv):
-                    df_trades = pd.read_csv(trade_csv)
-                    rl_turn_ratio = float(df_trades["trade_notional"].sum()) / float(initial_amount)
-                    rl_cost_ratio = float(df_trades["trade_fee"].sum()) / float(initial_amount)
-                else:
-                    rl_turn_ratio, rl_cost_ratio = 0.0, 0.0
-
-                rl_metrics = compute_six_metrics(df_account_value, initial_amount, rl_turn_ratio, rl_cost_ratio)
-                
-                cur_sharpe = float(rl_metrics["夏普比率"])
-                cur_dd = float(rl_metrics["最大回撤"].strip('%'))
-                
-                total_time_sec = time.time() - start_time
-                seed_results.append({
-                    "seed": seed, 
-                    "sharpe": cur_sharpe, 
-                    "drawdown": cur_dd,
-                    "time_min": total_time_sec / 60.0
-                })
-                
-                print(f"   回测完毕！当次夏普比率: {cur_sharpe:.4f} (基准为: {bm_mom_sharpe:.4f})")
-                
-                # 把模型和回测曲线先存在内存里
-                seed_artifacts[seed] = {
-                    "model": model,
-                    "df_account_value": df_account_value
-                }
+    print(f"\n开始多随机种子实验，共计 {len(SEEDS)} 轮（进程池并行）。")
+    print("--------------------------------------------------")
 
-            except Exception as e:
-                print(f"   回测失败: {e}")
-                return
+    # 每个 seed 在独立进程中训练+回测，模型与净值写入各自目录，主进程只收汇总指标。
+    # 完成情况登记在清单中，续跑时跳过已完成的 seed。
+    manifest = RunManifest(EXP_PATHS["root"])
+    seed_results = []
+    tasks = []
+    for seed in SEEDS:
+        if manifest.is_complete(f"seed_{seed}"):
+            summary = manifest.summary(f"seed_{seed}")
+            print(f"INFO: Seed = {seed} 已完成（清单校验通过），跳过。")
+            if "sharpe" in summary:
+                seed_results.append(summary)
+            continue
+        seed_paths = dict(EXP_PATHS)
+        seed_paths["model"] = os.path.join(EXP_PATHS["model"], f"seed_{seed}")
+        seed_paths["table"] = os.path.join(table_dir, f"seed_{seed}")
+        seed_paths["log"] = os.path.join(EXP_PATHS["log"], f"seed_{seed}")
+        tasks.append(
+            {
+                "seed": seed,
+                "train_df": train_df,
+                "trade_df": trade_df,
+                "seed_paths": seed_paths,
+                "initial_amount": initial_amount,
+                "total_timesteps": TOTAL_TIMESTEPS,
+                "do_backtesting": TASK_CONTROL["do_backtesting"],
+                "eval_df": eval_df,
+                "profile": profile,
+            }
+        )
+
+    failed_seeds = []
+    results = run_with_retries(run_seed, tasks, max_retries, MAX_WORKERS)
+    for idx, (task, summary, error) in enumerate(results, 1):
+        seed = task["seed"]
+        if error is not None:
+            print(f"   Seed {seed} 训练/回测失败（已重试 {max_retries} 次）: {error}")
+            manifest.mark_failed(f"seed_{seed}", repr(error))
+            failed_seeds.append(seed)
+            continue
+
+        manifest.mark_complete(f"seed_{seed}", summary.pop("artifacts"), summary)
+        print(f"\n[进度 {idx}/{len(tasks)}] Seed = {seed} 完成 [训练耗时: {summary['train_time_min']:.2f} 分钟]")
+        if "sharpe" in summary:
+            print(f"   回测完毕！当次夏普比率: {summary['sharpe']:.4f} (基准为: {bm_mom_sharpe:.4f})")
+            seed_results.append(summary)
+
+    if failed_seeds:
+        print(f"WARNING: 以下 Seed 最终失败: {failed_seeds}，可使用 --resume {EXP_PATHS['root']} 续跑。")
+    if not seed_results:
+        return
+    seed_results.sort(key=lambda x: SEEDS.index(x["seed"]))
 
     print("\n================ 阶段1 最终实验结论 ================")
     rl_sharpes = [res["sharpe"] for res in seed_results]
@@ -344,9 +392,12 @@ def run_experiment_pipeline():
     print(f"Top5 动量基准夏普: {bm_mom_sharpe:.4f}")
     print(f"RL 策略平均最大回撤: {mean_dd:.2f}%")
     print(f"平均单次训练+回测耗时: {avg_time:.2f} 分钟")
+    steps_per_s = [res["steps_per_s"] for res in seed_results if res.get("steps_per_s")]
+    if steps_per_s:
+        print(f"平均训练吞吐: {np.mean(steps_per_s):.0f} steps/s (明细见 {EXP_PATHS['log']}/seed_*/throughput.json)")
     
     pass_count = sum(1 for s in rl_sharpes if s > bm_mom_sharpe)
-    print(f"跑赢基准的 Seed 数量: {pass_count} / {len(SEEDS)}")
+    print(f"跑赢基准的 Seed 数量: {pass_count} / {len(seed_results)}")
     print("==========================================================")
 
     # 寻找最接近均值的模型，执行保存与画图
@@ -355,15 +406,15 @@ def run_experiment_pipeline():
         closest_seed = min(seed_results, key=lambda x: abs(x["sharpe"] - mean_sharpe))["seed"]
         closest_sharpe = next(res["sharpe"] for res in seed_results if res["seed"] == closest_seed)
         
-        # 提取模型和数据
-        median_model = seed_artifacts[closest_seed]["model"]
-        median_df = seed_artifacts[closest_seed]["df_account_value"]
-        
+        # 从磁盘读取代表 seed 的模型与回测曲线
+        closest_result = next(res for res in seed_results if res["seed"] == closest_seed)
+        median_df = pd.read_csv(closest_result["account_value_path"])
+
         # 保存中位数模型
         timestamp = datetime.now().strftime("%Y%m%d_%H%M")
         median_model_name = f"ppo_agent_median_{timestamp}_seed{closest_seed}.zip"
         median_model_path = os.path.join(EXP_PATHS["model"], median_model_name)
-        median_model.save(median_model_path)
+        shutil.copyfile(closest_result["model_path"], median_model_path)
         print(f"\n已选取表现最贴近均值的模型 (Seed {closest_seed}, 夏普 {closest_sharpe:.4f}) 并保存为: {median_model_name}")
 
         # 仅使用中位数模型的数据进行绘图
@@ -403,4 +454,10 @@ def run_experiment_pipeline():
    
 
 if __name__ == "__main__":
-    run_experiment_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Multi-seed base experiment (train + backtest).")
+    parser.add_argument("--resume", type=str, default=None, help="续跑已有实验目录")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--pbt", action="store_true", help="以种群训练（PBT）代替独立多 seed + 取均值附近模型")
+    parser.add_argument("--profile", action="store_true", help="记录训练吞吐与耗时拆分")
+    args = parser.parse_args()
+    run_experiment_pipeline(resume_dir=args.resume, max_retries=args.max_retries, pbt=args.pbt, profile=args.profile)
\ No newline at end of file
@@ -0,0 +1,215 @@
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from configs.agent.ppo import TOTAL_TIMESTEPS
+from configs.base_config import DATA_PATH, DOCS_DIR, ENV_CACHE_DIR, TIME_WINDOW
+from hyperparam_search.search_space import sample_params
+from hyperparam_search.trial_store import FINISHED_STATES, TrialStore
+from src.envs.env_stocktrading import StockTradingEnv
+from src.training.evaluation import evaluate_on_env, split_validation_window
+from src.training.parallel import run_with_retries
+from src.training.train_agent import AgentTrainer
+
+# ===== SEARCH SETTINGS =====
+N_TRIALS = 50
+VALIDATION_DAYS = 252       # 训练窗口末尾切出的验证交易日数
+EVAL_FREQ = 10_000          # 每隔多少环境步做一次中途验证
+N_STARTUP_TRIALS = 5        # 已完成试验不足该数量时不剪枝
+N_WARMUP_STEPS = 10_000     # 早于该步数的中途验证不参与剪枝
+MAX_WORKERS = None          # 并行试验进程数；None 表示按 CPU 核数自动确定
+BASE_SEED = 2026
+
+
+class PruningCallback(BaseCallback):
+    """
+    试验内的同步验证与剪枝：
+    - 每 eval_freq 个环境步在验证环境上确定性回测当前策略，中途夏普按评估步网格写入试验库
+    - 同一评估步上低于已完成试验中位数时停止训练，标记为剪枝
+    """
+
+    def __init__(
+        self,
+        store: TrialStore,
+        study: str,
+        trial_id: int,
+        eval_env,
+        eval_freq: int,
+        n_startup_trials: int = N_STARTUP_TRIALS,
+        n_warmup_steps: int = N_WARMUP_STEPS,
+    ):
+        super().__init__()
+        self.store = store
+        self.study = study
+        self.trial_id = trial_id
+        self.eval_env = eval_env
+        self.eval_freq = int(eval_freq)
+        self.n_startup_trials = n_startup_trials
+        self.n_warmup_steps = n_warmup_steps
+        self.pruned = False
+        self.last_metrics = None
+        self._next_eval = self.eval_freq
+
+    def _on_step(self) -> bool:
+        if self.num_timesteps < self._next_eval:
+            return True
+        # 不同试验的 n_steps 不同，中途记录统一落在 eval_freq 的整数倍上，便于跨试验比较
+        step = (self.num_timesteps // self.eval_freq) * self.eval_freq
+        self._next_eval = step + self.eval_freq
+        self.last_metrics = evaluate_on_env(self.model, self.eval_env)
+        self.store.report(self.trial_id, step, self.last_metrics["sharpe"])
+        if self.store.should_prune(self.study, self.trial_id, step, self.n_startup_trials, self.n_warmup_steps):
+            self.pruned = True
+            return False
+        return True
+
+
+def run_trial(
+    trial_id: int,
+    number: int,
+    study: str,
+    db_path: str,
+    params: dict,
+    seed: int,
+    train_df: pd.DataFrame,
+    eval_df: pd.DataFrame,
+    trial_dir: str,
+    total_timesteps: int,
+    pruning: dict,
+) -> dict:
+    """子进程任务：按采样参数训练单个试验，中途验证剪枝，返回最终验证指标。"""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    store = TrialStore(db_path)
+    store.start(trial_id)
+    try:
+        paths = {"model": trial_dir, "log": trial_dir}
+        trainer = AgentTrainer(train_df, eval_df, paths, env_params=params["env"])
+        eval_env = StockTradingEnv(
+            df=eval_df, cache_dir=ENV_CACHE_DIR, diagnostics=False, **trainer._env_kwargs()
+        )
+        pruner = PruningCallback(store, study, trial_id, eval_env, **pruning)
+        model = trainer.run_training(
+            total_timesteps=total_timesteps,
+            seed=seed,
+            profile=False,
+            ppo_params=params["ppo"],
+            callbacks=[pruner],
+        )
+        # 剪枝的试验以最后一次中途验证为准，不再补评
+        metrics = pruner.last_metrics if pruner.pruned else evaluate_on_env(model, eval_env)
+    except Exception as e:
+        store.finish(trial_id, "failed", error=repr(e))
+        raise
+
+    state = "pruned" if pruner.pruned else "complete"
+    store.finish(trial_id, state, value=metrics["sharpe"])
+    return {"number": number, "state": state, **metrics}
+
+
+def run_search(
+    study: str,
+    n_trials: int = N_TRIALS,
+    total_timesteps: int = TOTAL_TIMESTEPS,
+    max_workers: int = MAX_WORKERS,
+):
+    """
+    并行随机搜索：试验参数按 BASE_SEED + 编号采样并写入 SQLite 后分发到进程池。
+    同名 study 再次运行即续跑：未完成（waiting / running）的试验按原参数重跑，再补足新试验到 n_trials 个。
+    """
+    study_dir = os.path.join(DOCS_DIR, "hyperparam_search", study)
+    db_path = os.path.join(study_dir, "trials.db")
+    store = TrialStore(db_path)
+
+    full_df = pd.read_csv(DATA_PATH["processed"])
+    train_df = full_df[(full_df.date >= TIME_WINDOW["train_start"]) & (full_df.date <= TIME_WINDOW["train_end"])]
+    train_df, eval_df = split_validation_window(train_df, VALIDATION_DAYS)
+
+    existing = store.trials(study)
+    unfinished = [t for t in existing if t["state"] not in FINISHED_STATES]
+    n_finished = len(existing) - len(unfinished)
+    first_number = store.next_number(study)
+    for number in range(first_number, first_number + max(0, n_trials - len(existing))):
+        seed = BASE_SEED + number
+        params = sample_params(seed)
+        trial_id = store.add_trial(study, number, params, seed)
+        unfinished.append({"trial_id": trial_id, "number": number, "params": params, "seed": seed})
+    print(f"INFO: Study={study} 已结束 {n_finished} 个试验，本次运行 {len(unfinished)} 个")
+
+    tasks = [
+        {
+            "trial_id": t["trial_id"],
+            "number": t["number"],
+            "study": study,
+            "db_path": db_path,
+            "params": t["params"],
+            "seed": t["seed"],
+            "train_df": train_df,
+            "eval_df": eval_df,
+            "trial_dir": os.path.join(study_dir, f"trial_{t['number']}"),
+            "total_timesteps": total_timesteps,
+            "pruning": {
+                "eval_freq": EVAL_FREQ,
+                "n_startup_trials": N_STARTUP_TRIALS,
+                "n_warmup_steps": N_WARMUP_STEPS,
+            },
+        }
+        for t in unfinished
+    ]
+    for task, result, error in run_with_retries(run_trial, tasks, max_retries=0, max_workers=max_workers):
+        if error is not None:
+            store.finish(task["trial_id"], "failed", error=repr(error))
+            print(f"   Trial {task['number']} 失败: {error}")
+            continue
+        print(
+            f"   Trial {result['number']} {result['state']} | 验证夏普: {result['sharpe']:.4f} "
+            f"| 最大回撤: {result['max_drawdown'] * 100:.2f}%"
+        )
+
+    # 汇总全部试验，输出排名表与最优参数
+    records = store.trials(study)
+    df_trials = pd.DataFrame(
+        [
+            {
+                "number": r["number"],
+                "state": r["state"],
+                "value": r["value"],
+                **{f"ppo.{k}": v for k, v in r["params"]["ppo"].items()},
+                **{f"env.{k}": v for k, v in r["params"]["env"].items()},
+            }
+            for r in records
+        ]
+    )
+    df_trials.sort_values("value", ascending=False).to_csv(os.path.join(study_dir, "trials.csv"), index=False)
+
+    complete = [r for r in records if r["state"] == "complete"]
+    if not complete:
+        print("WARNING: 暂无完成的试验。")
+        return None
+    best = max(complete, key=lambda r: r["value"])
+    print(f"SUCCESS: 最优试验 #{best['number']} 验证夏普 {best['value']:.4f}")
+    print(f"   PPO: {best['params']['ppo']}")
+    print(f"   ENV: {best['params']['env']}")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel PPO / reward hyperparameter search.")
+    parser.add_argument("--study", type=str, required=True, help="study 名称；同名再次运行即续跑")
+    parser.add_argument("--n-trials", type=int, default=N_TRIALS)
+    parser.add_argument("--timesteps", type=int, default=TOTAL_TIMESTEPS)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+    run_search(args.study, n_trials=args.n_trials, total_timesteps=args.timesteps, max_workers=args.workers)
@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+
+
+# 搜索空间：("loguniform", low, high) / ("uniform", low, high) / ("choice", [候选值])
+# ppo 部分覆盖 configs/agent/ppo.py 的 PPO_PARAMS，env 部分覆盖 StockTradingEnv 的奖励与调仓参数
+SEARCH_SPACE = {
+    "ppo": {
+        "learning_rate": ("loguniform", 1e-5, 1e-3),
+        "n_steps": ("choice", [512, 1024, 2048, 4096]),
+        "batch_size": ("choice", [64, 128, 256, 512]),
+        "n_epochs": ("choice", [5, 10, 20]),
+        "gamma": ("choice", [0.95, 0.98, 0.99, 0.995, 0.999]),
+        "gae_lambda": ("uniform", 0.9, 0.99),
+        "clip_range": ("choice", [0.1, 0.2, 0.3]),
+        "ent_coef": ("loguniform", 1e-4, 5e-2),
+        "vf_coef": ("uniform", 0.3, 1.0),
+        "max_grad_norm": ("choice", [0.3, 0.5, 1.0]),
+    },
+    "env": {
+        "risk_penalty": ("uniform", 0.0, 0.5),
+        "turnover_penalty": ("uniform", 0.0, 0.05),
+        "top_k": ("choice", [3, 5, 8, 10]),
+        "rebalance_window": ("choice", [1, 3, 5, 10, 20]),
+    },
+}
+
+
+def _sample_value(rng: np.random.Generator, spec: tuple):
+    """按单个参数的分布定义采样，返回可 JSON 序列化的 Python 标量。"""
+    kind = spec[0]
+    if kind == "loguniform":
+        return float(math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2]))))
+    if kind == "uniform":
+        return float(rng.uniform(spec[1], spec[2]))
+    if kind == "choice":
+        return spec[1][int(rng.integers(len(spec[1])))]
+    raise ValueError(f"Unknown distribution {kind!r}")
+
+
+def sample_params(seed: int, space: dict = None) -> dict:
+    """按种子从搜索空间独立采样一组参数：{"ppo": {...}, "env": {...}}，同一种子结果可复现。"""
+    space = SEARCH_SPACE if space is None else space
+    rng = np.random.default_rng(seed)
+    params = {
+        group: {name: _sample_value(rng, spec) for name, spec in specs.items()}
+        for group, specs in space.items()
+    }
+    ppo = params.get("ppo", {})
+    # minibatch 不能大于单轮 rollout
+    if "batch_size" in ppo and "n_steps" in ppo:
+        ppo["batch_size"] = min(ppo["batch_size"], ppo["n_steps"])
+    return params
@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+
+# 试验状态：waiting 已采样未开始，running 运行中，其余为终态
+FINISHED_STATES = ("complete", "pruned", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    trial_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    study TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    value REAL,
+    error TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    UNIQUE (study, number)
+);
+CREATE TABLE IF NOT EXISTS intermediate (
+    trial_id INTEGER NOT NULL,
+    step INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (trial_id, step)
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class TrialStore:
+    """
+    超参搜索的 SQLite 试验库：
+    - trials 表记录每个试验的参数、状态与最终验证夏普；intermediate 表记录训练中途的验证夏普
+    - 每次操作独立连接、立即提交，主进程与多个试验子进程可同时读写同一个库文件
+    - 中位数剪枝：同一评估步上，试验的中途夏普低于已完成试验的中位数即剪枝
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=60.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql: str, args: tuple = ()) -> list:
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def add_trial(self, study: str, number: int, params: dict, seed: int) -> int:
+        """登记一个已采样、待运行的试验，返回 trial_id。"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO trials (study, number, state, params, seed) VALUES (?, ?, 'waiting', ?, ?)",
+                    (study, number, json.dumps(params), seed),
+                )
+                return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def next_number(self, study: str) -> int:
+        rows = self._execute("SELECT MAX(number) AS n FROM trials WHERE study = ?", (study,))
+        return 0 if rows[0]["n"] is None else rows[0]["n"] + 1
+
+    def trials(self, study: str, states: tuple = None) -> list:
+        """按编号返回试验记录（dict，params 已解析）；states 为 None 时返回全部。"""
+        rows = self._execute("SELECT * FROM trials WHERE study = ? ORDER BY number", (study,))
+        records = [dict(row, params=json.loads(row["params"])) for row in rows]
+        if states is not None:
+            records = [r for r in records if r["state"] in states]
+        return records
+
+    def start(self, trial_id: int) -> None:
+        """标记试验开始运行，并清除上次中断遗留的中途记录。"""
+        self._execute("DELETE FROM intermediate WHERE trial_id = ?", (trial_id,))
+        self._execute(
+            "UPDATE trials SET state = 'running', started_at = ?, error = NULL WHERE trial_id = ?",
+            (_now(), trial_id),
+        )
+
+    def finish(self, trial_id: int, state: str, value: float = None, error: str = None) -> None:
+        if state not in FINISHED_STATES:
+            raise ValueError(f"state must be one of {FINISHED_STATES}, got {state!r}")
+        self._execute(
+            "UPDATE trials SET state = ?, value = ?, error = ?, finished_at = ? WHERE trial_id = ?",
+            (state, value, error, _now(), trial_id),
+        )
+
+    def report(self, trial_id: int, step: int, value: float) -> None:
+        """记录试验在 step 步的中途验证夏普。"""
+        self._execute(
+            "INSERT OR REPLACE INTO intermediate (trial_id, step, value) VALUES (?, ?, ?)",
+            (trial_id, step, value),
+        )
+
+    def should_prune(
+        self,
+        study: str,
+        trial_id: int,
+        step: int,
+        n_startup_trials: int = 5,
+        n_warmup_steps: int = 0,
+    ) -> bool:
+        """中位数剪枝：已完成试验不足 n_startup_trials 个或 step 未过预热期时不剪枝。"""
+        if step < n_warmup_steps:
+            return False
+        rows = self._execute(
+            """
+            SELECT i.value FROM intermediate i JOIN trials t ON i.trial_id = t.trial_id
+            WHERE t.study = ? AND t.state = 'complete' AND i.step = ?
+            """,
+            (study, step),
+        )
+        if len(rows) < n_startup_trials:
+            return False
+        current = self._execute(
+            "SELECT value FROM intermediate WHERE trial_id = ? AND step = ?", (trial_id, step)
+        )
+        if not current:
+            return False
+        return current[0]["value"] < float(np.median([row["value"] for row in rows]))
@@ -16,6 +16,8 @@ if PROJECT_ROOT not in sys.path:
 
 from configs.base_config import DOCS_DIR, TECHNICAL_INDICATORS
 from src.envs.env_stocktrading import StockTradingEnv
+from src.envs.execution import execute_sell_then_buy
+from src.training.benchmarks import equal_weight_targets, rebalance_days, simulate_rebalanced_benchmark
 from src.data_processing.fetch_40_pool import (
     DEFAULT_TOKEN,
     build_universe_df,
@@ -401,46 +403,33 @@ def run_live_demo() -> None:
         accepted = apply_action in {"y", "yes"}
 
         if accepted:
-            # 先卖后买
-            for i in range(stock_dim):
-                if deltas[i] < 0:
-                    sold = env._sell(i, abs(int(deltas[i])))
-                    if sold > 0:
-                        fee = sold * float(env.prices[i]) * float(env.sell_cost_pct[i])
-                        notional = sold * float(env.prices[i])
-                        trade_fee_total += fee
-                        traded_notional += notional
-                        trade_rows.append(
-                            {
-                                "date": decision_date_str,
-                                "tic": env.tickers[i],
-                                "action": "SELL",
-                                "shares": int(sold),
-                                "price": float(env.prices[i]),
-                                "notional": float(notional),
-                                "fee": float(fee),
-                            }
-                        )
-
-            for i in range(stock_dim):
-                if deltas[i] > 0:
-                    bought = env._buy(i, int(deltas[i]))
-                    if bought > 0:
-                        fee = bought * float(env.prices[i]) * float(env.buy_cost_pct[i])
-                        notional = bought * float(env.prices[i])
-                        trade_fee_total += fee
-                        traded_notional += notional
-                        trade_rows.append(
-                            {
-                                "date": decision_date_str,
-                                "tic": env.tickers[i],
-                                "action": "BUY",
-                                "shares": int(bought),
-                                "price": float(env.prices[i]),
-                                "notional": float(notional),
-                                "fee": float(fee),
-                            }
-                        )
+            # 先卖后买（与回测环境共用同一撮合内核）
+            env.cash, new_holdings, executed, fees, notional = execute_sell_then_buy(
+                env.cash,
+                env.holdings,
+                env.prices,
+                deltas,
+                env.buy_cost_pct,
+                env.sell_cost_pct,
+                env.lot_size,
+            )
+            env.holdings = new_holdings.astype(np.float32)
+            trade_fee_total = float(np.sum(fees))
+            traded_notional = float(np.sum(notional))
+
+            for side, side_mask in (("SELL", executed < 0), ("BUY", executed > 0)):
+                for i in np.flatnonzero(side_mask):
+                    trade_rows.append(
+                        {
+                            "date": decision_date_str,
+                            "tic": env.tickers[i],
+                            "action": side,
+                            "shares": int(abs(executed[i])),
+                            "price": float(env.prices[i]),
+                            "notional": float(notional[i]),
+                            "fee": float(fees[i]),
+                        }
+                    )
         else:
             print("INFO: 已选择不执行调仓，维持当前持仓。")
 
@@ -607,36 +596,20 @@ def run_live_demo() -> None:
             price_pivot = (
                 df_slice.pivot(index="date", columns="tic", values="close")
                 .sort_index()
-                .fillna(method="ffill")
+                .ffill()
             )
 
             if not price_pivot.empty:
-                daily_ret = price_pivot.pct_change().fillna(0.0)
-                n_assets = price_pivot.shape[1]
-                target_w = np.full(n_assets, 1.0 / n_assets, dtype=np.float64)
-
-                nav = float(initial_cash)
-                weights = np.zeros(n_assets, dtype=np.float64)
-                rows = [{"date": price_pivot.index[0], "benchmark": nav}]
-
-                for i in range(1, len(price_pivot.index)):
-                    r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-                    nav *= 1.0 + float(np.dot(weights, r))
-
-                    gross_weights = weights * (1.0 + r)
-                    gross_sum = float(np.sum(gross_weights))
-                    weights = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-
-                    if i % REBALANCE_WINDOW == 0:
-                        buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-                        sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-                        fee_ratio = buy_turnover * BUY_COST_PCT + sell_turnover * SELL_COST_PCT
-                        nav *= max(0.0, 1.0 - fee_ratio)
-                        weights = target_w.copy()
-
-                    rows.append({"date": price_pivot.index[i], "benchmark": nav})
-
-                df_bm = pd.DataFrame(rows)
+                days = rebalance_days(len(price_pivot.index), REBALANCE_WINDOW)
+                df_bm, _ = simulate_rebalanced_benchmark(
+                    price_pivot,
+                    equal_weight_targets(price_pivot, days),
+                    initial_amount=float(initial_cash),
+                    rebalance_window=REBALANCE_WINDOW,
+                    buy_cost_pct=BUY_COST_PCT,
+                    sell_cost_pct=SELL_COST_PCT,
+                )
+                df_bm = df_bm.rename(columns={"account_value": "benchmark"})
                 df_plot = df_acc.merge(df_bm, on="date", how="left")
 
                 plt.figure(figsize=(12, 6))
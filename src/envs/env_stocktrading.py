@@ -4,6 +4,42 @@ import pandas as pd
 from gymnasium import spaces
 from stable_baselines3.common.vec_env import DummyVecEnv
 
+from src.envs.execution import execute_sell_then_buy
+from src.envs.market_data import MarketData
+from src.envs.rolling_stats import RollingRiskStats
+
+
+RISK_WINDOW = 20
+REWARD_MODES = ("return", "shaped")
+
+
+def sample_episode_window(rng, max_step: int, min_episode_steps: int, max_episode_steps: int = None):
+    """
+    在 [0, max_step] 上随机抽取一个回合窗口，返回整数偏移 (start_day, end_day)：
+    - 起点保证其后至少还有 min_episode_steps 步
+    - 长度在 [min_episode_steps, max_episode_steps] 内均匀抽取；max_episode_steps 为空时跑到数据末尾
+    """
+    min_steps = int(max(1, min(min_episode_steps, max_step)))
+    start = int(rng.integers(0, max_step - min_steps + 1))
+    if max_episode_steps is None:
+        return start, max_step
+    max_steps = int(max(min_steps, min(max_episode_steps, max_step - start)))
+    return start, start + int(rng.integers(min_steps, max_steps + 1))
+
+
+def select_top_k(scores: np.ndarray, k: int, mask: np.ndarray = None):
+    """
+    沿最后一维按打分部分选择 Top-K（argpartition，O(N)，组内不排序）：
+    - mask 为 False 的股票不参与选择
+    - 返回 (selected, valid)，可选股票不足 K 只时多出的位置 valid 为 False
+    """
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    k = int(min(k, scores.shape[-1]))
+    selected = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    valid = np.isfinite(np.take_along_axis(scores, selected, axis=-1))
+    return selected, valid
+
 
 class StockTradingEnv(gym.Env):
     """
@@ -11,7 +47,7 @@ class StockTradingEnv(gym.Env):
     - 动作：对全部股票输出打分向量
     - 调仓：每 `rebalance_window` 个交易日执行一次
     - 组合：按打分选 Top-K 等权持仓
-    - 奖励：收益 - 风险惩罚 - 换手惩罚
+    - 奖励：收益 - 风险惩罚 - 换手惩罚（`reward_mode="shaped"` 时为超额收益 - 风险 - 回撤 - 换手）
     """
 
     metadata = {"render_modes": ["human"]}
@@ -31,11 +67,29 @@ class StockTradingEnv(gym.Env):
         lot_size: int = 100,
         risk_penalty: float = 0.1,
         turnover_penalty: float = 0.01,
+        reward_mode: str = "return",
+        drawdown_penalty: float = 5.0,
+        market_data=None,
+        cache_dir: str = None,
+        random_start: bool = False,
+        min_episode_steps: int = 60,
+        max_episode_steps: int = None,
+        diagnostics: bool = True,
+        large_universe: bool = False,
+        lookback_window: int = 1,
     ):
-        """初始化环境、构建状态列、缓存按日行情切片。"""
+        """
+        初始化环境：由 df 构建行情张量，或通过 market_data（MarketData 或共享句柄）直接挂载。
+        指定 cache_dir 时，df 构建结果按内容哈希缓存到磁盘，相同数据与指标配置再次构造时直接挂载。
+        random_start=True 时每次 reset 随机抽取回合起点与长度（仅为数组下标偏移，不切片 DataFrame）。
+        diagnostics=False 为训练精简模式：不记录 last_* 交易明细、资产/日期序列与 info，只维护奖励所需状态；
+        非调仓日的 step 只写预分配缓冲区，返回的观测是复用的缓冲区（需要保留时由调用方 copy，
+        SB3 的 VecEnv 会自行拷贝）；调仓日的撮合内核与持仓转换仍会分配小数组。
+        large_universe=True 为大股票池模式：允许成分变动（缺席股票不可交易），特征紧凑存储，Top-K 用部分选择。
+        lookback_window=L>1 时观测包含最近 L 个交易日的股票特征（行情张量上的视图，不拼接 DataFrame）。
+        """
         super().__init__()
 
-        self.df = df.copy()
         self.stock_dim = stock_dim
         self.hmax = hmax
         self.initial_amount = float(initial_amount)
@@ -47,101 +101,102 @@ class StockTradingEnv(gym.Env):
         self.lot_size = int(max(1, lot_size))
         self.risk_penalty = float(max(0.0, risk_penalty))
         self.turnover_penalty = float(max(0.0, turnover_penalty))
-
-        # 固定股票顺序，避免跨日期错位。
-        self.tickers = sorted(self.df["tic"].unique().tolist())
-        if len(self.tickers) != self.stock_dim:
+        if reward_mode not in REWARD_MODES:
+            raise ValueError(f"reward_mode must be one of {REWARD_MODES}, got {reward_mode!r}")
+        self.reward_mode = reward_mode
+        self.drawdown_penalty = float(max(0.0, drawdown_penalty))
+        self.risk_stats = RollingRiskStats(window=RISK_WINDOW)
+        self.random_start = bool(random_start)
+        self.min_episode_steps = int(max(1, min_episode_steps))
+        self.max_episode_steps = None if max_episode_steps is None else int(max_episode_steps)
+        self.diagnostics = bool(diagnostics)
+        self.lookback_window = int(max(1, lookback_window))
+
+        # 行情张量（价格 [T, N]、特征 [T, N, F]、市场特征 [T, 3]）由 MarketData 一次性构建，
+        # 或按句柄挂载多进程共享的只读副本；step 中只按整数下标取视图。
+        if market_data is None:
+            if df is None:
+                raise ValueError("Either df or market_data must be provided.")
+            if cache_dir:
+                market_data = MarketData.load_or_build(
+                    df, stock_dim, tech_indicator_list, cache_dir, allow_ragged=large_universe
+                )
+            else:
+                market_data = MarketData.from_dataframe(
+                    df, stock_dim, tech_indicator_list, allow_ragged=large_universe
+                )
+        elif isinstance(market_data, str):
+            market_data = MarketData.attach(market_data)
+        if len(market_data.tickers) != self.stock_dim:
             raise ValueError(
-                f"stock_dim={stock_dim} mismatch with df tickers={len(self.tickers)}"
+                f"stock_dim={stock_dim} mismatch with market data tickers={len(market_data.tickers)}"
             )
+        self.market_data = market_data
+        self.large_universe = bool(large_universe) or market_data.ragged
+        self.tradable = market_data.tradable
+
+        # 固定股票顺序，避免跨日期错位。
+        self.tickers = market_data.tickers
         self.ticker_to_idx = {tic: i for i, tic in enumerate(self.tickers)}
+        self.current_tics = self.tickers
+        self.feature_cols = market_data.feature_cols
 
-        # 特征列：配置指标 + 扩展指标 + 自动补充数值列。
-        base_non_feature_cols = {"date", "tic", "name", "industry", "feature_ready"}
-        preferred_extra_cols = [
-            "log_return",
-            "return_20",
-            "momentum_60",
-            "momentum_120",
-            "momentum_252",
-            "volatility_20",
-            "volatility_annual",
-            "sma_5",
-            "sma_10",
-            "sma_20",
-            "sma_30",
-            "sma_60",
-            "bias_20",
-            "bias_60",
-            "amplitude",
-            "intraday_return",
-            "amount_20_mean",
-            "volume_20_mean",
-            "volume_ratio",
-            "high_20",
-            "low_20",
-            "position_20",
-            "turbulence",
-        ]
-
-        tech_indicator_list = tech_indicator_list or []
-        configured_cols = [
-            col
-            for col in tech_indicator_list
-            if col in self.df.columns and col not in base_non_feature_cols
-        ]
-        extra_cols = [
-            col
-            for col in preferred_extra_cols
-            if col in self.df.columns and col not in configured_cols
-        ]
-        auto_numeric_cols = [
-            col
-            for col in self.df.select_dtypes(include=[np.number]).columns.tolist()
-            if col not in configured_cols
-            and col not in extra_cols
-            and col not in {"feature_ready"}
-        ]
-
-        self.feature_cols = configured_cols + extra_cols + auto_numeric_cols
-        if not self.feature_cols:
-            raise ValueError("No valid feature columns found in processed data.")
-
-        self.df["date"] = pd.to_datetime(self.df["date"])
-        self.df = self.df.sort_values(["date", "tic"]).reset_index(drop=True)
-        self.dates = self.df["date"].drop_duplicates().to_numpy()
+        self.dates = market_data.dates
+        self.date_index = pd.DatetimeIndex(self.dates)
         self.max_step = len(self.dates) - 1
 
-        # 预缓存每日数据切片（按固定ticker顺序排列）。
-        self.data_by_date = {}
-        for d, group in self.df.groupby("date", sort=True):
-            g = group.copy()
-            g["tic_idx"] = g["tic"].map(self.ticker_to_idx)
-            g = g.sort_values("tic_idx")
-            if len(g) != self.stock_dim:
-                raise ValueError(
-                    f"Date {pd.Timestamp(d).date()} has {len(g)} tickers, expected {self.stock_dim}"
-                )
-            self.data_by_date[pd.Timestamp(d)] = g
-
-        self.market_df = self._build_market_features()
+        self.price_array = market_data.prices
+        self.feature_tensor = market_data.features
+        self.market_array = market_data.market
+        self.market_df = market_data.market_df
 
         self.action_space = spaces.Box(
             low=-1.0, high=1.0, shape=(self.stock_dim,), dtype=np.float32
         )
-        # 状态 = 现金占比 + 持仓权重 + 股票特征 + 市场特征 + 调仓标记
-        state_dim = 1 + self.stock_dim + self.stock_dim * len(self.feature_cols) + 3 + 1
+        # 状态 = 现金占比 + 持仓权重 + 最近 L 日股票特征 + 市场特征 + 调仓标记
+        state_dim = (
+            1
+            + self.stock_dim
+            + self.lookback_window * self.stock_dim * len(self.feature_cols)
+            + 3
+            + 1
+        )
         self.observation_space = spaces.Box(
             low=-np.inf, high=np.inf, shape=(state_dim,), dtype=np.float32
         )
+        # lean 模式 step 复用的观测与持仓市值缓冲区
+        self._obs_buf = np.empty(self.observation_space.shape, dtype=np.float32)
+        self._value_buf = np.empty(self.stock_dim, dtype=np.float32)
 
         self.reset()
 
     def reset(self, *, seed=None, options=None):
-        """重置环境到第一个交易日并初始化账户。"""
+        """
+        重置账户并确定回合窗口：默认从第一个交易日跑到最后；
+        random_start=True 时随机抽取窗口；options 可用 start_day / episode_length 显式指定。
+        """
         super().reset(seed=seed)
+        options = options or {}
 
-        self.day = 0
+        if self.random_start:
+            start_day, end_day = sample_episode_window(
+                self.np_random, self.max_step, self.min_episode_steps, self.max_episode_steps
+            )
+        else:
+            start_day, end_day = 0, self.max_step
+        if "start_day" in options:
+            start_day = int(options["start_day"])
+            end_day = self.max_step
+        if "episode_length" in options:
+            end_day = start_day + int(options["episode_length"])
+        if not 0 <= start_day <= end_day <= self.max_step:
+            raise ValueError(
+                f"Invalid episode window [{start_day}, {end_day}] for max_step={self.max_step}"
+            )
+        self.start_day = start_day
+        self.end_day = end_day
+
+        self.day = start_day
         self.cash = self.initial_amount
         self.holdings = np.zeros(self.stock_dim, dtype=np.float32)
 
@@ -157,10 +212,11 @@ class StockTradingEnv(gym.Env):
 
         self._update_market_data()
         init_asset = self._get_total_asset()
+        self.risk_stats.reset(init_asset)
         self.asset_memory = [init_asset]
         self.date_memory = [self.current_date]
 
-        return self._get_state(), {}
+        return self._get_state(init_asset), {}
 
     def step(self, action):
         """执行一步：若为调仓日则交易，否则仅持仓推进到下一日。"""
@@ -168,101 +224,88 @@ class StockTradingEnv(gym.Env):
         action = np.clip(action, -1.0, 1.0)
 
         begin_asset = self._get_total_asset()
-        trade_prices = self.prices.copy()
-        is_rebalance_day = (self.day % self.rebalance_window == 0)
-
-        action_deltas = np.zeros(self.stock_dim, dtype=np.int32)
-        executed_shares = np.zeros(self.stock_dim, dtype=np.int32)
-        trade_fees = np.zeros(self.stock_dim, dtype=np.float32)
+        trade_prices = self.prices
+        is_rebalance_day = self._is_rebalance_day()
         traded_notional = 0.0
 
         if is_rebalance_day:
             target_weights = self._scores_to_target_weights(action)
-            current_shares = self.holdings.copy().astype(np.int32)
+            current_shares = self.holdings.astype(np.int32)
             target_shares = self._target_shares_from_weights(target_weights, begin_asset)
             deltas = target_shares - current_shares
-            action_deltas = deltas.copy()
+            if self.tradable_today is not None:
+                # 当日缺席（停牌/不在成分内）的股票既不能买也不能卖。
+                deltas[~self.tradable_today] = 0
 
             # 先卖后买，减少现金约束下的交易失败。
-            for i in range(self.stock_dim):
-                if deltas[i] < 0:
-                    sold = self._sell(i, abs(int(deltas[i])))
-                    executed_shares[i] -= sold
-                    fee = sold * trade_prices[i] * self.sell_cost_pct[i]
-                    trade_fees[i] += fee
-                    traded_notional += sold * trade_prices[i]
-
-            for i in range(self.stock_dim):
-                if deltas[i] > 0:
-                    bought = self._buy(i, int(deltas[i]))
-                    executed_shares[i] += bought
-                    fee = bought * trade_prices[i] * self.buy_cost_pct[i]
-                    trade_fees[i] += fee
-                    traded_notional += bought * trade_prices[i]
-
-        self.last_action_raw = action.copy()
-        self.last_action_shares = action_deltas
-        self.last_trade_shares = executed_shares
-        self.last_trade_prices = trade_prices
-        self.last_trade_fees = trade_fees
+            self.cash, holdings, executed, fees, notional = execute_sell_then_buy(
+                self.cash,
+                self.holdings,
+                trade_prices,
+                deltas,
+                self.buy_cost_pct,
+                self.sell_cost_pct,
+                self.lot_size,
+            )
+            self.holdings = holdings.astype(np.float32)
+            traded_notional = float(np.sum(notional))
+
+        if self.diagnostics:
+            self.last_action_raw = action
+            self.last_trade_prices = trade_prices.copy()
+            if is_rebalance_day:
+                self.last_action_shares = deltas
+                self.last_trade_shares = executed.astype(np.int32)
+                self.last_trade_fees = fees.astype(np.float32)
+            else:
+                self.last_action_shares = np.zeros(self.stock_dim, dtype=np.int32)
+                self.last_trade_shares = np.zeros(self.stock_dim, dtype=np.int32)
+                self.last_trade_fees = np.zeros(self.stock_dim, dtype=np.float32)
 
         self.day += 1
-        terminated = self.day >= self.max_step
+        terminated = self.day >= self.end_day
         self._update_market_data()
 
         end_asset = self._get_total_asset()
         portfolio_return = (end_asset - begin_asset) / max(begin_asset, 1e-8)
         turnover_ratio = traded_notional / max(begin_asset, 1e-8)
 
-        self.portfolio_return_memory.append(portfolio_return)
-        self.turnover_memory.append(turnover_ratio)
-
-        # 以下为原版奖励计算逻辑，当前版本仅使用收益作为奖励，风险和换手惩罚项暂不启用。
-        risk_20 = 0.0
-        if len(self.portfolio_return_memory) >= 20:
-            risk_20 = float(np.std(self.portfolio_return_memory[-20:], ddof=0))
-
-        reward = (
-            portfolio_return
-            - self.risk_penalty * risk_20
-            - self.turnover_penalty * turnover_ratio
-        ) * self.reward_scaling
-
-
-
-
-        # # 以下为新版，参考文献
-        # # 1: Bai et al.(2024) 元分析表明 Shaped Reward 显著优于 Raw Return
-        # # 2: Liang (2025) 强调需对最大回撤 (Max Drawdown) 赋予高额惩罚权重
-        
-        # risk_20 = 0.0
-        # if len(self.portfolio_return_memory) >= 20:
-        #     risk_20 = float(np.std(self.portfolio_return_memory[-20:], ddof=0))
-
-        # # 1. 动态计算历史最高点与当前回撤幅度
-        # current_max_asset = max(self.asset_memory) if self.asset_memory else begin_asset
-        # current_drawdown = max(0.0, (current_max_asset - end_asset) / max(current_max_asset, 1e-8))
-        
-        # # 2. 回撤惩罚 (Drawdown Penalty)：采用非线性放大
-        # # 当回撤较小时惩罚极弱，当回撤超过一定幅度时（如疫情熔断），平方项会导致惩罚呈指数级暴增，强迫模型立刻空仓
-        # drawdown_penalty = 5.0 * (current_drawdown ** 2)
-
-        # # 3. 超额收益 (Alpha)：用当前收益减去大盘特征中的市场平均收益
-        # market_return_today = float(self.market_features[0]) 
-        # alpha_return = portfolio_return - market_return_today
-
-        # # 4. 复合奖励公式 (对应文献中的收益-回撤-波动三维制衡)
-        # reward = (
-        #     alpha_return
-        #     - self.risk_penalty * risk_20
-        #     - drawdown_penalty
-        #     - self.turnover_penalty * turnover_ratio
-        # ) * self.reward_scaling
-
+        # O(1) 更新滚动收益统计与回撤，奖励各项直接读取，不再对历史列表求值。
+        self.risk_stats.update(portfolio_return, end_asset)
+        risk_20 = self.risk_stats.risk_of(0)
+
+        if self.reward_mode == "shaped":
+            # 新版奖励，参考文献
+            # 1: Bai et al.(2024) 元分析表明 Shaped Reward 显著优于 Raw Return
+            # 2: Liang (2025) 强调需对最大回撤 (Max Drawdown) 赋予高额惩罚权重
+            # 回撤惩罚采用非线性放大：回撤较小时惩罚极弱，回撤较大时（如疫情熔断）平方项使惩罚迅速放大。
+            # 经过经验，由于目前策略top-5设计缺陷，agent必须一致持有五只股票，即使它发现熊市也没办法抛出，
+            # 因此默认仍使用原版奖励，改掉策略后再启用。
+            current_drawdown = float(self.risk_stats.drawdown[0])
+            drawdown_penalty = self.drawdown_penalty * (current_drawdown ** 2)
+
+            # 超额收益 (Alpha)：用当前收益减去大盘特征中的市场平均收益
+            alpha_return = portfolio_return - float(self.market_features[0])
+
+            reward = (
+                alpha_return
+                - self.risk_penalty * risk_20
+                - drawdown_penalty
+                - self.turnover_penalty * turnover_ratio
+            ) * self.reward_scaling
+        else:
+            # 原版奖励：收益 - 风险惩罚 - 换手惩罚
+            reward = (
+                portfolio_return
+                - self.risk_penalty * risk_20
+                - self.turnover_penalty * turnover_ratio
+            ) * self.reward_scaling
 
-        # 经过经验，由于目前策略top-5设计缺陷，agent必须一致持有五只股票，即使它发现熊市也没办法抛出。因此，新的奖励函数效果不佳，以后改掉策略后再启用。
-        
+        if not self.diagnostics:
+            return self._get_state(end_asset, out=self._obs_buf), float(reward), terminated, False, {}
 
+        self.portfolio_return_memory.append(portfolio_return)
+        self.turnover_memory.append(turnover_ratio)
         self.asset_memory.append(end_asset)
         self.date_memory.append(self.current_date)
 
@@ -272,61 +315,133 @@ class StockTradingEnv(gym.Env):
             "turnover": float(turnover_ratio),
             "is_rebalance_day": bool(is_rebalance_day),
         }
-        return self._get_state(), float(reward), terminated, False, info
+        return self._get_state(end_asset), float(reward), terminated, False, info
+
+    def hold_to_next_rebalance(self, with_obs: bool = False):
+        """
+        回测快速路径：非调仓日的动作会被忽略，无需调用策略。持仓不变地推进到下一个调仓日（或回合结束），
+        区间内每日总资产由价格矩阵切片一次性盯市，账户与诊断序列与逐日 step 一致（不计算奖励）。
+        返回 (obs, terminated, values)，values 为推进各日的总资产；当前已是调仓日时不推进。
+        with_obs=True 时额外返回持仓区间内各日（推进前）的观测 [n, obs_dim]，
+        供调用方一次批量推理补记非调仓日的策略输出，与逐日 step 时策略看到的观测一致。
+        """
+        terminated = self.day >= self.end_day
+        if terminated or self._is_rebalance_day():
+            if with_obs:
+                return self._get_state(), terminated, [], np.empty((0,) + self.observation_space.shape, dtype=np.float32)
+            return self._get_state(), terminated, []
+
+        offset = (self.day - self.start_day) % self.rebalance_window
+        stop = min(self.day + self.rebalance_window - offset, self.end_day)
+        begin_asset = self._get_total_asset()
+        # 逐日 step 中总资产为 cash + float32 持仓市值之和，这里按行求和后保持相同的标量运算
+        position_values = (self.price_array[self.day + 1 : stop + 1] * self.holdings).sum(axis=1)
+        values = [float(self.cash + v) for v in position_values]
+        returns = np.diff(np.asarray([begin_asset] + values, dtype=np.float64))
+        returns /= np.maximum([begin_asset] + values[:-1], 1e-8)
+        for ret, value in zip(returns, values):
+            self.risk_stats.update(ret, value)
+
+        held_obs = None
+        if with_obs:
+            first_day = self.day
+            held_obs = np.empty((stop - first_day,) + self.observation_space.shape, dtype=np.float32)
+            held_obs[0] = self._get_state(begin_asset)
+            for i in range(1, stop - first_day):
+                self.day = first_day + i
+                self._update_market_data()
+                held_obs[i] = self._get_state(values[i - 1])
+            self.day = first_day
+
+        last_trade_prices = self.price_array[stop - 1].copy()
+        self.day = stop
+        self._update_market_data()
+        if self.diagnostics:
+            self.last_action_raw = np.full(self.stock_dim, np.nan, dtype=np.float32)
+            self.last_action_shares = np.zeros(self.stock_dim, dtype=np.int32)
+            self.last_trade_shares = np.zeros(self.stock_dim, dtype=np.int32)
+            self.last_trade_prices = last_trade_prices
+            self.last_trade_fees = np.zeros(self.stock_dim, dtype=np.float32)
+            self.portfolio_return_memory.extend(returns.tolist())
+            self.turnover_memory.extend([0.0] * len(values))
+            self.asset_memory.extend(values)
+            self.date_memory.extend(self.date_index[self.day - len(values) + 1 : self.day + 1])
+        if with_obs:
+            return self._get_state(values[-1]), self.day >= self.end_day, values, held_obs
+        return self._get_state(values[-1]), self.day >= self.end_day, values
+
+    def get_state_snapshot(self) -> dict:
+        """
+        导出可恢复的账户快照（交易日、回合窗口、现金、持仓、滚动奖励统计与诊断序列副本），
+        用于从同一交易日分叉比较不同调仓，无需从 reset 重放。
+        """
+        return {
+            "day": self.day,
+            "start_day": self.start_day,
+            "end_day": self.end_day,
+            "cash": self.cash,
+            "holdings": self.holdings.copy(),
+            "risk_stats": self.risk_stats.get_state(),
+            "asset_memory": list(self.asset_memory),
+            "date_memory": list(self.date_memory),
+            "portfolio_return_memory": list(self.portfolio_return_memory),
+            "turnover_memory": list(self.turnover_memory),
+        }
 
-    def _build_market_features(self) -> pd.DataFrame:
-        """构造市场级特征（横截面均值收益、20日波动、turbulence）。"""
-        grouped = self.df.groupby("date", sort=True)
+    def restore(self, snapshot: dict):
+        """
+        恢复到 get_state_snapshot 的状态并返回当时的观测。
+        诊断序列按快照中的副本还原，可在任意快照之间来回切换（含 reset 之后）；last_* 交易明细清零。
+        """
+        if len(snapshot["holdings"]) != self.stock_dim:
+            raise ValueError(
+                f"Snapshot stock_dim={len(snapshot['holdings'])} mismatch with env stock_dim={self.stock_dim}"
+            )
+        self.day = int(snapshot["day"])
+        self.start_day = int(snapshot["start_day"])
+        self.end_day = int(snapshot["end_day"])
+        self.cash = snapshot["cash"]
+        self.holdings = snapshot["holdings"].copy()
+        self.risk_stats.set_state(snapshot["risk_stats"])
+
+        self.asset_memory = list(snapshot["asset_memory"])
+        self.date_memory = list(snapshot["date_memory"])
+        self.portfolio_return_memory = list(snapshot["portfolio_return_memory"])
+        self.turnover_memory = list(snapshot["turnover_memory"])
 
-        if "log_return" in self.df.columns:
-            market_ret = grouped["log_return"].mean()
-        elif "pct_chg" in self.df.columns:
-            market_ret = grouped["pct_chg"].mean() / 100.0
-        else:
-            market_ret = grouped["close"].mean().pct_change().fillna(0.0)
+        self.last_action_raw = np.zeros(self.stock_dim, dtype=np.float32)
+        self.last_action_shares = np.zeros(self.stock_dim, dtype=np.int32)
+        self.last_trade_shares = np.zeros(self.stock_dim, dtype=np.int32)
+        self.last_trade_prices = np.zeros(self.stock_dim, dtype=np.float32)
+        self.last_trade_fees = np.zeros(self.stock_dim, dtype=np.float32)
 
-        market_vol_20 = market_ret.rolling(20).std().fillna(0.0)
+        self._update_market_data()
+        return self._get_state()
 
-        if "turbulence" in self.df.columns:
-            market_turbulence = grouped["turbulence"].mean().fillna(0.0)
-        else:
-            market_turbulence = pd.Series(
-                np.zeros(len(market_ret), dtype=np.float32), index=market_ret.index
-            )
+    def _update_market_data(self):
+        """根据当前 day 取当日价格、特征与市场特征（均为张量视图）。"""
+        self.prices = self.price_array[self.day]
+        self.techs = self.market_data.feature_window(self.day, self.lookback_window).reshape(-1)
+        self.market_features = self.market_array[self.day]
+        self.tradable_today = None if self.tradable is None else self.tradable[self.day]
 
-        return pd.DataFrame(
-            {
-                "market_return": market_ret.fillna(0.0).astype(np.float32),
-                "market_volatility_20": market_vol_20.astype(np.float32),
-                "market_turbulence": market_turbulence.astype(np.float32),
-            }
-        )
+    @property
+    def current_date(self) -> pd.Timestamp:
+        """当前交易日（按需生成 Timestamp，训练步中不产生装箱开销）。"""
+        return self.date_index[self.day]
 
-    def _update_market_data(self):
-        """根据当前 day 加载当日价格、特征与市场特征。"""
-        self.current_date = pd.Timestamp(self.dates[self.day])
-        self.data = self.data_by_date[self.current_date]
-
-        self.current_tics = self.data["tic"].tolist()
-        self.prices = self.data["close"].to_numpy(dtype=np.float32)
-        self.techs = (
-            self.data[self.feature_cols]
-            .replace([np.inf, -np.inf], np.nan)
-            .fillna(0.0)
-            .to_numpy(dtype=np.float32)
-            .flatten()
-        )
-        self.market_features = (
-            self.market_df.loc[
-                self.current_date,
-                ["market_return", "market_volatility_20", "market_turbulence"],
-            ].to_numpy(dtype=np.float32)
-        )
+    def _is_rebalance_day(self) -> bool:
+        """调仓日按回合起点计数，每 rebalance_window 天一次。"""
+        return (self.day - self.start_day) % self.rebalance_window == 0
 
     def _scores_to_target_weights(self, scores: np.ndarray) -> np.ndarray:
         """将动作打分映射为 Top-K 等权目标权重。"""
-        idx = np.argsort(scores)[::-1]
-        selected = idx[: self.top_k]
+        if self.large_universe:
+            selected, valid = select_top_k(scores, self.top_k, self.tradable_today)
+            selected = selected[valid]
+        else:
+            idx = np.argsort(scores)[::-1]
+            selected = idx[: self.top_k]
         w = np.zeros(self.stock_dim, dtype=np.float32)
         w[selected] = 1.0 / float(self.top_k)
         return w
@@ -342,56 +457,45 @@ class StockTradingEnv(gym.Env):
         lot_shares = (raw_shares // self.lot_size) * self.lot_size
         return np.maximum(lot_shares, 0)
 
-    def _get_holding_weights(self, total_asset: float) -> np.ndarray:
-        """计算当前持仓在总资产中的权重。"""
+    def _get_holding_weights(self, total_asset: float, out: np.ndarray = None) -> np.ndarray:
+        """计算当前持仓在总资产中的权重（可写入 out）。"""
+        if out is None:
+            out = np.empty(self.stock_dim, dtype=np.float32)
         if total_asset <= 0:
-            return np.zeros(self.stock_dim, dtype=np.float32)
-        values = self.holdings * self.prices
-        return (values / total_asset).astype(np.float32)
-
-    def _get_state(self):
-        """拼接并返回当前状态向量。"""
-        total_asset = self._get_total_asset()
-        cash_ratio = np.array([self.cash / max(total_asset, 1e-8)], dtype=np.float32)
-        holding_weights = self._get_holding_weights(total_asset)
-        rebalance_flag = np.array(
-            [1.0 if (self.day % self.rebalance_window == 0) else 0.0], dtype=np.float32
-        )
-        return np.concatenate(
-            [cash_ratio, holding_weights, self.techs, self.market_features, rebalance_flag]
-        )
+            out[:] = 0.0
+            return out
+        np.multiply(self.holdings, self.prices, out=out)
+        out /= total_asset
+        return out
+
+    def _get_state(self, total_asset: float = None, out: np.ndarray = None):
+        """拼接并返回当前状态向量（可传入已算好的总资产；out 为复用的缓冲区，缺省时新建）。"""
+        if total_asset is None:
+            total_asset = self._get_total_asset()
+        n = self.stock_dim
+        # 按固定布局直接写入一块向量，避免逐段创建小数组再拼接。
+        state = np.empty(self.observation_space.shape, dtype=np.float32) if out is None else out
+        state[0] = self.cash / max(total_asset, 1e-8)
+        self._get_holding_weights(total_asset, out=state[1 : 1 + n])
+        state[1 + n : -4] = self.techs
+        state[-4:-1] = self.market_features
+        state[-1] = 1.0 if self._is_rebalance_day() else 0.0
+        return state
 
     def _get_total_asset(self):
         """计算总资产=现金+持仓市值。"""
-        return float(self.cash + np.sum(self.prices * self.holdings))
-
-    def _buy(self, index, amount):
-        """买入指定股票，自动处理手续费和整手约束。"""
-        price = float(self.prices[index])
-        max_buy = self.cash // (price * (1.0 + self.buy_cost_pct[index]))
-        buy_shares = min(int(max_buy), int(amount))
-        buy_shares = (buy_shares // self.lot_size) * self.lot_size
-
-        if buy_shares > 0:
-            cost = buy_shares * price * (1.0 + self.buy_cost_pct[index])
-            self.cash -= cost
-            self.holdings[index] += buy_shares
-
-        return int(buy_shares)
-
-    def _sell(self, index, amount):
-        """卖出指定股票，自动处理手续费和整手约束。"""
-        sell_shares = min(int(self.holdings[index]), int(amount))
-        sell_shares = (sell_shares // self.lot_size) * self.lot_size
-
-        if sell_shares > 0:
-            revenue = sell_shares * float(self.prices[index]) * (1.0 - self.sell_cost_pct[index])
-            self.cash += revenue
-            self.holdings[index] -= sell_shares
-
-        return int(sell_shares)
+        return float(self.cash + np.multiply(self.prices, self.holdings, out=self._value_buf).sum())
 
     def get_sb_env(self):
         """返回 Stable-Baselines3 需要的 DummyVecEnv 包装。"""
         env = DummyVecEnv([lambda: self])
         return env, env.reset()
+
+
+def make_shared_env_fn(handle: str, **env_kwargs):
+    """返回可在子进程中调用的构造函数：按共享句柄挂载行情，不复制 DataFrame。"""
+
+    def _init():
+        return StockTradingEnv(df=None, market_data=handle, **env_kwargs)
+
+    return _init
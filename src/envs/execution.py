@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def execute_sell_then_buy(
+    cash,
+    holdings: np.ndarray,
+    prices: np.ndarray,
+    deltas: np.ndarray,
+    buy_cost_pct: np.ndarray,
+    sell_cost_pct: np.ndarray,
+    lot_size: int,
+):
+    """
+    向量化的"先卖后买"撮合内核（单账户 (N,) 或批量账户 (M, N) 均可）：
+    - 卖出：按整手向下取整、不超过当前持仓，互不影响现金约束，一次完成
+    - 买入：按 ticker 顺序依次占用现金，每笔受 现金 // (价格*(1+费率)) 与整手约束；
+      每个账户的买单数不超过有正 delta 的股票数（Top-K 下至多 K 笔），
+      因此按"第 j 笔买单"循环而非按股票循环，结果与逐只股票顺序执行一致
+    返回 (cash, holdings, executed_shares, trade_fees, trade_notional)：
+    executed_shares 为有符号成交股数（卖出为负），费用与成交额按股票给出。
+    """
+    single = np.ndim(holdings) == 1
+    cash = np.array(cash, dtype=np.float64, ndmin=1)
+    holdings = np.array(holdings, dtype=np.float64, ndmin=2)
+    prices = np.asarray(prices, dtype=np.float64).reshape(holdings.shape)
+    deltas = np.asarray(deltas, dtype=np.int64).reshape(holdings.shape)
+    buy_cost_pct = np.asarray(buy_cost_pct, dtype=np.float64)
+    sell_cost_pct = np.asarray(sell_cost_pct, dtype=np.float64)
+    lot_size = int(lot_size)
+
+    sold = np.minimum(holdings.astype(np.int64), np.maximum(-deltas, 0))
+    sold -= sold % lot_size
+    sell_notional = sold * prices
+    cash += (sell_notional * (1.0 - sell_cost_pct)).sum(axis=1)
+    holdings -= sold
+
+    want = np.maximum(deltas, 0)
+    bought = np.zeros_like(want)
+    unit_cost = prices * (1.0 + buy_cost_pct)
+    if single:
+        # 单账户：买单至多 K 笔，直接逐笔标量撮合，避免批量索引的固定开销。
+        remaining = float(cash[0])
+        for col in np.flatnonzero(want[0]):
+            unit = float(unit_cost[0, col])
+            shares = min(int(remaining // unit), int(want[0, col]))
+            shares -= shares % lot_size
+            if shares > 0:
+                remaining -= shares * unit
+                bought[0, col] = shares
+        cash[0] = remaining
+    else:
+        n_orders = int(np.count_nonzero(want, axis=1).max(initial=0))
+        if n_orders > 0:
+            # 每行把有买单的列按原 ticker 顺序排到前面，压缩成 (M, K) 后逐笔撮合。
+            order = np.argsort(want <= 0, axis=1, kind="stable")[:, :n_orders]
+            amount = np.take_along_axis(want, order, axis=1)
+            order_cost = np.take_along_axis(unit_cost, order, axis=1)
+            filled = np.zeros_like(amount)
+            for j in range(n_orders):
+                shares = np.minimum(cash // order_cost[:, j], amount[:, j]).astype(np.int64)
+                shares -= shares % lot_size
+                cash -= shares * order_cost[:, j]
+                filled[:, j] = shares
+            np.put_along_axis(bought, order, filled, axis=1)
+    holdings += bought
+
+    executed = bought - sold
+    buy_notional = bought * prices
+    fees = sell_notional * sell_cost_pct + buy_notional * buy_cost_pct
+    notional = sell_notional + buy_notional
+
+    if single:
+        return float(cash[0]), holdings[0], executed[0], fees[0], notional[0]
+    return cash, holdings, executed, fees, notional
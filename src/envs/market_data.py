@@ -0,0 +1,464 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+MARKET_FEATURE_COLS = ["market_return", "market_volatility_20", "market_turbulence"]
+
+# 特征列：配置指标 + 扩展指标 + 自动补充数值列。
+BASE_NON_FEATURE_COLS = {"date", "tic", "name", "industry", "feature_ready"}
+PREFERRED_EXTRA_COLS = [
+    "log_return",
+    "return_20",
+    "momentum_60",
+    "momentum_120",
+    "momentum_252",
+    "volatility_20",
+    "volatility_annual",
+    "sma_5",
+    "sma_10",
+    "sma_20",
+    "sma_30",
+    "sma_60",
+    "bias_20",
+    "bias_60",
+    "amplitude",
+    "intraday_return",
+    "amount_20_mean",
+    "volume_20_mean",
+    "volume_ratio",
+    "high_20",
+    "low_20",
+    "position_20",
+    "turbulence",
+]
+
+_ARRAY_NAMES = ("dates", "prices", "features", "market")
+_RAGGED_ARRAY_NAMES = ("tradable", "row_ptr", "row_tic")
+_META_FILE = "meta.json"
+# 张量构建逻辑或落盘格式变化时递增，使旧缓存自动失效。
+CACHE_VERSION = 2
+# 磁盘缓存上限：每次写入新条目后，删除超过 CACHE_MAX_AGE_DAYS 未使用的条目，
+# 再按最近使用时间从旧到新删除，直到总大小不超过 CACHE_MAX_BYTES
+CACHE_MAX_BYTES = 4 * 1024 ** 3
+CACHE_MAX_AGE_DAYS = 30
+
+# 进程内复用：id(df) -> (df 弱引用, 形状与配置, 缓存键)；缓存目录 -> 已挂载的 MarketData。
+# 同一 DataFrame 对象再次构造环境时不重新哈希（假定构造环境后不再原地修改该 DataFrame）。
+_KEY_MEMO = {}
+_LOADED = {}
+
+
+def select_feature_cols(df: pd.DataFrame, tech_indicator_list: list) -> list:
+    """按 配置指标 -> 扩展指标 -> 其余数值列 的顺序确定状态特征列。"""
+    tech_indicator_list = tech_indicator_list or []
+    configured_cols = [
+        col
+        for col in tech_indicator_list
+        if col in df.columns and col not in BASE_NON_FEATURE_COLS
+    ]
+    extra_cols = [
+        col
+        for col in PREFERRED_EXTRA_COLS
+        if col in df.columns and col not in configured_cols
+    ]
+    auto_numeric_cols = [
+        col
+        for col in df.select_dtypes(include=[np.number]).columns.tolist()
+        if col not in configured_cols
+        and col not in extra_cols
+        and col not in {"feature_ready"}
+    ]
+    return configured_cols + extra_cols + auto_numeric_cols
+
+
+def build_market_features(df: pd.DataFrame) -> pd.DataFrame:
+    """构造市场级特征（横截面均值收益、20日波动、turbulence）。"""
+    grouped = df.groupby("date", sort=True)
+
+    if "log_return" in df.columns:
+        market_ret = grouped["log_return"].mean()
+    elif "pct_chg" in df.columns:
+        market_ret = grouped["pct_chg"].mean() / 100.0
+    else:
+        market_ret = grouped["close"].mean().pct_change().fillna(0.0)
+
+    market_vol_20 = market_ret.rolling(20).std().fillna(0.0)
+
+    if "turbulence" in df.columns:
+        market_turbulence = grouped["turbulence"].mean().fillna(0.0)
+    else:
+        market_turbulence = pd.Series(
+            np.zeros(len(market_ret), dtype=np.float32), index=market_ret.index
+        )
+
+    return pd.DataFrame(
+        {
+            "market_return": market_ret.fillna(0.0).astype(np.float32),
+            "market_volatility_20": market_vol_20.astype(np.float32),
+            "market_turbulence": market_turbulence.astype(np.float32),
+        }
+    )
+
+
+def market_data_key(
+    df: pd.DataFrame, stock_dim: int, tech_indicator_list: list, allow_ragged: bool = False
+) -> str:
+    """缓存键：输入表内容与列结构 + 股票数 + 指标配置 + 存储模式 + 缓存版本 的 sha1。"""
+    digest = hashlib.sha1()
+    header = {
+        "version": CACHE_VERSION,
+        "stock_dim": int(stock_dim),
+        "allow_ragged": bool(allow_ragged),
+        "tech_indicator_list": list(tech_indicator_list or []),
+        "columns": [str(col) for col in df.columns],
+        "dtypes": [str(dtype) for dtype in df.dtypes],
+    }
+    digest.update(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _memo_key(df: pd.DataFrame, stock_dim: int, tech_indicator_list: list, allow_ragged: bool) -> str:
+    """同一 DataFrame 对象与配置只计算一次缓存键。"""
+    config = (df.shape, int(stock_dim), tuple(tech_indicator_list or []), bool(allow_ragged))
+    entry = _KEY_MEMO.get(id(df))
+    if entry is not None and entry[0]() is df and entry[1] == config:
+        return entry[2]
+    key = market_data_key(df, stock_dim, tech_indicator_list, allow_ragged)
+    _KEY_MEMO[id(df)] = (weakref.ref(df, lambda _, i=id(df): _KEY_MEMO.pop(i, None)), config, key)
+    return key
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def prune_cache(
+    cache_dir: str,
+    max_bytes: int = CACHE_MAX_BYTES,
+    max_age_days: float = CACHE_MAX_AGE_DAYS,
+    keep: tuple = (),
+) -> list:
+    """
+    清理行情缓存目录：最近使用时间取 meta.json 的 mtime（命中时刷新）。
+    先删除超过 max_age_days 未使用的条目，再按最近使用从旧到新删除直到总大小不超过 max_bytes；
+    keep 中的缓存键不删除，残留的临时目录一并清理。返回被删除的目录列表。
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    now = time.time()
+    entries = []
+    removed = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path):
+            continue
+        meta = os.path.join(path, _META_FILE)
+        if name.startswith("."):
+            # 写入中断留下的临时目录，超过一天即视为残留
+            if now - os.path.getmtime(path) > 86400:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+            continue
+        used = os.path.getmtime(meta) if os.path.isfile(meta) else os.path.getmtime(path)
+        entries.append((used, name, path))
+
+    entries.sort()
+    kept = []
+    for used, name, path in entries:
+        if name not in keep and max_age_days is not None and now - used > max_age_days * 86400:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+        else:
+            kept.append((name, path, _dir_size(path)))
+
+    if max_bytes is not None:
+        total = sum(size for _, _, size in kept)
+        for name, path, size in kept:
+            if total <= max_bytes:
+                break
+            if name in keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+            total -= size
+    for path in removed:
+        _LOADED.pop(path, None)
+    return removed
+
+
+class MarketData:
+    """
+    只读行情张量容器：
+    - 元数据：交易日、固定 ticker 顺序、特征列
+    - 张量：价格 [T, N]、股票特征 [T, N, F]、市场特征 [T, 3]（均为 float32）
+    - 可落盘为 .npy 目录并以 mmap 只读挂载，多进程共享同一份物理内存
+    - 非齐整成分（大股票池）：可交易掩码 tradable [T, N]，价格按 ticker 前向填充，
+      股票特征按日期紧凑存储为 [R, F]（R 为实际行数），row_ptr/row_tic 定位每日行
+    """
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        tickers: list,
+        feature_cols: list,
+        prices: np.ndarray,
+        features: np.ndarray,
+        market: np.ndarray,
+        market_cols: list = None,
+        tradable: np.ndarray = None,
+        row_ptr: np.ndarray = None,
+        row_tic: np.ndarray = None,
+    ):
+        """直接由数组构造；通常使用 from_dataframe 或 attach。"""
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.feature_cols = list(feature_cols)
+        self.market_cols = list(market_cols or MARKET_FEATURE_COLS)
+        self.prices = prices
+        self.features = features
+        self.market = market
+        self.tradable = tradable
+        self.row_ptr = row_ptr
+        self.row_tic = row_tic
+
+    @property
+    def ragged(self) -> bool:
+        """是否为紧凑（非齐整成分）存储。"""
+        return self.row_ptr is not None
+
+    def features_at(self, days) -> np.ndarray:
+        """取指定交易日的股票特征：单日返回 [N, F]，日期数组返回 [M, N, F]；缺席股票为 0。"""
+        if not self.ragged:
+            return self.features[days]
+        days = np.asarray(days)
+        out = np.zeros(days.shape + (len(self.tickers), self.features.shape[1]), dtype=np.float32)
+        for pos, day in np.ndenumerate(days):
+            lo, hi = self.row_ptr[day], self.row_ptr[day + 1]
+            out[pos][self.row_tic[lo:hi]] = self.features[lo:hi]
+        return out
+
+    def feature_window(self, day: int, length: int) -> np.ndarray:
+        """
+        截至 day 的最近 length 个交易日特征 [length, N, F]（由旧到新），数据起点之前补 0。
+        齐整存储且历史足够时，连续交易日在内存中相邻，直接返回零拷贝切片。
+        """
+        lo = day - length + 1
+        if not self.ragged and lo >= 0:
+            return self.features[lo : day + 1]
+        out = np.zeros((length, len(self.tickers), self.features.shape[-1]), dtype=np.float32)
+        start = max(lo, 0)
+        out[start - lo :] = self.features_at(np.arange(start, day + 1))
+        return out
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: pd.DataFrame,
+        stock_dim: int,
+        tech_indicator_list: list,
+        allow_ragged: bool = False,
+    ):
+        """
+        由长表行情构建张量：固定 ticker 顺序、清洗 inf/NaN。
+        默认要求每日股票齐全；allow_ragged=True 时允许成分变动，缺席股票记为不可交易。
+        """
+        tickers = sorted(df["tic"].unique().tolist())
+        if len(tickers) != stock_dim:
+            raise ValueError(
+                f"stock_dim={stock_dim} mismatch with df tickers={len(tickers)}"
+            )
+
+        feature_cols = select_feature_cols(df, tech_indicator_list)
+        if not feature_cols:
+            raise ValueError("No valid feature columns found in processed data.")
+
+        frame = df.assign(date=pd.to_datetime(df["date"]))
+        frame = frame.sort_values(["date", "tic"]).reset_index(drop=True)
+        dates = frame["date"].drop_duplicates().to_numpy()
+        n_dates = len(dates)
+        if allow_ragged:
+            return cls._from_ragged_frame(frame, dates, tickers, feature_cols)
+
+        counts = frame.groupby("date", sort=True)["tic"].size().to_numpy()
+        bad = np.flatnonzero(counts != stock_dim)
+        if bad.size > 0:
+            d = dates[bad[0]]
+            raise ValueError(
+                f"Date {pd.Timestamp(d).date()} has {counts[bad[0]]} tickers, expected {stock_dim}"
+            )
+
+        # 已按 (date, tic) 排序，每日行顺序即固定 ticker 顺序，可直接 reshape。
+        tic_grid = frame["tic"].to_numpy().reshape(n_dates, stock_dim)
+        if not (tic_grid == np.asarray(tickers, dtype=object)).all():
+            raise ValueError("Duplicated (date, tic) rows found in processed data.")
+
+        prices = np.ascontiguousarray(
+            frame["close"].to_numpy(dtype=np.float32).reshape(n_dates, stock_dim)
+        )
+        features = np.nan_to_num(
+            frame[feature_cols].to_numpy(dtype=np.float32),
+            nan=0.0,
+            posinf=0.0,
+            neginf=0.0,
+        )
+        features = np.ascontiguousarray(features.reshape(n_dates, stock_dim, len(feature_cols)))
+        market = np.ascontiguousarray(
+            build_market_features(frame)[MARKET_FEATURE_COLS].to_numpy(dtype=np.float32)
+        )
+        return cls(dates, tickers, feature_cols, prices, features, market)
+
+    @classmethod
+    def _from_ragged_frame(cls, frame: pd.DataFrame, dates: np.ndarray, tickers: list, feature_cols: list):
+        """非齐整成分：按 (date, tic) 整数坐标散射，特征只保存实际存在的行。"""
+        n_dates, n_tics = len(dates), len(tickers)
+        date_idx = np.searchsorted(dates, frame["date"].to_numpy())
+        tic_idx = np.searchsorted(np.asarray(tickers, dtype=object), frame["tic"].to_numpy())
+        flat = date_idx * n_tics + tic_idx
+        if np.any(np.diff(flat) == 0):
+            raise ValueError("Duplicated (date, tic) rows found in processed data.")
+
+        tradable = np.zeros((n_dates, n_tics), dtype=bool)
+        tradable[date_idx, tic_idx] = True
+
+        # 停牌/调出后的持仓按最近收盘价估值；上市前无价格记为 0。
+        prices = np.full((n_dates, n_tics), np.nan, dtype=np.float32)
+        prices[date_idx, tic_idx] = frame["close"].to_numpy(dtype=np.float32)
+        prices = np.ascontiguousarray(
+            pd.DataFrame(prices).ffill().fillna(0.0).to_numpy(dtype=np.float32)
+        )
+
+        features = np.nan_to_num(
+            frame[feature_cols].to_numpy(dtype=np.float32),
+            nan=0.0,
+            posinf=0.0,
+            neginf=0.0,
+        )
+        row_ptr = np.searchsorted(date_idx, np.arange(n_dates + 1)).astype(np.int64)
+        market = np.ascontiguousarray(
+            build_market_features(frame)[MARKET_FEATURE_COLS].to_numpy(dtype=np.float32)
+        )
+        return cls(
+            dates,
+            tickers,
+            feature_cols,
+            prices,
+            np.ascontiguousarray(features),
+            market,
+            tradable=tradable,
+            row_ptr=row_ptr,
+            row_tic=tic_idx.astype(np.int32),
+        )
+
+    @classmethod
+    def load_or_build(
+        cls,
+        df: pd.DataFrame,
+        stock_dim: int,
+        tech_indicator_list: list,
+        cache_dir: str,
+        allow_ragged: bool = False,
+    ):
+        """
+        按 (df, 指标配置, 存储模式) 哈希查找磁盘缓存：命中则 mmap 挂载，否则构建并写入缓存。
+        进程内同一 DataFrame 对象不重复哈希，同一缓存条目只挂载一次；写入新条目后按 prune_cache 的上限清理。
+        """
+        key = _memo_key(df, stock_dim, tech_indicator_list, allow_ragged)
+        path = os.path.join(cache_dir, key)
+        meta_path = os.path.join(path, _META_FILE)
+        # meta.json 最后写入，存在即说明缓存完整。
+        if os.path.isfile(meta_path):
+            try:
+                # 刷新最近使用时间，供 prune_cache 按使用先后清理
+                os.utime(meta_path)
+            except OSError:
+                pass
+            if path not in _LOADED:
+                _LOADED[path] = cls.attach(path)
+            return _LOADED[path]
+
+        data = cls.from_dataframe(df, stock_dim, tech_indicator_list, allow_ragged)
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时目录再整体改名，并发写同一缓存时不会读到半成品。
+        tmp_path = tempfile.mkdtemp(prefix=f".{key}.", dir=cache_dir)
+        data.save(tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        _LOADED[path] = data
+        prune_cache(cache_dir, keep=(key,))
+        return data
+
+    @property
+    def market_df(self) -> pd.DataFrame:
+        """市场特征的 DataFrame 视图（按日期索引）。"""
+        return pd.DataFrame(
+            self.market, index=pd.DatetimeIndex(self.dates), columns=self.market_cols
+        )
+
+    def save(self, path: str) -> str:
+        """落盘为 .npy 目录（可 mmap）+ meta.json，返回目录路径。"""
+        os.makedirs(path, exist_ok=True)
+        names = _ARRAY_NAMES + (_RAGGED_ARRAY_NAMES if self.ragged else ())
+        for name in names:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        meta = {
+            "tickers": self.tickers,
+            "feature_cols": self.feature_cols,
+            "market_cols": self.market_cols,
+            "ragged": self.ragged,
+        }
+        with open(os.path.join(path, _META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return path
+
+    @classmethod
+    def attach(cls, path: str, mmap: bool = True):
+        """按目录挂载行情；mmap=True 时张量为只读内存映射，不复制数据。"""
+        with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        names = _ARRAY_NAMES + (_RAGGED_ARRAY_NAMES if meta.get("ragged") else ())
+        arrays = {
+            name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+            for name in names
+        }
+        return cls(
+            arrays["dates"],
+            meta["tickers"],
+            meta["feature_cols"],
+            arrays["prices"],
+            arrays["features"],
+            arrays["market"],
+            meta["market_cols"],
+            tradable=arrays.get("tradable"),
+            row_ptr=arrays.get("row_ptr"),
+            row_tic=arrays.get("row_tic"),
+        )
+
+    def share(self, root: str = None) -> str:
+        """写入共享目录（Linux 下优先 /dev/shm）并返回句柄路径，供子进程 attach。"""
+        if root is None:
+            root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        handle = tempfile.mkdtemp(prefix="market_data_", dir=root)
+        return self.save(handle)
+
+    @staticmethod
+    def release(handle: str) -> None:
+        """删除 share() 创建的共享目录。"""
+        shutil.rmtree(handle, ignore_errors=True)
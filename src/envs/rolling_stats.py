@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class RollingRiskStats:
+    """
+    奖励用的增量风险统计（预分配环形缓冲，每步 O(1) 更新）：
+    - 最近 `window` 期收益的均值/方差（滑动 Welford，ddof=0）
+    - 每填满一轮窗口由缓冲区精确重算一次均值/方差（均摊 O(1)），避免滑动更新的舍入误差长期累积
+    - 净值历史峰值与当前回撤
+    - 以 (num_accounts,) 数组存储，单环境与批量环境共用
+    """
+
+    def __init__(self, window: int = 20, num_accounts: int = 1):
+        """预分配收益缓冲与统计量。"""
+        self.window = int(max(1, window))
+        self.num_accounts = int(num_accounts)
+        self._rows = np.arange(self.num_accounts)
+
+        self._buf = np.zeros((self.num_accounts, self.window), dtype=np.float64)
+        self.count = np.zeros(self.num_accounts, dtype=np.int64)
+        self.mean = np.zeros(self.num_accounts, dtype=np.float64)
+        self._m2 = np.zeros(self.num_accounts, dtype=np.float64)
+        self.peak = np.zeros(self.num_accounts, dtype=np.float64)
+        self.drawdown = np.zeros(self.num_accounts, dtype=np.float64)
+
+    def reset(self, initial_value, rows=None) -> None:
+        """清空指定账户（默认全部）的统计，并以初始净值作为峰值。"""
+        rows = self._rows if rows is None else rows
+        self._buf[rows] = 0.0
+        self.count[rows] = 0
+        self.mean[rows] = 0.0
+        self._m2[rows] = 0.0
+        self.peak[rows] = initial_value
+        self.drawdown[rows] = 0.0
+
+    def update(self, ret, value) -> None:
+        """追加一期收益与期末净值；窗口已满时用新值替换最旧值。"""
+        if self.num_accounts == 1:
+            self._update_single(float(np.ravel(ret)[0]), float(np.ravel(value)[0]))
+            return
+
+        ret = np.asarray(ret, dtype=np.float64).reshape(self.num_accounts)
+        value = np.asarray(value, dtype=np.float64).reshape(self.num_accounts)
+
+        slot = self.count % self.window
+        full = self.count >= self.window
+        old = self._buf[self._rows, slot]
+        n = np.minimum(self.count + 1, self.window)
+
+        old_mean = self.mean
+        # 未满：普通 Welford 追加；已满：滑动 Welford（移出 old、移入 ret）。
+        new_mean = np.where(full, old_mean + (ret - old) / n, old_mean + (ret - old_mean) / n)
+        self._m2 = np.where(
+            full,
+            self._m2 + (ret - old) * (ret - new_mean + old - old_mean),
+            self._m2 + (ret - old_mean) * (ret - new_mean),
+        )
+        self.mean = new_mean
+        self._buf[self._rows, slot] = ret
+        self.count += 1
+        wrapped = np.flatnonzero(self.count % self.window == 0)
+        if wrapped.size:
+            self._recompute(wrapped)
+
+        self.peak = np.maximum(self.peak, value)
+        self.drawdown = np.maximum(0.0, (self.peak - value) / np.maximum(self.peak, 1e-8))
+
+    def _update_single(self, ret: float, value: float) -> None:
+        """单账户标量快速路径，公式与 update 相同，避免小数组运算的固定开销。"""
+        count = int(self.count[0])
+        slot = count % self.window
+        old = float(self._buf[0, slot])
+        old_mean = float(self.mean[0])
+        m2 = float(self._m2[0])
+
+        if count >= self.window:
+            mean = old_mean + (ret - old) / self.window
+            m2 += (ret - old) * (ret - mean + old - old_mean)
+        else:
+            mean = old_mean + (ret - old_mean) / (count + 1)
+            m2 += (ret - old_mean) * (ret - mean)
+
+        self._buf[0, slot] = ret
+        self.count[0] = count + 1
+        self.mean[0] = mean
+        self._m2[0] = m2
+        if slot == self.window - 1:
+            self._recompute(0)
+
+        peak = max(float(self.peak[0]), value)
+        self.peak[0] = peak
+        self.drawdown[0] = max(0.0, (peak - value) / max(peak, 1e-8))
+
+    def _recompute(self, rows) -> None:
+        """窗口恰好填满一轮时，由缓冲区重算指定账户的均值与 M2。"""
+        buf = self._buf[rows]
+        mean = buf.mean(axis=-1)
+        self.mean[rows] = mean
+        self._m2[rows] = np.square(buf - mean[..., None]).sum(axis=-1)
+
+    def get_state(self) -> dict:
+        """导出全部统计量的副本（紧凑数组），用于环境快照。"""
+        return {
+            "buf": self._buf.copy(),
+            "count": self.count.copy(),
+            "mean": self.mean.copy(),
+            "m2": self._m2.copy(),
+            "peak": self.peak.copy(),
+            "drawdown": self.drawdown.copy(),
+        }
+
+    def set_state(self, state: dict) -> None:
+        """由 get_state 的结果恢复统计量（复制写入，快照可重复使用）。"""
+        if state["buf"].shape != self._buf.shape:
+            raise ValueError(
+                f"Rolling stats shape mismatch: {state['buf'].shape} vs {self._buf.shape}"
+            )
+        self._buf[...] = state["buf"]
+        self.count[...] = state["count"]
+        self.mean[...] = state["mean"]
+        self._m2[...] = state["m2"]
+        self.peak[...] = state["peak"]
+        self.drawdown[...] = state["drawdown"]
+
+    def risk_of(self, index: int = 0) -> float:
+        """单个账户的风险项（标量），供单环境奖励使用。"""
+        count = int(self.count[index])
+        if count < self.window:
+            return 0.0
+        return max(float(self._m2[index]) / self.window, 0.0) ** 0.5
+
+    @property
+    def ready(self) -> np.ndarray:
+        """窗口是否已填满。"""
+        return self.count >= self.window
+
+    @property
+    def var(self) -> np.ndarray:
+        """当前窗口收益方差（ddof=0）。"""
+        n = np.maximum(np.minimum(self.count, self.window), 1)
+        return np.maximum(self._m2 / n, 0.0)
+
+    @property
+    def std(self) -> np.ndarray:
+        """当前窗口收益标准差（ddof=0）。"""
+        return np.sqrt(self.var)
+
+    def risk(self) -> np.ndarray:
+        """奖励使用的风险项：窗口填满后为收益标准差，否则为 0。"""
+        return np.where(self.ready, self.std, 0.0)
@@ -0,0 +1,273 @@
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from src.envs.env_stocktrading import (
+    RISK_WINDOW,
+    StockTradingEnv,
+    sample_episode_window,
+    select_top_k,
+)
+from src.envs.execution import execute_sell_then_buy
+from src.envs.rolling_stats import RollingRiskStats
+
+
+class StockTradingVecEnv(VecEnv):
+    """
+    原生批量化的 Top-K 交易环境（SB3 VecEnv）：
+    - 以 (M, N) 数组同时模拟 M 个独立账户，共享同一份行情张量
+    - 每个账户有独立的起始偏移与随机数发生器
+    - 现金、持仓、Top-K 选股、整手取整与奖励在一次 NumPy 计算中完成
+    - 交易与奖励口径与 StockTradingEnv 保持一致
+    """
+
+    def __init__(
+        self,
+        env: StockTradingEnv,
+        num_envs: int,
+        random_start: bool = True,
+        min_episode_steps: int = 60,
+        seed: int = None,
+        max_episode_steps: int = None,
+    ):
+        """以一个已构建的 StockTradingEnv 为模板，复用其行情张量与交易参数。"""
+        self.stock_dim = env.stock_dim
+        self.initial_amount = env.initial_amount
+        self.buy_cost_pct = env.buy_cost_pct.astype(np.float64)
+        self.sell_cost_pct = env.sell_cost_pct.astype(np.float64)
+        self.reward_scaling = env.reward_scaling
+        self.top_k = env.top_k
+        self.rebalance_window = env.rebalance_window
+        self.lot_size = env.lot_size
+        self.risk_penalty = env.risk_penalty
+        self.turnover_penalty = env.turnover_penalty
+        self.reward_mode = env.reward_mode
+        self.drawdown_penalty = env.drawdown_penalty
+        self.diagnostics = env.diagnostics
+        self.tickers = env.tickers
+        self.feature_cols = env.feature_cols
+
+        self.market_data = env.market_data
+        self.large_universe = env.large_universe
+        self.tradable = env.tradable
+        self.lookback_window = env.lookback_window
+        self._window_offsets = np.arange(1 - self.lookback_window, 1)
+        self.price_array = env.price_array
+        self.market_array = env.market_array
+        self.max_step = env.max_step
+
+        self.random_start = bool(random_start)
+        self.min_episode_steps = int(max(1, min_episode_steps))
+        self.max_episode_steps = None if max_episode_steps is None else int(max_episode_steps)
+        self.render_mode = None
+
+        super().__init__(num_envs, env.observation_space, env.action_space)
+
+        self._rngs = [
+            np.random.default_rng(None if seed is None else seed + i) for i in range(num_envs)
+        ]
+        self._actions = None
+
+        # 账户状态：全部为 (M,) 或 (M, N) 数组。
+        self.days = np.zeros(num_envs, dtype=np.int64)
+        self.start_days = np.zeros(num_envs, dtype=np.int64)
+        self.end_days = np.full(num_envs, self.max_step, dtype=np.int64)
+        self.cash = np.full(num_envs, self.initial_amount, dtype=np.float64)
+        self.holdings = np.zeros((num_envs, self.stock_dim), dtype=np.float64)
+        self.risk_stats = RollingRiskStats(window=RISK_WINDOW, num_accounts=num_envs)
+
+        # 最近一步各账户的期末总资产、成交额与手续费（在终止账户自动重置之前记录）
+        self.last_end_asset = np.full(num_envs, self.initial_amount, dtype=np.float64)
+        self.last_trade_notional = np.zeros(num_envs, dtype=np.float64)
+        self.last_trade_fees = np.zeros(num_envs, dtype=np.float64)
+
+    def reset(self):
+        """重置全部账户；若调用过 seed() 则按新种子重建各账户的随机数发生器。"""
+        for i, s in enumerate(self._seeds):
+            if s is not None:
+                self._rngs[i] = np.random.default_rng(s)
+        self._reset_seeds()
+        self._reset_options()
+
+        self._reset_accounts(np.arange(self.num_envs))
+        return self._get_obs()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """缓存本步动作，实际计算在 step_wait 中一次完成。"""
+        self._actions = actions
+
+    def step_wait(self):
+        """对全部账户执行一步：调仓日先卖后买，随后按次日价格结算收益与奖励。"""
+        n_envs = self.num_envs
+        actions = np.asarray(self._actions, dtype=np.float32).reshape(n_envs, self.stock_dim)
+        actions = np.clip(actions, -1.0, 1.0)
+
+        prices = self.price_array[self.days].astype(np.float64)
+        begin_asset = self.cash + np.sum(self.holdings * prices, axis=1)
+        is_rebalance = (self.days - self.start_days) % self.rebalance_window == 0
+        traded_notional = np.zeros(n_envs, dtype=np.float64)
+        trade_fees = np.zeros(n_envs, dtype=np.float64)
+
+        if is_rebalance.any():
+            rows = np.flatnonzero(is_rebalance)
+            mask = None if self.tradable is None else self.tradable[self.days[rows]]
+            target_shares = self._target_shares(
+                actions[rows], prices[rows], begin_asset[rows], mask
+            )
+            deltas = target_shares - self.holdings[rows].astype(np.int64)
+            if mask is not None:
+                deltas[~mask] = 0
+
+            cash, holdings, _, fees, notional = execute_sell_then_buy(
+                self.cash[rows],
+                self.holdings[rows],
+                prices[rows],
+                deltas,
+                self.buy_cost_pct,
+                self.sell_cost_pct,
+                self.lot_size,
+            )
+            self.cash[rows] = cash
+            self.holdings[rows] = holdings
+            traded_notional[rows] = notional.sum(axis=1)
+            trade_fees[rows] = fees.sum(axis=1)
+
+        self.days += 1
+        terminated = self.days >= self.end_days
+
+        end_prices = self.price_array[self.days].astype(np.float64)
+        end_asset = self.cash + np.sum(self.holdings * end_prices, axis=1)
+        safe_begin = np.maximum(begin_asset, 1e-8)
+        portfolio_return = (end_asset - begin_asset) / safe_begin
+        turnover_ratio = traded_notional / safe_begin
+        self.last_end_asset = end_asset
+        self.last_trade_notional = traded_notional
+        self.last_trade_fees = trade_fees
+
+        self.risk_stats.update(portfolio_return, end_asset)
+        risk_20 = self.risk_stats.risk()
+
+        if self.reward_mode == "shaped":
+            alpha_return = portfolio_return - self.market_array[self.days, 0]
+            rewards = (
+                alpha_return
+                - self.risk_penalty * risk_20
+                - self.drawdown_penalty * self.risk_stats.drawdown ** 2
+                - self.turnover_penalty * turnover_ratio
+            ) * self.reward_scaling
+        else:
+            rewards = (
+                portfolio_return
+                - self.risk_penalty * risk_20
+                - self.turnover_penalty * turnover_ratio
+            ) * self.reward_scaling
+
+        if self.diagnostics:
+            infos = [
+                {
+                    "portfolio_return": float(portfolio_return[i]),
+                    "risk_20": float(risk_20[i]),
+                    "turnover": float(turnover_ratio[i]),
+                    "is_rebalance_day": bool(is_rebalance[i]),
+                }
+                for i in range(n_envs)
+            ]
+        else:
+            infos = [{} for _ in range(n_envs)]
+
+        obs = self._get_obs()
+        if terminated.any():
+            done_rows = np.flatnonzero(terminated)
+            for i in done_rows:
+                infos[i]["terminal_observation"] = obs[i].copy()
+                infos[i]["TimeLimit.truncated"] = False
+            self._reset_accounts(done_rows)
+            obs[done_rows] = self._get_obs(done_rows)
+
+        return obs, rewards.astype(np.float32), terminated.copy(), infos
+
+    def _reset_accounts(self, rows: np.ndarray) -> None:
+        """重置指定账户：按各自随机数发生器抽取回合窗口，并清空现金/持仓/收益缓存。"""
+        for i in rows:
+            start, end = 0, self.max_step
+            if self.random_start:
+                start, end = sample_episode_window(
+                    self._rngs[i], self.max_step, self.min_episode_steps, self.max_episode_steps
+                )
+            self.start_days[i] = start
+            self.end_days[i] = end
+        self.days[rows] = self.start_days[rows]
+        self.cash[rows] = self.initial_amount
+        self.holdings[rows] = 0.0
+        self.risk_stats.reset(self.initial_amount, rows)
+
+    def _target_shares(
+        self,
+        scores: np.ndarray,
+        prices: np.ndarray,
+        total_asset: np.ndarray,
+        mask: np.ndarray = None,
+    ) -> np.ndarray:
+        """将各账户打分映射为 Top-K 等权目标股数，并按整手向下取整。"""
+        target_weights = np.zeros(scores.shape, dtype=np.float32)
+        if self.large_universe:
+            selected, valid = select_top_k(scores, self.top_k, mask)
+            weights = np.where(valid, 1.0 / float(self.top_k), 0.0).astype(np.float32)
+            np.put_along_axis(target_weights, selected, weights, axis=1)
+        else:
+            selected = np.argsort(scores, axis=1)[:, ::-1][:, : self.top_k]
+            np.put_along_axis(target_weights, selected, 1.0 / float(self.top_k), axis=1)
+
+        target_value = target_weights * total_asset[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            raw_shares = np.floor(target_value / np.maximum(prices, 1e-8))
+        raw_shares = np.nan_to_num(raw_shares, nan=0.0, posinf=0.0, neginf=0.0).astype(np.int64)
+        lot_shares = (raw_shares // self.lot_size) * self.lot_size
+        return np.maximum(lot_shares, 0)
+
+    def _get_obs(self, rows: np.ndarray = None) -> np.ndarray:
+        """批量拼接状态：现金占比 + 持仓权重 + 股票特征 + 市场特征 + 调仓标记。"""
+        if rows is None:
+            rows = np.arange(self.num_envs)
+        days = self.days[rows]
+        n_rows = len(rows)
+        n = self.stock_dim
+
+        prices = self.price_array[days].astype(np.float64)
+        position_value = self.holdings[rows] * prices
+        total_asset = self.cash[rows] + position_value.sum(axis=1)
+        positive = total_asset > 0
+        safe_total = np.where(positive, total_asset, 1.0)
+
+        obs = np.empty((n_rows,) + self.observation_space.shape, dtype=np.float32)
+        obs[:, 0] = self.cash[rows] / np.maximum(total_asset, 1e-8)
+        obs[:, 1 : 1 + n] = np.where(positive[:, None], position_value / safe_total[:, None], 0.0)
+        # 各账户最近 L 日的特征窗口，数据起点之前补 0。
+        window_days = days[:, None] + self._window_offsets
+        features = self.market_data.features_at(np.maximum(window_days, 0))
+        features[window_days < 0] = 0.0
+        obs[:, 1 + n : -4] = features.reshape(n_rows, -1)
+        obs[:, -4:-1] = self.market_array[days]
+        obs[:, -1] = (days - self.start_days[rows]) % self.rebalance_window == 0
+        return obs
+
+    def close(self) -> None:
+        """批量环境不持有外部资源，无需清理。"""
+        return None
+
+    def get_attr(self, attr_name, indices=None):
+        """返回批量环境上的属性（各账户共享同一份）。"""
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None) -> None:
+        """设置批量环境上的属性（对全部账户生效）。"""
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """调用批量环境上的方法，按账户数返回结果列表。"""
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        """批量环境没有 gym.Wrapper 包装。"""
+        return [False for _ in self._get_indices(indices)]
+
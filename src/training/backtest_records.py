@@ -0,0 +1,210 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# 回测明细表，文件名为 backtest_<name>.<fmt>：
+# actions / trades 为 (date, tic) 长表；持仓为稀疏台账 positions（仅非零持仓）+ 每日一行的 account
+BACKTEST_TABLES = ("actions", "trades", "positions", "account")
+TABLE_FORMATS = ("parquet", "csv")
+# 旧版稠密持仓表（每日每只股票一行）
+_LEGACY_TABLES = ("holdings",)
+
+
+def backtest_table_path(table_dir: str, name: str) -> str:
+    """返回已存在的回测明细文件路径（两种格式都存在时取最近写出的），不存在时返回 None。"""
+    paths = [os.path.join(table_dir, f"backtest_{name}.{fmt}") for fmt in TABLE_FORMATS]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+
+def read_backtest_table(table_dir: str, name: str) -> pd.DataFrame:
+    """读取回测明细长表（Parquet 或 CSV），不存在时返回 None。"""
+    path = backtest_table_path(table_dir, name)
+    if path is None:
+        return None
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    # round_trip 解析保证 CSV 中的浮点数按写出时的值精确读回
+    return pd.read_csv(path, float_precision="round_trip")
+
+
+def read_holdings(table_dir: str, prices: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    由稀疏持仓台账还原稠密持仓长表（date, tic, holding_shares, price, position_value, cash, total_asset）。
+    - prices 为 date × tic 收盘价矩阵（如 trade_df.pivot(index="date", columns="tic", values="close")），
+      用于补齐空仓股票的价格与股票全集；按环境口径转为 float32，还原结果与旧版稠密表一致
+    - 未提供 prices 时只覆盖台账中出现过的股票，空仓行价格为 NaN
+    - 目录中只有旧版 backtest_holdings 时直接读取
+    """
+    positions = read_backtest_table(table_dir, "positions")
+    account = read_backtest_table(table_dir, "account")
+    if positions is None or account is None:
+        return read_backtest_table(table_dir, "holdings")
+
+    dates = pd.DatetimeIndex(pd.to_datetime(account["date"]))
+    positions = positions.assign(date=pd.to_datetime(positions["date"]))
+    if prices is not None:
+        tickers = list(prices.columns)
+        price_matrix = (
+            prices.set_axis(pd.to_datetime(prices.index)).reindex(dates).to_numpy(dtype=np.float32).astype(np.float64)
+        )
+    else:
+        tickers = list(dict.fromkeys(positions["tic"]))
+        price_matrix = np.full((len(dates), len(tickers)), np.nan)
+
+    row = dates.get_indexer(positions["date"])
+    col = pd.Index(tickers).get_indexer(positions["tic"])
+    if (row < 0).any() or (col < 0).any():
+        raise ValueError("positions contain dates or tickers outside the account table / price matrix")
+    shares = np.zeros((len(dates), len(tickers)), dtype=np.float64)
+    shares[row, col] = positions["holding_shares"].to_numpy(dtype=np.float64)
+    price_matrix[row, col] = positions["price"].to_numpy(dtype=np.float64)
+
+    n = len(tickers)
+    position_value = np.where(shares != 0, shares * price_matrix, 0.0)
+    return pd.DataFrame(
+        {
+            "date": dates.repeat(n),
+            "tic": np.tile(np.asarray(tickers, dtype=object), len(dates)),
+            "holding_shares": shares.reshape(-1),
+            "price": price_matrix.reshape(-1),
+            "position_value": position_value.reshape(-1),
+            "cash": account["cash"].to_numpy(dtype=np.float64).repeat(n),
+            "total_asset": account["total_asset"].to_numpy(dtype=np.float64).repeat(n),
+        }
+    )
+
+
+class BacktestRecorder:
+    """
+    回测明细的列式记录器：
+    - 按回合长度预分配 T×N 数组（T 个交易日的动作与成交、T+1 个估值日的持仓），逐日只写整行
+    - 成交价与估值价直接取行情价格矩阵切片；未记录的交易日动作为 NaN、成交为 0
+    - 保存时才展开：actions / trades 为 (date, tic) 长表；持仓只写非零仓位（positions），
+      现金与总资产每日一行（account），稠密视图由 read_holdings 还原；格式为 CSV 或压缩 Parquet
+    """
+
+    def __init__(self, dates, tickers, prices: np.ndarray):
+        """dates 为回合内 T+1 个估值日（含起始日），prices 为对应的 [T+1, N] 价格矩阵。"""
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.prices = np.asarray(prices)
+        n_days, n = len(self.dates) - 1, len(self.tickers)
+        if self.prices.shape != (n_days + 1, n):
+            raise ValueError(f"prices shape {self.prices.shape} mismatch with dates/tickers {(n_days + 1, n)}")
+
+        self.action_raw = np.full((n_days, n), np.nan, dtype=np.float32)
+        self.target_shares = np.zeros((n_days, n), dtype=np.int32)
+        self.executed_shares = np.zeros((n_days, n), dtype=np.int32)
+        self.trade_fees = np.zeros((n_days, n), dtype=np.float32)
+        self.holding_shares = np.zeros((n_days + 1, n), dtype=np.float32)
+        self.cash = np.zeros(n_days + 1, dtype=np.float64)
+        self.total_asset = np.zeros(n_days + 1, dtype=np.float64)
+
+    @classmethod
+    def for_episode(cls, env) -> "BacktestRecorder":
+        """按环境当前回合窗口 [start_day, end_day] 预分配。"""
+        days = slice(env.start_day, env.end_day + 1)
+        return cls(env.date_index[days], env.tickers, env.price_array[days])
+
+    def record_trade(self, t: int, action_raw, target_shares, executed_shares, fees) -> None:
+        """记录第 t 个交易日（回合内下标）的动作打分、目标调仓股数、实际成交股数与手续费。"""
+        self.action_raw[t] = action_raw
+        self.target_shares[t] = target_shares
+        self.executed_shares[t] = executed_shares
+        self.trade_fees[t] = fees
+
+    def record_actions(self, t, action_raw) -> None:
+        """只记录动作打分（不成交的持仓区间）；t 可为切片，action_raw 为对应的 [n, N] 批量策略输出。"""
+        self.action_raw[t] = action_raw
+
+    def record_account(self, t, holdings, cash, total_asset) -> None:
+        """记录估值日 t 的持仓、现金与总资产；t 可为切片（持仓不变的区间），total_asset 对应逐日序列。"""
+        self.holding_shares[t] = holdings
+        self.cash[t] = cash
+        self.total_asset[t] = total_asset
+
+    def _long_index(self, n_days: int) -> dict:
+        n = len(self.tickers)
+        return {"date": self.dates[:n_days].repeat(n), "tic": np.tile(self.tickers, n_days)}
+
+    def frames(self) -> dict:
+        """展开为 actions / trades 长表与 positions / account 持仓台账。"""
+        n_days = len(self.dates) - 1
+        trade_prices = self.prices[:-1].astype(np.float64).reshape(-1)
+        executed = self.executed_shares.astype(np.int64).reshape(-1)
+        target = self.target_shares.astype(np.int64).reshape(-1)
+
+        row, col = np.nonzero(self.holding_shares)
+        holdings = self.holding_shares[row, col].astype(np.float64)
+        prices = self.prices[row, col].astype(np.float64)
+        return {
+            "actions": pd.DataFrame(
+                {
+                    **self._long_index(n_days),
+                    "action_raw": self.action_raw.astype(np.float64).reshape(-1),
+                    "target_shares": target,
+                }
+            ),
+            "trades": pd.DataFrame(
+                {
+                    **self._long_index(n_days),
+                    "target_shares": target,
+                    "executed_shares": executed,
+                    "trade_price": trade_prices,
+                    "trade_notional": np.abs(executed) * trade_prices,
+                    "trade_fee": self.trade_fees.astype(np.float64).reshape(-1),
+                }
+            ),
+            "positions": pd.DataFrame(
+                {
+                    "date": self.dates[row],
+                    "tic": self.tickers[col],
+                    "holding_shares": holdings,
+                    "price": prices,
+                    "position_value": holdings * prices,
+                }
+            ),
+            "account": pd.DataFrame({"date": self.dates, "cash": self.cash, "total_asset": self.total_asset}),
+        }
+
+    def save(self, table_dir: str, fmt: str = "csv") -> dict:
+        """
+        写出 backtest_<name>.<fmt>，返回 {name: 路径}。
+        Parquet 需要 pyarrow；缺少时退回 CSV。只写本次的文件，不删除目录中的其他文件：
+        另一格式或旧版稠密持仓表残留时打印 WARNING（read_backtest_table 按写出时间取最新的格式）。
+        """
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(f"fmt must be one of {TABLE_FORMATS}, got {fmt!r}")
+        os.makedirs(table_dir, exist_ok=True)
+        frames = self.frames()
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print("WARNING: 未安装 pyarrow，回测明细改写为 CSV。")
+                fmt = "csv"
+
+        paths = {}
+        for name, df in frames.items():
+            path = os.path.join(table_dir, f"backtest_{name}.{fmt}")
+            if fmt == "parquet":
+                df.to_parquet(path, index=False, compression="zstd")
+            else:
+                df.to_csv(path, index=False)
+            paths[name] = path
+
+        stale = [
+            os.path.join(table_dir, f"backtest_{name}.{other}")
+            for name in list(frames) + list(_LEGACY_TABLES)
+            for other in TABLE_FORMATS
+            if name in _LEGACY_TABLES or other != fmt
+        ]
+        for path in stale:
+            if os.path.exists(path):
+                print(f"WARNING: 保留了早先的回测明细 {path}（非本次写出），读取请用 read_backtest_table。")
+        return paths
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+
+def prepare_price_pivot(trade_df: pd.DataFrame) -> pd.DataFrame:
+    """将长表行情转换为 date x ticker 的收盘价矩阵。"""
+    return trade_df.pivot(index="date", columns="tic", values="close").sort_index()
+
+
+def rebalance_days(n_dates: int, rebalance_window: int) -> np.ndarray:
+    """调仓日下标：第 1..n_dates-1 个交易日中 rebalance_window 的整数倍。"""
+    rebalance_window = int(rebalance_window)
+    if rebalance_window < 1:
+        raise ValueError(f"rebalance_window must be >= 1, got {rebalance_window}")
+    return np.arange(rebalance_window, n_dates, rebalance_window)
+
+
+def equal_weight_targets(price_pivot: pd.DataFrame, days: np.ndarray) -> np.ndarray:
+    """每个调仓日全股票等权，返回 (调仓次数, N) 目标权重。"""
+    n_assets = price_pivot.shape[1]
+    return np.full((len(days), n_assets), 1.0 / n_assets, dtype=np.float64)
+
+
+def topk_momentum_targets(
+    price_pivot: pd.DataFrame,
+    days: np.ndarray,
+    top_k: int,
+    momentum_window: int,
+) -> np.ndarray:
+    """每个调仓日按截至 t-1 的 momentum_window 日动量选前 top_k 只等权持有，返回 (调仓次数, N) 目标权重。"""
+    close_np = price_pivot.to_numpy(dtype=np.float64)
+    n_assets = close_np.shape[1]
+    top_k = int(max(1, min(top_k, n_assets)))
+
+    lookback_end = days - 1
+    lookback_start = np.maximum(0, lookback_end - momentum_window)
+    momentum = close_np[lookback_end] / np.maximum(close_np[lookback_start], 1e-8) - 1.0
+
+    select_idx = np.argsort(momentum, axis=1)[:, ::-1][:, :top_k]
+    targets = np.zeros((len(days), n_assets), dtype=np.float64)
+    np.put_along_axis(targets, select_idx, 1.0 / float(top_k), axis=1)
+    return targets
+
+
+def simulate_rebalanced_benchmark(
+    price_pivot: pd.DataFrame,
+    targets: np.ndarray,
+    initial_amount: float,
+    rebalance_window: int,
+    buy_cost_pct: float,
+    sell_cost_pct: float,
+):
+    """
+    定期再平衡组合的向量化净值：
+    - 首个交易日空仓；每个调仓日（rebalance_days）按 targets 对应行调到目标权重，扣双边手续费
+    - 交易日 1..T-1 按调仓区间切成 (区间数, rebalance_window, N)，区间内权重漂移由收益的累乘一次算出
+    - 手续费只在调仓日计算，只依赖漂移权重与目标权重之差，各区间净值倍数累乘即得全程净值
+    返回 (DataFrame[date, account_value], {"turnover_ratio", "cost_ratio"})，与逐日循环口径一致。
+    """
+    days = rebalance_days(len(price_pivot.index), rebalance_window)
+    targets = np.asarray(targets, dtype=np.float64)
+    if targets.shape != (len(days), price_pivot.shape[1]):
+        raise ValueError(f"targets shape {targets.shape} mismatch with rebalance days x assets {(len(days), price_pivot.shape[1])}")
+
+    growth = 1.0 + price_pivot.pct_change().fillna(0.0).to_numpy(dtype=np.float64)
+    n_days, n_assets = growth.shape[0] - 1, growth.shape[1]
+    window = int(rebalance_window)
+    n_segments = -(-n_days // window)
+    n_rebalances = len(days)
+
+    # 末段不足 rebalance_window 天的部分补 1，不影响累乘
+    padded = np.ones((n_segments * window, n_assets), dtype=np.float64)
+    padded[:n_days] = growth[1:]
+    cum_growth = np.cumprod(padded.reshape(n_segments, window, n_assets), axis=1)
+
+    # 区间起点权重：首段空仓，其后为上一调仓日的目标权重；未投资部分按现金计
+    start_w = np.zeros((n_segments, n_assets), dtype=np.float64)
+    start_w[1:] = targets[: n_segments - 1]
+    seg_nav = (1.0 - start_w.sum(axis=1))[:, None] + np.einsum("sn,swn->sw", start_w, cum_growth)
+
+    # 调仓日（前 n_rebalances 个区间的末日）由漂移权重调到目标权重
+    end_value = start_w[:n_rebalances] * cum_growth[:n_rebalances, -1]
+    end_sum = end_value.sum(axis=1, keepdims=True)
+    drift_w = np.divide(end_value, end_sum, out=np.zeros_like(end_value), where=end_sum > 0)
+    buy_turnover = np.maximum(targets - drift_w, 0.0).sum(axis=1)
+    sell_turnover = np.maximum(drift_w - targets, 0.0).sum(axis=1)
+    fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
+
+    pre_fee = seg_nav[:n_rebalances, -1].copy()
+    seg_nav[:n_rebalances, -1] *= np.maximum(0.0, 1.0 - fee_ratio)
+    start_nav = float(initial_amount) * np.cumprod(np.concatenate([[1.0], seg_nav[:, -1]]))[:-1]
+    nav = start_nav[:, None] * seg_nav
+    fee_amount = start_nav[:n_rebalances] * pre_fee * fee_ratio
+
+    account_value = np.concatenate([[float(initial_amount)], nav.reshape(-1)[:n_days]])
+    stats = {
+        "turnover_ratio": float((buy_turnover + sell_turnover).sum()),
+        "cost_ratio": float(fee_amount.sum()) / float(initial_amount),
+    }
+    return pd.DataFrame({"date": price_pivot.index, "account_value": account_value}), stats
+
+
+def _empty_benchmark():
+    empty = pd.DataFrame(columns=["date", "account_value"])
+    return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
+
+
+def build_equal_weight_benchmark(
+    trade_df: pd.DataFrame,
+    initial_amount: float = 10_000,
+    rebalance_window: int = 5,  #对齐5日调仓频率
+    buy_cost_pct: float = 0.001,
+    sell_cost_pct: float = 0.001,
+):
+    """Benchmark1：全股票等权 + 每5日再平衡 + 双边手续费。"""
+    price_pivot = prepare_price_pivot(trade_df)
+    if price_pivot.empty:
+        return _empty_benchmark()
+    days = rebalance_days(len(price_pivot.index), rebalance_window)
+    targets = equal_weight_targets(price_pivot, days)
+    return simulate_rebalanced_benchmark(
+        price_pivot, targets, initial_amount, rebalance_window, buy_cost_pct, sell_cost_pct
+    )
+
+
+def build_topk_momentum_benchmark(
+    trade_df: pd.DataFrame,
+    initial_amount: float = 10_000,
+    top_k: int = 5,
+    rebalance_window: int = 5,
+    momentum_window: int = 20,
+    buy_cost_pct: float = 0.001,
+    sell_cost_pct: float = 0.001,
+):
+    """Benchmark2：Top-K动量 + 每5日调仓 + 双边手续费。"""
+    price_pivot = prepare_price_pivot(trade_df)
+    if price_pivot.empty:
+        return _empty_benchmark()
+    days = rebalance_days(len(price_pivot.index), rebalance_window)
+    targets = topk_momentum_targets(price_pivot, days, top_k, momentum_window)
+    return simulate_rebalanced_benchmark(
+        price_pivot, targets, initial_amount, rebalance_window, buy_cost_pct, sell_cost_pct
+    )
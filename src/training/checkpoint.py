@@ -0,0 +1,79 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import torch as th
+from stable_baselines3 import PPO
+
+
+# 克隆时不深拷贝的属性：环境与日志器持有外部资源（子进程、文件句柄）；
+# 策略与 rollout buffer 由 _setup_model 按原结构重建
+_UNCLONED_ATTRS = ("policy", "rollout_buffer", "env", "_vec_normalize_env", "_logger", "_custom_logger")
+
+# 进程内已加载的模型（按路径缓存），同一进程处理多个 seed 时只反序列化一次
+_MODEL_CACHE = {}
+
+
+def clone_model(model):
+    """
+    在内存中复制模型，效果等同 save + load 但不经过 zip：
+    超参数深拷贝，策略重建后载入参数与优化器状态的副本；不复制环境与日志器。
+    """
+    detached = {name: model.__dict__.pop(name) for name in _UNCLONED_ATTRS if name in model.__dict__}
+    try:
+        clone = copy.deepcopy(model)
+    finally:
+        model.__dict__.update(detached)
+    clone.env = None
+    clone._vec_normalize_env = None
+    clone._custom_logger = False
+
+    # 重建策略会消耗 torch 随机数，放在独立的随机状态中，不影响调用方的随机序列
+    with th.random.fork_rng(devices=[]):
+        clone._setup_model()
+    clone.set_parameters(copy.deepcopy(model.get_parameters()), exact_match=True, device=model.device)
+    return clone
+
+
+def load_model_cached(path: str, model_cls=PPO):
+    """读取并缓存模型，返回其内存副本；调用方可直接 set_env 后继续训练。"""
+    if path not in _MODEL_CACHE:
+        _MODEL_CACHE[path] = model_cls.load(path)
+    return clone_model(_MODEL_CACHE[path])
+
+
+class AsyncCheckpointWriter:
+    """
+    后台线程写 checkpoint：
+    - save() 先在调用线程克隆模型快照，再交给后台线程序列化写盘，后续微调不会改动已提交的快照
+    - 单线程按提交顺序写入；wait() 等待指定路径（默认全部）写完，并抛出写盘异常
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}
+
+    def save(self, model, path: str) -> None:
+        """提交模型快照的异步写盘任务。"""
+        snapshot = clone_model(model)
+        self._pending[path] = self._executor.submit(snapshot.save, path)
+
+    def wait(self, path: str = None) -> None:
+        """等待写盘完成；path 为 None 时等待全部任务。"""
+        paths = list(self._pending) if path is None else [path]
+        for p in paths:
+            future = self._pending.pop(p, None)
+            if future is not None:
+                future.result()
+
+    def close(self) -> None:
+        """等待剩余任务并关闭线程。"""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
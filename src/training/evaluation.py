@@ -0,0 +1,217 @@
+import csv
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback
+
+from src.envs.env_stocktrading import StockTradingEnv
+from src.training.parallel import limit_torch_threads
+
+
+# 评估子进程内按共享句柄缓存的验证环境，多次评估复用同一份行情
+_EVAL_ENVS = {}
+
+
+def split_validation_window(df, validation_days: int) -> tuple:
+    """把训练集末尾 validation_days 个交易日切出作为验证集，返回 (train_df, eval_df)。"""
+    dates = np.sort(df["date"].unique())
+    if not 0 < validation_days < len(dates):
+        raise ValueError(f"validation_days must be in (0, {len(dates)}), got {validation_days}")
+    split_date = dates[-validation_days]
+    return df[df["date"] < split_date], df[df["date"] >= split_date]
+
+
+def score_nav(nav: np.ndarray, initial_amount: float) -> dict:
+    """按回测统一口径计算净值序列的夏普、最大回撤与期末净值。"""
+    nav = np.asarray(nav, dtype=np.float64)
+    daily_ret = np.zeros_like(nav)
+    daily_ret[1:] = nav[1:] / nav[:-1] - 1.0
+    std = daily_ret.std()
+    sharpe = float(daily_ret.mean() * np.sqrt(252.0) / (std + 1e-12)) if std * np.sqrt(252.0) > 1e-12 else 0.0
+    cummax = np.maximum.accumulate(nav)
+    max_drawdown = float(np.max((cummax - nav) / np.where(cummax > 0, cummax, np.nan)))
+    return {
+        "final_nav": float(nav[-1]) if len(nav) else float(initial_amount),
+        "sharpe": sharpe,
+        "max_drawdown": max_drawdown,
+    }
+
+
+def evaluate_on_env(model, env: StockTradingEnv) -> dict:
+    """
+    在给定环境上从头确定性回测模型，返回净值指标。
+    环境宜为 lean 模式（diagnostics=False），只记录每日总资产，不导出交易明细。
+    只在调仓日调用策略，非调仓日按持仓批量盯市推进。
+    """
+    obs, _ = env.reset()
+    nav = [float(env._get_total_asset())]
+    done = False
+    while not done:
+        if not env._is_rebalance_day():
+            obs, done, values = env.hold_to_next_rebalance()
+            nav.extend(values)
+            continue
+        action, _ = model.predict(obs, deterministic=True)
+        obs, _, terminated, truncated, _ = env.step(action)
+        done = terminated or truncated
+        nav.append(float(env._get_total_asset()))
+    return score_nav(nav, env.initial_amount)
+
+
+def evaluate_checkpoint(model_path: str, market_handle: str, env_kwargs: dict) -> dict:
+    """子进程任务：按共享句柄挂载验证窗口，回测 checkpoint 并返回净值指标。"""
+    env = _EVAL_ENVS.get(market_handle)
+    if env is None:
+        env = StockTradingEnv(df=None, market_data=market_handle, diagnostics=False, **env_kwargs)
+        _EVAL_ENVS[market_handle] = env
+    return evaluate_on_env(PPO.load(model_path, device="cpu"), env)
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    训练期异步验证回调：
+    - 每 eval_freq 个环境步保存一次权重快照，交给独立进程在验证窗口上回测，训练不等待评估结果
+    - 验证夏普提升超过 min_delta 时快照替换为 save_dir/best_model.zip，否则删除
+    - patience 次评估无提升（平台期）或验证回撤超过 max_drawdown / 指标非有限（发散）时提前停止
+    - 评估积压超过 max_pending 时跳过本次快照；训练结束时补评最终权重并等待全部结果
+    - 评估记录写入 log_dir/eval_log.csv，汇总见 self.summary
+    """
+
+    def __init__(
+        self,
+        market_data,
+        env_kwargs: dict,
+        save_dir: str,
+        log_dir: str,
+        eval_freq: int = 10_000,
+        patience: int = None,
+        min_delta: float = 0.0,
+        max_drawdown: float = None,
+        max_pending: int = 2,
+        verbose: int = 0,
+    ):
+        super().__init__(verbose)
+        if eval_freq < 1:
+            raise ValueError(f"eval_freq must be >= 1, got {eval_freq}")
+        self.market_data = market_data
+        self.env_kwargs = env_kwargs
+        self.save_dir = save_dir
+        self.log_dir = log_dir
+        self.eval_freq = int(eval_freq)
+        self.patience = patience
+        self.min_delta = float(min_delta)
+        self.max_drawdown = max_drawdown
+        self.max_pending = int(max(1, max_pending))
+
+        self.best_path = os.path.join(save_dir, "best_model.zip")
+        self.best_sharpe = -np.inf
+        self.best_timesteps = None
+        self.records = []
+        self.summary = {}
+        self._pending = []
+        self._last_eval = 0
+        self._last_snapshot = 0
+        self._bad_evals = 0
+        self._stop_reason = None
+        self._pool = None
+        self._handle = None
+        self._training = False
+
+    def _on_training_start(self) -> None:
+        os.makedirs(self.save_dir, exist_ok=True)
+        self._handle = self.market_data.share()
+        self._pool = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp.get_context("spawn"),
+            initializer=limit_torch_threads,
+            initargs=(1,),
+        )
+        self._last_eval = self._last_snapshot = self.num_timesteps
+        self._training = True
+
+    def _submit(self, force: bool = False) -> None:
+        """保存当前权重快照并提交评估；force=True 时忽略积压上限。"""
+        self._last_eval = self.num_timesteps
+        if not force and len(self._pending) >= self.max_pending:
+            if self.verbose:
+                print(f"INFO: 验证评估积压，跳过 {self.num_timesteps} 步快照")
+            return
+        self._last_snapshot = self.num_timesteps
+        path = os.path.join(self.save_dir, f"eval_{self.num_timesteps}.zip")
+        self.model.save(path)
+        future = self._pool.submit(evaluate_checkpoint, path, self._handle, self.env_kwargs)
+        self._pending.append((self.num_timesteps, path, future))
+
+    def _collect(self, block: bool = False) -> None:
+        """按提交顺序处理已完成的评估，更新最优 checkpoint 与早停状态。"""
+        while self._pending and (block or self._pending[0][2].done()):
+            timesteps, path, future = self._pending.pop(0)
+            try:
+                metrics = future.result()
+            except Exception as e:
+                print(f"WARNING: {timesteps} 步快照验证失败: {e}")
+                os.remove(path)
+                continue
+
+            is_best = metrics["sharpe"] > self.best_sharpe + self.min_delta
+            if is_best:
+                os.replace(path, self.best_path)
+                self.best_sharpe = metrics["sharpe"]
+                self.best_timesteps = timesteps
+                self._bad_evals = 0
+            else:
+                os.remove(path)
+                self._bad_evals += 1
+            self.records.append({"timesteps": timesteps, **metrics, "is_best": is_best})
+            if self.verbose:
+                print(
+                    f"INFO: 验证 @ {timesteps} 步 | Sharpe={metrics['sharpe']:.4f} "
+                    f"| MaxDD={metrics['max_drawdown'] * 100:.2f}%{' (best)' if is_best else ''}"
+                )
+
+            # 早停只在训练进行中判定；训练结束后补收的结果只参与最优 checkpoint 选择
+            if self._stop_reason is None and self._training:
+                if not np.isfinite([metrics["sharpe"], metrics["final_nav"]]).all() or (
+                    self.max_drawdown is not None and metrics["max_drawdown"] > self.max_drawdown
+                ):
+                    self._stop_reason = "diverged"
+                elif self.patience is not None and self._bad_evals >= self.patience:
+                    self._stop_reason = "plateau"
+
+    def _on_step(self) -> bool:
+        if self._pending and self._pending[0][2].done():
+            self._collect()
+        if self.num_timesteps - self._last_eval >= self.eval_freq:
+            self._submit()
+        return self._stop_reason is None
+
+    def _on_training_end(self) -> None:
+        self._training = False
+        try:
+            if self._stop_reason is None and self.num_timesteps > self._last_snapshot:
+                self._submit(force=True)
+            self._collect(block=True)
+        finally:
+            self._pool.shutdown(wait=True)
+            self.market_data.release(self._handle)
+
+        if self._stop_reason is not None:
+            print(f"INFO: 验证指标{'发散' if self._stop_reason == 'diverged' else '进入平台期'}，已在 {self.num_timesteps} 步提前停止训练")
+        self.summary = {
+            "best_path": self.best_path if self.best_timesteps is not None else None,
+            "best_sharpe": self.best_sharpe if self.best_timesteps is not None else None,
+            "best_timesteps": self.best_timesteps,
+            "stop_reason": self._stop_reason,
+            "stopped_at": self.num_timesteps,
+            "n_evals": len(self.records),
+        }
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        if self.records:
+            with open(os.path.join(self.log_dir, "eval_log.csv"), "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.records[0]))
+                writer.writeheader()
+                writer.writerows(self.records)
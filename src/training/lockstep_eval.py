@@ -0,0 +1,103 @@
+import copy
+
+import numpy as np
+import torch
+from torch import nn
+from torch.func import functional_call, stack_module_state
+
+from src.envs.env_stocktrading import StockTradingEnv
+from src.envs.vec_env_stocktrading import StockTradingVecEnv
+
+
+class _DeterministicActor(nn.Module):
+    """PPO 策略的确定性动作分支：特征提取 → policy_net → action_net（高斯分布均值）。"""
+
+    def __init__(self, policy):
+        super().__init__()
+        self.features_extractor = policy.pi_features_extractor
+        self.policy_net = policy.mlp_extractor.policy_net
+        self.action_net = policy.action_net
+
+    def forward(self, obs: torch.Tensor) -> torch.Tensor:
+        return self.action_net(self.policy_net(self.features_extractor(obs)))
+
+
+class StackedPolicy:
+    """
+    K 个 PPO 策略的批量确定性前向：
+    - 输入 (K, obs_dim)，第 k 行交给第 k 个策略，输出 (K, action_dim)，与 model.predict(deterministic=True) 同口径裁剪
+    - 网络结构相同时按模型堆叠参数，torch.func.vmap 一次前向算出全部动作
+    - 结构不同时（或 stacked=False）退回逐模型前向
+    """
+
+    def __init__(self, models: list, stacked: bool = True):
+        if not models:
+            raise ValueError("models must not be empty")
+        self.models = list(models)
+        self.device = self.models[0].policy.device
+        space = self.models[0].action_space
+        self.low, self.high = space.low, space.high
+
+        actors = [_DeterministicActor(m.policy).eval() for m in self.models]
+        layouts = {repr(actor) for actor in actors}
+        self.stacked = bool(stacked) and len(layouts) == 1 and all(m.policy.device == self.device for m in self.models)
+        if self.stacked:
+            params, buffers = stack_module_state(actors)
+            base = copy.deepcopy(actors[0]).to("meta")
+
+            def forward_one(p, b, obs):
+                return functional_call(base, (p, b), (obs.unsqueeze(0),)).squeeze(0)
+
+            self._params, self._buffers = params, buffers
+            self._forward = torch.vmap(forward_one)
+
+    @property
+    def num_models(self) -> int:
+        return len(self.models)
+
+    def predict(self, obs: np.ndarray) -> np.ndarray:
+        obs = np.asarray(obs, dtype=np.float32)
+        if not self.stacked:
+            return np.stack([m.predict(obs[k], deterministic=True)[0] for k, m in enumerate(self.models)])
+        with torch.no_grad():
+            actions = self._forward(self._params, self._buffers, torch.as_tensor(obs, device=self.device))
+        return np.clip(actions.cpu().numpy(), self.low, self.high)
+
+
+def evaluate_models_lockstep(models: list, env: StockTradingEnv, stacked: bool = True) -> dict:
+    """
+    锁步评估 K 个模型：K 个账户在同一份行情张量上从回合起点同步推进到终点。
+    - 各账户调仓日一致，只在调仓日把 K 个观测堆成一个 batch 调用 StackedPolicy，非调仓日不调用策略
+    - 账户撮合与结算由 StockTradingVecEnv 批量完成（float64 口径，与单环境回测至多有浮点尾差）
+    返回 {"dates": 估值日, "nav": (T+1, K) 净值, "turnover_ratio": (K,), "cost_ratio": (K,)}，
+    换手与成本均为累计成交额、手续费占初始资金的比例。
+    """
+    policy = StackedPolicy(models, stacked=stacked)
+    k = policy.num_models
+    vec_env = StockTradingVecEnv(env, num_envs=k, random_start=False)
+    obs = vec_env.reset()
+
+    n_days = vec_env.max_step
+    nav = np.empty((n_days + 1, k), dtype=np.float64)
+    nav[0] = vec_env.initial_amount
+    notional = np.zeros(k, dtype=np.float64)
+    fees = np.zeros(k, dtype=np.float64)
+    idle = np.zeros((k, vec_env.stock_dim), dtype=np.float32)
+
+    for t in range(n_days):
+        # 各账户起点相同，调仓标记（观测最后一维）在账户间一致
+        actions = policy.predict(obs) if obs[0, -1] > 0 else idle
+        obs, _, dones, _ = vec_env.step(actions)
+        nav[t + 1] = vec_env.last_end_asset
+        notional += vec_env.last_trade_notional
+        fees += vec_env.last_trade_fees
+    if not dones.all():
+        raise RuntimeError("lockstep accounts did not terminate together")
+    vec_env.close()
+
+    return {
+        "dates": env.date_index,
+        "nav": nav,
+        "turnover_ratio": notional / vec_env.initial_amount,
+        "cost_ratio": fees / vec_env.initial_amount,
+    }
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """分块计算文件 sha256。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    实验完成清单（位于实验目录下的 manifest/）：
+    - 每个已完成单元（如 seed_10、seed_3/Roll_1_Test_2022）一个 JSON 文件，原子写入，
+      多个进程各自登记不同单元时互不冲突
+    - 登记单元产物（checkpoint、表格）的 sha256 与汇总指标
+    - 续跑时只有产物齐全且哈希一致的单元才视为已完成
+    """
+
+    DIR_NAME = "manifest"
+
+    def __init__(self, root: str):
+        """在实验根目录下打开（或创建）清单目录。"""
+        self.root = root
+        self.dir = os.path.join(root, self.DIR_NAME)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _entry_path(self, unit: str) -> str:
+        """单元名中的 / 转为 __，作为 JSON 文件名。"""
+        return os.path.join(self.dir, unit.replace("/", "__") + ".json")
+
+    def load(self, unit: str) -> dict:
+        """读取单元记录，不存在时返回 None。"""
+        path = self._entry_path(unit)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def is_complete(self, unit: str) -> bool:
+        """单元已登记完成，且全部产物存在、哈希与登记时一致。"""
+        entry = self.load(unit)
+        if not entry or entry.get("status") != "complete":
+            return False
+        for artifact in entry["artifacts"].values():
+            path = os.path.join(self.root, artifact["path"])
+            if not os.path.exists(path) or file_sha256(path) != artifact["sha256"]:
+                return False
+        return True
+
+    def summary(self, unit: str) -> dict:
+        """返回单元登记时的汇总信息。"""
+        entry = self.load(unit)
+        return entry.get("summary", {}) if entry else {}
+
+    def mark_complete(self, unit: str, artifacts: dict, summary: dict = None) -> None:
+        """登记单元完成：artifacts 为 {名称: 文件路径}，summary 需可 JSON 序列化。"""
+        self._write(
+            unit,
+            {
+                "unit": unit,
+                "status": "complete",
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "artifacts": {
+                    name: {
+                        "path": os.path.relpath(path, self.root),
+                        "sha256": file_sha256(path),
+                    }
+                    for name, path in artifacts.items()
+                },
+                "summary": summary or {},
+            },
+        )
+
+    def mark_failed(self, unit: str, error: str) -> None:
+        """登记单元失败原因（续跑时会重新执行）。"""
+        self._write(
+            unit,
+            {
+                "unit": unit,
+                "status": "failed",
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "artifacts": {},
+                "error": error,
+            },
+        )
+
+    def _write(self, unit: str, entry: dict) -> None:
+        """先写临时文件再替换，避免中途崩溃留下半个 JSON。"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._entry_path(unit))
@@ -0,0 +1,82 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# 子进程中需要限制的数值库线程数环境变量
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def resolve_num_workers(n_tasks: int, max_workers: int = None) -> int:
+    """进程数：默认取 CPU 核数，且不超过任务数。"""
+    n_workers = (os.cpu_count() or 1) if max_workers is None else int(max_workers)
+    return max(1, min(n_workers, n_tasks))
+
+
+def limit_torch_threads(num_threads: int) -> None:
+    """限制当前进程的 torch/BLAS 线程数，避免多个训练进程相互抢占核心。"""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(num_threads)
+
+    import torch
+
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # interop 线程池一旦启用便不可再设置，忽略即可。
+        pass
+
+
+def run_in_process_pool(fn, tasks: list, max_workers: int = None):
+    """
+    在进程池中并行执行 fn(**task)，按完成顺序逐个产出 (task, future)：
+    - 进程数默认按 CPU 核数确定，每个进程分得 核数 // 进程数 个 torch 线程
+    - 使用 spawn 启动，避免 fork 继承 torch 线程池导致的死锁（Windows 下亦一致）
+    - 调用方通过 future.result() 取结果或捕获子进程异常；提前退出时取消未开始的任务
+    """
+    if not tasks:
+        return
+    n_workers = resolve_num_workers(len(tasks), max_workers)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // n_workers)
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=limit_torch_threads,
+        initargs=(threads_per_worker,),
+    ) as pool:
+        futures = {pool.submit(fn, **task): task for task in tasks}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def run_with_retries(fn, tasks: list, max_retries: int = 1, max_workers: int = None):
+    """
+    在进程池中执行全部任务，失败的任务单独重试（最多 max_retries 次），已成功的任务不再执行。
+    按完成顺序产出 (task, result, error)：成功时 error 为 None；重试耗尽仍失败时 result 为 None。
+    每轮重试使用新的进程池，子进程崩溃导致的进程池损坏也能恢复。
+    """
+    pending = list(tasks)
+    for attempt in range(max_retries + 1):
+        failed = []
+        for task, future in run_in_process_pool(fn, pending, max_workers):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append((task, e))
+                continue
+            yield task, result, None
+
+        if not failed:
+            return
+        if attempt < max_retries:
+            print(f"WARNING: {len(failed)} 个任务失败，开始第 {attempt + 1}/{max_retries} 次重试...")
+            pending = [task for task, _ in failed]
+        else:
+            for task, error in failed:
+                yield task, None, error
@@ -0,0 +1,214 @@
+import math
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import torch
+
+from configs.agent.ppo import PBT_PARAMS, PPO_PARAMS
+from configs.base_config import ENV_CACHE_DIR
+from src.envs.env_stocktrading import StockTradingEnv
+from src.training.evaluation import evaluate_on_env
+from src.training.parallel import run_with_retries
+from src.training.train_agent import AgentTrainer
+
+
+def perturb_params(ppo_params: dict, rng: np.random.Generator, pbt_params: dict = None) -> dict:
+    """explore：perturb_keys 中的每个超参数独立随机乘以 perturb_factors 之一，并截断到取值范围内。"""
+    pbt_params = PBT_PARAMS if pbt_params is None else pbt_params
+    factors = pbt_params["perturb_factors"]
+    perturbed = dict(ppo_params)
+    for key, (low, high) in pbt_params["perturb_keys"].items():
+        factor = factors[int(rng.integers(len(factors)))]
+        perturbed[key] = float(np.clip(perturbed[key] * factor, low, high))
+    return perturbed
+
+
+def exploit_and_explore(results: list, members: list, rng: np.random.Generator, pbt_params: dict = None) -> list:
+    """
+    按本代验证夏普排名：后 exploit_quantile 的成员复制随机一名前 exploit_quantile 成员的权重与超参数并扰动，
+    其余成员从自己的权重继续训练。返回下一代的成员状态（不修改入参）。
+    """
+    pbt_params = PBT_PARAMS if pbt_params is None else pbt_params
+    ranked = sorted(results, key=lambda r: r["sharpe"], reverse=True)
+    n_cut = int(math.ceil(len(ranked) * pbt_params["exploit_quantile"])) if len(ranked) > 1 else 0
+    n_cut = min(n_cut, len(ranked) // 2)
+    top, bottom = ranked[:n_cut], ranked[len(ranked) - n_cut:]
+    bottom_ids = {r["member"] for r in bottom}
+
+    by_id = {r["member"]: r for r in results}
+    next_members = []
+    for member in members:
+        member = dict(member)
+        result = by_id[member["member"]]
+        if member["member"] in bottom_ids:
+            donor = top[int(rng.integers(len(top)))]
+            member["ppo_params"] = perturb_params(donor["ppo_params"], rng, pbt_params)
+            member["init_path"] = donor["path"]
+            member["parent"] = donor["member"]
+        else:
+            # 本代失败的成员沿用上一代的起点重训
+            member["init_path"] = result["path"] or member["init_path"]
+            member["parent"] = member["member"]
+        next_members.append(member)
+    return next_members
+
+
+def train_member(
+    member: int,
+    seed: int,
+    generation: int,
+    train_df: pd.DataFrame,
+    eval_df: pd.DataFrame,
+    member_paths: dict,
+    ppo_params: dict,
+    init_path: str,
+    timesteps: int,
+    profile: bool = False,
+) -> dict:
+    """子进程任务：成员从 init_path（首代为 None）出发按 ppo_params 训练一代，保存权重并在验证窗口上评分。"""
+    generation_seed = seed * 1000 + generation
+    random.seed(generation_seed)
+    np.random.seed(generation_seed)
+    torch.manual_seed(generation_seed)
+
+    paths = {
+        "model": member_paths["model"],
+        "log": os.path.join(member_paths["log"], f"gen_{generation}"),
+    }
+    for p in paths.values():
+        os.makedirs(p, exist_ok=True)
+
+    trainer = AgentTrainer(train_df, eval_df, paths)
+    model = trainer.run_training(
+        total_timesteps=timesteps,
+        seed=generation_seed,
+        ppo_params=ppo_params,
+        init_params_path=init_path,
+        profile=profile,
+    )
+    model_path = os.path.join(paths["model"], f"gen_{generation}.zip")
+    model.save(model_path)
+
+    eval_env = StockTradingEnv(df=eval_df, cache_dir=ENV_CACHE_DIR, diagnostics=False, **trainer._env_kwargs())
+    metrics = evaluate_on_env(model, eval_env)
+    return {
+        "member": member,
+        "path": model_path,
+        "steps_per_s": trainer.throughput.get("steps_per_s"),
+        **metrics,
+    }
+
+
+def run_pbt(
+    seeds: list,
+    train_df: pd.DataFrame,
+    eval_df: pd.DataFrame,
+    paths: dict,
+    total_timesteps: int,
+    manifest=None,
+    max_retries: int = 1,
+    max_workers: int = None,
+    pbt_params: dict = None,
+    profile: bool = False,
+) -> dict:
+    """
+    种群训练（PBT）主循环：每个 seed 为一名成员，总训练步数与独立多 seed 相同。
+    - 每代所有成员在进程池中并行训练 ready_steps 步，随后在验证窗口（eval_df）上确定性回测评分
+    - 成员间通过 checkpoint 文件交换权重：落后成员载入领先成员的权重，超参数扰动后继续训练
+    - 传入 manifest 时每代登记为 pbt_gen_<g>，续跑时从最后一个校验通过的代继续
+    - 历史写入 paths["table"]/pbt_history.csv；返回末代验证夏普最高的成员
+    - profile=True 时各成员记录训练吞吐（steps_per_s），否则为空
+    """
+    pbt_params = {**PBT_PARAMS, **(pbt_params or {})}
+    ready_steps = int(pbt_params["ready_steps"])
+    if ready_steps <= 0:
+        raise ValueError(f"ready_steps must be positive, got {ready_steps}")
+    n_generations = int(math.ceil(total_timesteps / ready_steps))
+
+    base_params = {key: PPO_PARAMS[key] for key in pbt_params["perturb_keys"]}
+    members = [
+        {"member": i, "seed": seed, "ppo_params": dict(base_params), "init_path": None, "parent": i}
+        for i, seed in enumerate(seeds)
+    ]
+    history = []
+    results = None
+
+    for generation in range(n_generations):
+        unit = f"pbt_gen_{generation}"
+        if manifest is not None and manifest.is_complete(unit):
+            state = manifest.summary(unit)
+            members, results, history = state["members"], state["results"], state["history"]
+            print(f"INFO: PBT 第 {generation + 1}/{n_generations} 代已完成（清单校验通过），跳过。")
+            continue
+
+        timesteps = min(ready_steps, total_timesteps - generation * ready_steps)
+        tasks = [
+            {
+                "member": m["member"],
+                "seed": m["seed"],
+                "generation": generation,
+                "train_df": train_df,
+                "eval_df": eval_df,
+                "member_paths": {
+                    "model": os.path.join(paths["model"], f"member_{m['member']}"),
+                    "log": os.path.join(paths["log"], f"member_{m['member']}"),
+                },
+                "ppo_params": m["ppo_params"],
+                "init_path": m["init_path"],
+                "timesteps": timesteps,
+                "profile": profile,
+            }
+            for m in members
+        ]
+        results = []
+        for task, result, error in run_with_retries(train_member, tasks, max_retries, max_workers):
+            if error is not None:
+                print(f"   PBT 成员 {task['member']} 第 {generation} 代失败（已重试 {max_retries} 次）: {error}")
+                result = {"member": task["member"], "path": None, "steps_per_s": None,
+                          "final_nav": None, "sharpe": -np.inf, "max_drawdown": None}
+            results.append({**result, "ppo_params": task["ppo_params"]})
+        results.sort(key=lambda r: r["member"])
+        if all(r["path"] is None for r in results):
+            raise RuntimeError(f"All PBT members failed in generation {generation}")
+
+        for m, r in zip(members, results):
+            history.append(
+                {
+                    "generation": generation,
+                    "member": m["member"],
+                    "seed": m["seed"],
+                    "parent": m["parent"],
+                    "timesteps": (generation * ready_steps) + timesteps,
+                    "val_sharpe": r["sharpe"],
+                    "val_max_drawdown": r["max_drawdown"],
+                    "steps_per_s": r["steps_per_s"],
+                    **m["ppo_params"],
+                }
+            )
+        best = max(results, key=lambda r: r["sharpe"])
+        print(f"   PBT 第 {generation + 1}/{n_generations} 代完成 | 最优成员 {best['member']} 验证夏普: {best['sharpe']:.4f}")
+
+        if generation < n_generations - 1:
+            rng = np.random.default_rng(seeds[0] * 1000 + generation)
+            members = exploit_and_explore(results, members, rng, pbt_params)
+        if manifest is not None:
+            artifacts = {f"member_{r['member']}": r["path"] for r in results if r["path"]}
+            manifest.mark_complete(unit, artifacts, {"members": members, "results": results, "history": history})
+
+    os.makedirs(paths["table"], exist_ok=True)
+    history_path = os.path.join(paths["table"], "pbt_history.csv")
+    pd.DataFrame(history).to_csv(history_path, index=False)
+
+    best = max((r for r in results if r["path"]), key=lambda r: r["sharpe"])
+    steps_per_s = [r["steps_per_s"] for r in results if r["steps_per_s"]]
+    return {
+        "member": best["member"],
+        "seed": seeds[best["member"]],
+        "model_path": best["path"],
+        "val_sharpe": best["sharpe"],
+        "ppo_params": best["ppo_params"],
+        "history_path": history_path,
+        "steps_per_s": float(np.mean(steps_per_s)) if steps_per_s else None,
+    }
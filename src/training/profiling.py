@@ -0,0 +1,166 @@
+import csv
+import json
+import os
+import time
+
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+
+# 吞吐统计中的耗时分项
+TIMING_KEYS = ("env_step_s", "policy_forward_s", "gae_s", "gradient_s")
+
+
+class TimedVecEnv(VecEnvWrapper):
+    """环境侧计时包装：累计 step_async → step_wait 的墙钟耗时（subprocess 后端含进程通信）。"""
+
+    def __init__(self, venv):
+        super().__init__(venv)
+        self.step_time = 0.0
+        self.step_calls = 0
+        self._step_start = None
+
+    def reset(self):
+        return self.venv.reset()
+
+    def step_async(self, actions):
+        self._step_start = time.perf_counter()
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        result = self.venv.step_wait()
+        self.step_time += time.perf_counter() - self._step_start
+        self.step_calls += 1
+        return result
+
+
+class ThroughputCallback(BaseCallback):
+    """
+    PPO 训练吞吐统计回调：
+    - 每轮（rollout + 更新）记录 steps/s，以及墙钟在 环境 step / 策略前向 / GAE / 梯度更新 之间的拆分
+    - 环境耗时读取训练环境链上的 TimedVecEnv；策略前向与 GAE 在训练期间临时包装
+      policy.forward、rollout_buffer.compute_returns_and_advantage 计时，训练结束后还原；
+      learn 异常退出时 SB3 不调用 _on_training_end，调用方须在 finally 中调用 unpatch
+    - 梯度更新耗时取 rollout 结束到下一轮 rollout 开始的间隔（model.train 及日志输出）；
+      不包装 model 本身，训练中途 model.save 不受影响
+    - 训练结束时写入 log_dir/<name>.csv（每轮一行）与 <name>.json（全程汇总）
+    """
+
+    def __init__(self, log_dir: str, name: str = "throughput", verbose: int = 0):
+        super().__init__(verbose)
+        self.log_dir = log_dir
+        self.name = name
+        self.rows = []
+        self.summary = {}
+        self._timers = dict.fromkeys(("policy_forward_s", "gae_s"), 0.0)
+        self._env = None
+        self._patched = []
+        self._iter_start = None
+        self._rollout_end = None
+
+    def _timed(self, owner, attr: str, key: str) -> None:
+        """以实例属性覆盖 owner.attr，累计调用耗时到 key。"""
+        fn = getattr(owner, attr)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._timers[key] += time.perf_counter() - start
+
+        setattr(owner, attr, wrapper)
+        self._patched.append((owner, attr))
+
+    def _counters(self) -> dict:
+        counters = dict(self._timers)
+        counters["env_step_s"] = self._env.step_time if self._env is not None else 0.0
+        return counters
+
+    def _on_training_start(self) -> None:
+        env = self.training_env
+        while env is not None and not isinstance(env, TimedVecEnv):
+            env = getattr(env, "venv", None)
+        self._env = env
+
+        self._timed(self.model.policy, "forward", "policy_forward_s")
+        self._timed(self.model.rollout_buffer, "compute_returns_and_advantage", "gae_s")
+        self._train_start = time.perf_counter()
+        self._start_timesteps = self.num_timesteps
+
+    def _on_rollout_start(self) -> None:
+        self._close_iteration()
+        self._iter_start = time.perf_counter()
+        self._iter_timesteps = self.num_timesteps
+        self._iter_counters = self._counters()
+
+    def _on_rollout_end(self) -> None:
+        self._rollout_end = time.perf_counter()
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _close_iteration(self) -> None:
+        """上一轮的梯度更新在下一轮 rollout 开始（或训练结束）时才完成，此时结算该轮。"""
+        if self._iter_start is None:
+            return
+        now = time.perf_counter()
+        wall = now - self._iter_start
+        counters = self._counters()
+        rollout_end = self._rollout_end or now
+        row = {
+            "iteration": len(self.rows) + 1,
+            "timesteps": self.num_timesteps,
+            "wall_s": wall,
+            "rollout_s": rollout_end - self._iter_start,
+        }
+        deltas = {key: counters[key] - self._iter_counters[key] for key in counters}
+        deltas["gradient_s"] = now - rollout_end
+        row.update({key: deltas[key] for key in TIMING_KEYS})
+        row["other_s"] = wall - sum(row[key] for key in TIMING_KEYS)
+        row["steps_per_s"] = (self.num_timesteps - self._iter_timesteps) / max(wall, 1e-12)
+        self.rows.append(row)
+        self._iter_start = None
+        self._rollout_end = None
+
+    def unpatch(self) -> None:
+        """移除计时包装，恢复 policy.forward 等原方法；可重复调用。"""
+        for owner, attr in self._patched:
+            delattr(owner, attr)
+        self._patched = []
+
+    def _on_training_end(self) -> None:
+        self._close_iteration()
+        self.unpatch()
+
+        wall = time.perf_counter() - self._train_start
+        timesteps = self.num_timesteps - self._start_timesteps
+        totals = {key: sum(row[key] for row in self.rows) for key in TIMING_KEYS}
+        totals["other_s"] = wall - sum(totals.values())
+        self.summary = {
+            "timesteps": timesteps,
+            "wall_s": wall,
+            "steps_per_s": timesteps / max(wall, 1e-12),
+            "env_steps_per_s": timesteps / max(totals["env_step_s"], 1e-12) if self._env else None,
+            **totals,
+            "share": {key: value / max(wall, 1e-12) for key, value in totals.items()},
+            "iterations": len(self.rows),
+            "n_envs": self.model.n_envs,
+            "n_steps": self.model.n_steps,
+            "batch_size": self.model.batch_size,
+            "n_epochs": self.model.n_epochs,
+            "device": str(self.model.device),
+            "torch_threads": torch.get_num_threads(),
+        }
+        self._write()
+
+    def _write(self) -> None:
+        os.makedirs(self.log_dir, exist_ok=True)
+        if self.rows:
+            with open(os.path.join(self.log_dir, f"{self.name}.csv"), "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.rows[0]))
+                writer.writeheader()
+                writer.writerows(self.rows)
+        with open(os.path.join(self.log_dir, f"{self.name}.json"), "w", encoding="utf-8") as f:
+            json.dump(self.summary, f, ensure_ascii=False, indent=2)
@@ -1,151 +1,240 @@
-﻿import os
-import pandas as pd
+﻿import pandas as pd
 from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 from finrl.agents.stablebaselines3 import models as finrl_models
-from src.envs.env_stocktrading import StockTradingEnv
-from configs.base_config import TECHNICAL_INDICATORS
-from configs.agent.ppo import PPO_PARAMS
+from src.envs.env_stocktrading import StockTradingEnv, make_shared_env_fn
+from src.envs.market_data import MarketData
+from src.envs.vec_env_stocktrading import StockTradingVecEnv
+from src.training.backtest_records import BacktestRecorder
+from src.training.evaluation import AsyncEvalCallback
+from src.training.profiling import ThroughputCallback, TimedVecEnv
+from configs.base_config import BACKTEST_TABLE_FORMAT, ENV_CACHE_DIR, TECHNICAL_INDICATORS
+from configs.agent.ppo import ENV_BACKEND, EVAL_PARAMS, N_ENVS, PPO_PARAMS
 
 finrl_models.pd = pd  
 
+# 训练环境的向量化后端
+ENV_BACKENDS = ("dummy", "subprocess", "native")
+
+
+def scale_ppo_params(ppo_params: dict, n_envs: int) -> dict:
+    """
+    按环境数换算 PPO 参数：n_steps 为每个环境的采样步数，除以 n_envs 使单轮 rollout 总量不变；
+    batch_size 随之换算，保持每个 epoch 的 minibatch 个数不变。
+    """
+    params = dict(ppo_params)
+    if n_envs <= 1:
+        return params
+    n_minibatches = max(1, params["n_steps"] // params["batch_size"])
+    params["n_steps"] = max(1, params["n_steps"] // n_envs)
+    params["batch_size"] = max(1, params["n_steps"] * n_envs // n_minibatches)
+    return params
+
 
 class AgentTrainer:
-    def __init__(self, train_data, trade_data, paths):
+    def __init__(self, train_data, trade_data, paths, env_params=None):
         self.train_data = train_data
         self.trade_data = trade_data
         self.paths = paths
+        # 覆盖环境默认参数（如 top_k、rebalance_window、risk_penalty、turnover_penalty）
+        self.env_params = dict(env_params or {})
         self.stock_dim = len(train_data.tic.unique())
+        self._shared_handle = None
+        self.throughput = {}
+        self.eval_summary = {}
+        self.backtest_paths = {}
 
-    def create_env(self, df):
-        env = StockTradingEnv(
-            df=df,
+    def _env_kwargs(self):
+        return dict(
             stock_dim=self.stock_dim,
             hmax=1000,
             initial_amount=10000,
             buy_cost_pct=[0.001] * self.stock_dim,
             sell_cost_pct=[0.001] * self.stock_dim,
             tech_indicator_list=TECHNICAL_INDICATORS,
+            **self.env_params,
+        )
+
+    def create_env(self, df, n_envs=1, backend="dummy", seed=None):
+        """
+        构建训练用 VecEnv，返回 (env, obs)：
+        - dummy: DummyVecEnv 在当前进程串行执行 n_envs 个环境，共享同一份行情张量
+        - subprocess: SubprocVecEnv，行情写入共享内存，各子进程只读挂载
+        - native: StockTradingVecEnv，一次 NumPy 计算批量推进全部账户
+        多环境时各环境种子为 seed + i 且随机抽取回合起点，避免采样同一条轨迹；
+        n_envs=1 时保持原单环境全区间训练，环境同样以 seed 重置。
+        """
+        if backend not in ENV_BACKENDS:
+            raise ValueError(f"backend must be one of {ENV_BACKENDS}, got {backend!r}")
+        if n_envs < 1:
+            raise ValueError(f"n_envs must be >= 1, got {n_envs}")
+
+        env_kwargs = self._env_kwargs()
+        random_start = n_envs > 1
+        env = StockTradingEnv(
+            df=df,
+            cache_dir=ENV_CACHE_DIR,
+            diagnostics=False,
+            random_start=random_start,
+            **env_kwargs,
         )
-        return env.get_sb_env()
+        if n_envs == 1 and backend == "dummy":
+            vec_env = DummyVecEnv([lambda: env])
+            if seed is not None:
+                # seed=None 时不调用 VecEnv.seed，避免其抽取全局随机数改变调用方的随机序列
+                vec_env.seed(seed)
+            return vec_env, vec_env.reset()
+
+        if backend == "native":
+            vec_env = StockTradingVecEnv(env, n_envs, random_start=random_start)
+        elif backend == "subprocess":
+            self._shared_handle = env.market_data.share()
+            vec_env = SubprocVecEnv(
+                [
+                    make_shared_env_fn(
+                        self._shared_handle,
+                        diagnostics=False,
+                        random_start=random_start,
+                        **env_kwargs,
+                    )
+                    for _ in range(n_envs)
+                ]
+            )
+        else:
+            def make_env():
+                return StockTradingEnv(
+                    df=None,
+                    market_data=env.market_data,
+                    diagnostics=False,
+                    random_start=random_start,
+                    **env_kwargs,
+                )
 
-    def run_training(self, total_timesteps=50000):
-        env_train, _ = self.create_env(self.train_data)
+            vec_env = DummyVecEnv([lambda: env] + [make_env] * (n_envs - 1))
+        vec_env.seed(seed)
+        return vec_env, vec_env.reset()
+
+    def close_env(self, env):
+        """关闭训练环境，并删除 subprocess 后端创建的共享行情目录。"""
+        env.close()
+        if self._shared_handle is not None:
+            MarketData.release(self._shared_handle)
+            self._shared_handle = None
+
+    def run_training(
+        self,
+        total_timesteps=50000,
+        n_envs=N_ENVS,
+        backend=ENV_BACKEND,
+        seed=None,
+        profile=False,
+        eval_data=None,
+        eval_params=None,
+        ppo_params=None,
+        callbacks=None,
+        init_params_path=None,
+    ):
+        """
+        训练 PPO：
+        - profile=True（默认关闭）且 paths 含 log 目录时，包装计时并把吞吐统计写入 log/throughput.csv|json
+        - 传入 eval_data 时按 eval_params（默认 EVAL_PARAMS）在验证窗口上异步评估，
+          最优权重保存为 model/best_model.zip，可选早停与训练后载入最优权重
+        - ppo_params 覆盖 PPO_PARAMS 中的同名参数；callbacks 为额外的 SB3 回调列表
+        - init_params_path 指定 checkpoint 时，先载入其策略与优化器权重再训练（超参数仍取 ppo_params）
+        """
+        env_train, _ = self.create_env(self.train_data, n_envs=n_envs, backend=backend, seed=seed)
+        throughput_cb = eval_cb = None
+        if profile and self.paths.get("log"):
+            env_train = TimedVecEnv(env_train)
+            throughput_cb = ThroughputCallback(self.paths["log"])
+        if eval_data is not None:
+            eval_params = {**EVAL_PARAMS, **(eval_params or {})}
+            eval_cb = AsyncEvalCallback(
+                MarketData.load_or_build(eval_data, self.stock_dim, TECHNICAL_INDICATORS, ENV_CACHE_DIR),
+                self._env_kwargs(),
+                save_dir=self.paths["model"],
+                log_dir=self.paths.get("log") or self.paths["model"],
+                eval_freq=eval_params["eval_freq"],
+                patience=eval_params["patience"],
+                min_delta=eval_params["min_delta"],
+                max_drawdown=eval_params["max_drawdown"],
+                verbose=PPO_PARAMS.get("verbose", 0),
+            )
+        callbacks = [cb for cb in (throughput_cb, eval_cb) if cb is not None] + list(callbacks or [])
 
         model = PPO(
             policy="MlpPolicy",
             env=env_train,
             tensorboard_log=None,
-            **PPO_PARAMS,
+            **scale_ppo_params({**PPO_PARAMS, **(ppo_params or {})}, n_envs),
         )
-
-        model.learn(total_timesteps=total_timesteps)
+        if init_params_path:
+            model.set_parameters(init_params_path, device=model.device)
+
+        try:
+            model.learn(total_timesteps=total_timesteps, callback=callbacks or None)
+        finally:
+            if throughput_cb is not None:
+                throughput_cb.unpatch()
+            self.close_env(env_train)
+        if throughput_cb is not None:
+            self.throughput = throughput_cb.summary
+        if eval_cb is not None:
+            self.eval_summary = eval_cb.summary
+            if eval_params["use_best"] and eval_cb.summary["best_path"]:
+                model.set_parameters(eval_cb.summary["best_path"], device=model.device)
 
         # 将保存权移交给外层主程序
         return model
     
-    def run_backtest(self, model):
+    def run_backtest(self, model, rebalance_only=True, table_format=BACKTEST_TABLE_FORMAT):
+        """
+        在回测窗口上确定性回测，导出 actions / trades 明细与 positions / account 持仓台账（table_format：parquet / csv），
+        写出的路径记录在 self.backtest_paths。
+        rebalance_only=True（默认）时逐日 step 只发生在调仓日，非调仓日由 env.hold_to_next_rebalance 批量盯市推进，
+        区间内各日观测一次批量推理补记 action_raw。净值、成交与持仓与逐日推理（rebalance_only=False）逐位一致，
+        action_raw 因批量前向与逐条前向的矩阵乘法累加顺序不同，至多有 float32 尾差。
+        """
         # Use raw env for evaluation to avoid DummyVecEnv auto-reset.
-        env_trade = StockTradingEnv(
-            df=self.trade_data,
-            stock_dim=self.stock_dim,
-            hmax=1000,
-            initial_amount=10000,
-            buy_cost_pct=[0.001] * self.stock_dim,
-            sell_cost_pct=[0.001] * self.stock_dim,
-            tech_indicator_list=TECHNICAL_INDICATORS,
-        )
+        env_trade = StockTradingEnv(df=self.trade_data, cache_dir=ENV_CACHE_DIR, **self._env_kwargs())
         obs, _ = env_trade.reset()
 
-        action_records = []
-        trade_records = []
-        holding_records = []
-
-        # 初始投资组合快照（第0天）
-        init_date = env_trade.current_date
-        init_total_asset = float(env_trade._get_total_asset())
-        for i, tic in enumerate(env_trade.current_tics):
-            holding = float(env_trade.holdings[i])
-            price = float(env_trade.prices[i])
-            holding_records.append(
-                {
-                    "date": init_date,
-                    "tic": tic,
-                    "holding_shares": holding,
-                    "price": price,
-                    "position_value": holding * price,
-                    "cash": float(env_trade.cash),
-                    "total_asset": init_total_asset,
-                }
-            )
+        # 明细按回合内下标写入预分配的 T×N 数组，保存时才展开为长表
+        recorder = BacktestRecorder.for_episode(env_trade)
+        start_day = env_trade.start_day
+        recorder.record_account(0, env_trade.holdings, env_trade.cash, env_trade._get_total_asset())
 
         done = False
         while not done:
-            trade_date = env_trade.current_date
-            trade_tics = list(env_trade.current_tics)
+            t = env_trade.day - start_day
+            if rebalance_only and not env_trade._is_rebalance_day():
+                # 持仓区间：成交为 0，动作打分由区间观测批量推理补记，估值按区间写入
+                obs, done, values, held_obs = env_trade.hold_to_next_rebalance(with_obs=True)
+                held_actions, _ = model.predict(held_obs, deterministic=True)
+                days = slice(t, t + len(values))
+                recorder.record_actions(days, held_actions)
+                recorder.record_account(slice(t + 1, t + 1 + len(values)), env_trade.holdings, env_trade.cash, values)
+                continue
 
             action, _ = model.predict(obs, deterministic=True)
             obs, _, terminated, truncated, _ = env_trade.step(action)
             done = terminated or truncated
 
-            for i, tic in enumerate(trade_tics):
-                raw_action = float(env_trade.last_action_raw[i])
-                target_shares = int(env_trade.last_action_shares[i])
-                exec_shares = int(env_trade.last_trade_shares[i])
-                trade_price = float(env_trade.last_trade_prices[i])
-                trade_fee = float(env_trade.last_trade_fees[i])
-
-                action_records.append(
-                    {
-                        "date": trade_date,
-                        "tic": tic,
-                        "action_raw": raw_action,
-                        "target_shares": target_shares,
-                    }
-                )
-                trade_records.append(
-                    {
-                        "date": trade_date,
-                        "tic": tic,
-                        "target_shares": target_shares,
-                        "executed_shares": exec_shares,
-                        "trade_price": trade_price,
-                        "trade_notional": abs(exec_shares) * trade_price,
-                        "trade_fee": trade_fee,
-                    }
-                )
-
-            valuation_date = env_trade.current_date
-            total_asset = float(env_trade._get_total_asset())
-            for i, tic in enumerate(env_trade.current_tics):
-                holding = float(env_trade.holdings[i])
-                price = float(env_trade.prices[i])
-                holding_records.append(
-                    {
-                        "date": valuation_date,
-                        "tic": tic,
-                        "holding_shares": holding,
-                        "price": price,
-                        "position_value": holding * price,
-                        "cash": float(env_trade.cash),
-                        "total_asset": total_asset,
-                    }
-                )
+            recorder.record_trade(
+                t,
+                env_trade.last_action_raw,
+                env_trade.last_action_shares,
+                env_trade.last_trade_shares,
+                env_trade.last_trade_fees,
+            )
+            recorder.record_account(t + 1, env_trade.holdings, env_trade.cash, env_trade._get_total_asset())
 
         account_value = env_trade.asset_memory
         dates = env_trade.date_memory
 
-        table_dir = self.paths["table"]
-        os.makedirs(table_dir, exist_ok=True)
-
-        df_actions = pd.DataFrame(action_records)
-        df_trades = pd.DataFrame(trade_records)
-        df_holdings = pd.DataFrame(holding_records)
-
-        df_actions.to_csv(os.path.join(table_dir, "backtest_actions.csv"), index=False)
-        df_trades.to_csv(os.path.join(table_dir, "backtest_trades.csv"), index=False)
-        df_holdings.to_csv(os.path.join(table_dir, "backtest_holdings.csv"), index=False)
+        self.backtest_paths = recorder.save(self.paths["table"], fmt=table_format)
 
         return (
             pd.DataFrame({"date": dates, "account_value": account_value}),
-            df_actions,
+            recorder.frames()["actions"],
         )
@@ -5,9 +5,11 @@ import numpy as np
 import pandas as pd
 from stable_baselines3 import PPO
 
-from configs.base_config import DATA_PATH, DOCS_DIR, TECHNICAL_INDICATORS
+from configs.base_config import DATA_PATH, DOCS_DIR, ENV_CACHE_DIR, TECHNICAL_INDICATORS
 from configs.agent.ppo import PPO_PARAMS
 from src.envs.env_stocktrading import StockTradingEnv
+from src.training.backtest_records import read_backtest_table
+from src.training.benchmarks import build_equal_weight_benchmark, build_topk_momentum_benchmark
 from src.training.train_agent import AgentTrainer
 
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -32,125 +34,6 @@ DEFAULT_MODEL_PATH = os.path.join(
 )
 
 
-def _prepare_price_pivot(trade_df: pd.DataFrame) -> pd.DataFrame:
-    return trade_df.pivot(index="date", columns="tic", values="close").sort_index()
-
-
-def build_equal_weight_benchmark(
-    trade_df: pd.DataFrame,
-    initial_amount: float,
-    rebalance_window: int,
-    buy_cost_pct: float,
-    sell_cost_pct: float,
-):
-    """Benchmark1：全股票等权 + 每5日再平衡 + 双边手续费。"""
-    price_pivot = _prepare_price_pivot(trade_df)
-    if price_pivot.empty:
-        empty = pd.DataFrame(columns=["date", "account_value"])
-        return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
-
-    daily_ret = price_pivot.pct_change().fillna(0.0)
-    n_assets = price_pivot.shape[1]
-    target_w = np.full(n_assets, 1.0 / n_assets, dtype=np.float64)
-
-    nav = float(initial_amount)
-    weights = np.zeros(n_assets, dtype=np.float64)
-    turnover_sum = 0.0
-    total_fee_amount = 0.0
-    rows = [{"date": price_pivot.index[0], "account_value": nav}]
-
-    for i in range(1, len(price_pivot.index)):
-        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-        nav *= 1.0 + float(np.dot(weights, r))
-
-        gross_weights = weights * (1.0 + r)
-        gross_sum = float(np.sum(gross_weights))
-        drift_w = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-        weights = drift_w
-
-        if i % rebalance_window == 0:
-            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
-            fee_amount = nav * fee_ratio
-            nav *= max(0.0, 1.0 - fee_ratio)
-
-            turnover_sum += buy_turnover + sell_turnover
-            total_fee_amount += fee_amount
-            weights = target_w.copy()
-
-        rows.append({"date": price_pivot.index[i], "account_value": nav})
-
-    stats = {
-        "turnover_ratio": turnover_sum,
-        "cost_ratio": total_fee_amount / float(initial_amount),
-    }
-    return pd.DataFrame(rows), stats
-
-
-def build_topk_momentum_benchmark(
-    trade_df: pd.DataFrame,
-    initial_amount: float,
-    top_k: int,
-    rebalance_window: int,
-    momentum_window: int,
-    buy_cost_pct: float,
-    sell_cost_pct: float,
-):
-    """Benchmark2：Top-K 动量 + 每5日调仓 + 双边手续费。"""
-    price_pivot = _prepare_price_pivot(trade_df)
-    if price_pivot.empty:
-        empty = pd.DataFrame(columns=["date", "account_value"])
-        return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
-
-    daily_ret = price_pivot.pct_change().fillna(0.0)
-    close_np = price_pivot.to_numpy(dtype=np.float64)
-    n_assets = close_np.shape[1]
-    top_k = int(max(1, min(top_k, n_assets)))
-
-    nav = float(initial_amount)
-    weights = np.zeros(n_assets, dtype=np.float64)
-    turnover_sum = 0.0
-    total_fee_amount = 0.0
-    rows = [{"date": price_pivot.index[0], "account_value": nav}]
-
-    for i in range(1, len(price_pivot.index)):
-        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-        nav *= 1.0 + float(np.dot(weights, r))
-
-        gross_weights = weights * (1.0 + r)
-        gross_sum = float(np.sum(gross_weights))
-        drift_w = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-        weights = drift_w
-
-        if i % rebalance_window == 0:
-            lookback_end = i - 1
-            lookback_start = max(0, lookback_end - momentum_window)
-            momentum = close_np[lookback_end] / np.maximum(close_np[lookback_start], 1e-8) - 1.0
-
-            select_idx = np.argsort(momentum)[::-1][:top_k]
-            target_w = np.zeros(n_assets, dtype=np.float64)
-            target_w[select_idx] = 1.0 / float(top_k)
-
-            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
-            fee_amount = nav * fee_ratio
-            nav *= max(0.0, 1.0 - fee_ratio)
-
-            turnover_sum += buy_turnover + sell_turnover
-            total_fee_amount += fee_amount
-            weights = target_w
-
-        rows.append({"date": price_pivot.index[i], "account_value": nav})
-
-    stats = {
-        "turnover_ratio": turnover_sum,
-        "cost_ratio": total_fee_amount / float(initial_amount),
-    }
-    return pd.DataFrame(rows), stats
-
-
 def compute_six_metrics(
     account_value_df: pd.DataFrame,
     initial_amount: float,
@@ -293,6 +176,7 @@ def run_oos():
         buy_cost_pct=[BUY_COST_PCT] * stock_dim,
         sell_cost_pct=[SELL_COST_PCT] * stock_dim,
         tech_indicator_list=TECHNICAL_INDICATORS,
+        cache_dir=ENV_CACHE_DIR,
     )
 
     hyperparams_log = {
@@ -352,9 +236,8 @@ def run_oos():
     )
 
     # Compute RL metrics
-    trade_csv = os.path.join(table_dir, "backtest_trades.csv")
-    if os.path.exists(trade_csv):
-        df_trades = pd.read_csv(trade_csv)
+    df_trades = read_backtest_table(table_dir, "trades")
+    if df_trades is not None:
         rl_turn_ratio = float(df_trades["trade_notional"].sum()) / float(INITIAL_AMOUNT)
         rl_cost_ratio = float(df_trades["trade_fee"].sum()) / float(INITIAL_AMOUNT)
     else:
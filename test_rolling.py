@@ -1,14 +1,22 @@
-﻿import os
+﻿import argparse
+import os
 import sys
 from datetime import datetime
 import numpy as np
 import pandas as pd
-from stable_baselines3 import PPO
 import torch as th
+from stable_baselines3 import PPO
 
-from configs.base_config import DATA_PATH, DOCS_DIR, TECHNICAL_INDICATORS
+from configs.base_config import DATA_PATH, DOCS_DIR, ENV_CACHE_DIR, TECHNICAL_INDICATORS
 from configs.agent.ppo import PPO_PARAMS
 from src.envs.env_stocktrading import StockTradingEnv
+from src.training.backtest_records import read_backtest_table
+from src.training.benchmarks import build_equal_weight_benchmark, build_topk_momentum_benchmark
+from src.training.checkpoint import AsyncCheckpointWriter, load_model_cached
+from src.training.lockstep_eval import evaluate_models_lockstep
+from src.training.manifest import RunManifest
+from src.training.parallel import run_with_retries
+from src.training.profiling import ThroughputCallback, TimedVecEnv
 from src.training.train_agent import AgentTrainer
 
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -25,6 +33,8 @@ TOP_K = 5
 REBALANCE_WINDOW = 5
 ROLLING_TIMESTEPS = 30_000  # 每次微调的步数
 ROLLING_SEEDS = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+MAX_WORKERS = None  # 并行滚动链的进程数；None 表示按 CPU 核数自动确定
+MAX_RETRIES = 1  # 单条滚动链失败后的重试次数
 
 # 基座模型路径 (Stage 1 中位数模型)
 DEFAULT_MODEL_PATH = os.path.join(
@@ -68,125 +78,6 @@ ROLL_SCHEDULE = [
 ]
 
 
-def _prepare_price_pivot(trade_df: pd.DataFrame) -> pd.DataFrame:
-    return trade_df.pivot(index="date", columns="tic", values="close").sort_index()
-
-
-def build_equal_weight_benchmark(
-    trade_df: pd.DataFrame,
-    initial_amount: float,
-    rebalance_window: int,
-    buy_cost_pct: float,
-    sell_cost_pct: float,
-):
-    """Benchmark1：全股票等权 + 每5日再平衡 + 双边手续费。"""
-    price_pivot = _prepare_price_pivot(trade_df)
-    if price_pivot.empty:
-        empty = pd.DataFrame(columns=["date", "account_value"])
-        return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
-
-    daily_ret = price_pivot.pct_change().fillna(0.0)
-    n_assets = price_pivot.shape[1]
-    target_w = np.full(n_assets, 1.0 / n_assets, dtype=np.float64)
-
-    nav = float(initial_amount)
-    weights = np.zeros(n_assets, dtype=np.float64)
-    turnover_sum = 0.0
-    total_fee_amount = 0.0
-    rows = [{"date": price_pivot.index[0], "account_value": nav}]
-
-    for i in range(1, len(price_pivot.index)):
-        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-        nav *= 1.0 + float(np.dot(weights, r))
-
-        gross_weights = weights * (1.0 + r)
-        gross_sum = float(np.sum(gross_weights))
-        drift_w = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-        weights = drift_w
-
-        if i % rebalance_window == 0:
-            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
-            fee_amount = nav * fee_ratio
-            nav *= max(0.0, 1.0 - fee_ratio)
-
-            turnover_sum += buy_turnover + sell_turnover
-            total_fee_amount += fee_amount
-            weights = target_w.copy()
-
-        rows.append({"date": price_pivot.index[i], "account_value": nav})
-
-    stats = {
-        "turnover_ratio": turnover_sum,
-        "cost_ratio": total_fee_amount / float(initial_amount),
-    }
-    return pd.DataFrame(rows), stats
-
-
-def build_topk_momentum_benchmark(
-    trade_df: pd.DataFrame,
-    initial_amount: float,
-    top_k: int,
-    rebalance_window: int,
-    momentum_window: int,
-    buy_cost_pct: float,
-    sell_cost_pct: float,
-):
-    """Benchmark2：Top-K 动量 + 每5日调仓 + 双边手续费。"""
-    price_pivot = _prepare_price_pivot(trade_df)
-    if price_pivot.empty:
-        empty = pd.DataFrame(columns=["date", "account_value"])
-        return empty, {"turnover_ratio": 0.0, "cost_ratio": 0.0}
-
-    daily_ret = price_pivot.pct_change().fillna(0.0)
-    close_np = price_pivot.to_numpy(dtype=np.float64)
-    n_assets = close_np.shape[1]
-    top_k = int(max(1, min(top_k, n_assets)))
-
-    nav = float(initial_amount)
-    weights = np.zeros(n_assets, dtype=np.float64)
-    turnover_sum = 0.0
-    total_fee_amount = 0.0
-    rows = [{"date": price_pivot.index[0], "account_value": nav}]
-
-    for i in range(1, len(price_pivot.index)):
-        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
-        nav *= 1.0 + float(np.dot(weights, r))
-
-        gross_weights = weights * (1.0 + r)
-        gross_sum = float(np.sum(gross_weights))
-        drift_w = gross_weights / gross_sum if gross_sum > 0 else np.zeros_like(weights)
-        weights = drift_w
-
-        if i % rebalance_window == 0:
-            lookback_end = i - 1
-            lookback_start = max(0, lookback_end - momentum_window)
-            momentum = close_np[lookback_end] / np.maximum(close_np[lookback_start], 1e-8) - 1.0
-
-            select_idx = np.argsort(momentum)[::-1][:top_k]
-            target_w = np.zeros(n_assets, dtype=np.float64)
-            target_w[select_idx] = 1.0 / float(top_k)
-
-            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
-            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
-            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
-            fee_amount = nav * fee_ratio
-            nav *= max(0.0, 1.0 - fee_ratio)
-
-            turnover_sum += buy_turnover + sell_turnover
-            total_fee_amount += fee_amount
-            weights = target_w
-
-        rows.append({"date": price_pivot.index[i], "account_value": nav})
-
-    stats = {
-        "turnover_ratio": turnover_sum,
-        "cost_ratio": total_fee_amount / float(initial_amount),
-    }
-    return pd.DataFrame(rows), stats
-
-
 def compute_six_metrics(
     account_value_df: pd.DataFrame,
     initial_amount: float,
@@ -245,11 +136,20 @@ def format_metrics(raw: dict) -> dict:
     }
 
 
-def _init_rolling_experiment(exp_paths: dict, exp_meta: dict, task_control: dict, hyperparams: dict):
+def _init_rolling_experiment(
+    exp_paths: dict, exp_meta: dict, task_control: dict, hyperparams: dict, resume: bool = False
+):
+    """创建实验目录并写日志头；续跑且日志已存在时只追加续跑记录，不覆盖原日志。"""
     for p in exp_paths.values():
         os.makedirs(p, exist_ok=True)
 
     log_path = os.path.join(exp_paths["root"], "experiment_log.md")
+    if resume and os.path.exists(log_path):
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(f"\n## 续跑记录 ({datetime.now().strftime('%Y-%m-%d %H:%M')})\n")
+            f.write("- 已完成的 seed / 窗口按实验清单复用，未完成部分继续运行\n")
+        return
+
     with open(log_path, "w", encoding="utf-8") as f:
         f.write(f"# Experiment Log: {exp_meta['exp_name']}\n\n")
         f.write("## 1. 实验描述\n")
@@ -301,10 +201,10 @@ def _resolve_processed_path() -> str:
     return candidate if os.path.exists(candidate) else DATA_PATH["processed"]
 
 
-def _collect_turnover_and_cost(trades_csv: str, initial_amount: float) -> tuple:
-    if not os.path.exists(trades_csv):
+def _collect_turnover_and_cost(table_dir: str, initial_amount: float) -> tuple:
+    df_trades = read_backtest_table(table_dir, "trades")
+    if df_trades is None:
         return 0.0, 0.0
-    df_trades = pd.read_csv(trades_csv)
     turnover_ratio = float(df_trades["trade_notional"].sum()) / float(initial_amount)
     cost_ratio = float(df_trades["trade_fee"].sum()) / float(initial_amount)
     return turnover_ratio, cost_ratio
@@ -342,134 +242,98 @@ def _plot_seed_annual_returns(exp_paths: dict, seed_rows: list):
     plt.close()
 
 
-def run_rolling():
-    exp_name = f"{datetime.now().strftime('%Y%m%d_%H%M')}_rolling_experiment"
-    exp_dir = os.path.join(DOCS_DIR, "experiments", exp_name)
-    exp_paths = {
-        "root": exp_dir,
-        "model": os.path.join(exp_dir, "checkpoints"),
-        "log": os.path.join(exp_dir, "logs"),
-        "plot": os.path.join(exp_dir, "plots"),
-        "table": os.path.join(exp_dir, "tables"),
-        "rolls": os.path.join(exp_dir, "rolls"),
-        "seeds": os.path.join(exp_dir, "seeds"),
-    }
-
-    exp_meta = {
-        "exp_name": exp_name,
-        "task_name": "A-Share Rolling Retrain Backtest",
-        "description": f"滚动重训机制验证：4年 ({FULL_OOS_START} ~ {FULL_OOS_END})",
-        "indicators": "Standard FinRL Indicators (MACD, RSI, etc.)",
-        "benchmark": "Equal Weight + Top5 Momentum (with transaction costs)",
-    }
-
-    task_control = {
-        "do_preprocessing": False,
-        "do_training": True,
-        "do_backtesting": True,
-        "do_plotting": True,
-    }
-
-    processed_path = _resolve_processed_path()
-    if not os.path.exists(processed_path):
-        raise FileNotFoundError(f"找不到数据文件: {processed_path}")
-
-    full_df = pd.read_csv(processed_path)
-    full_oos_df = full_df[(full_df.date >= FULL_OOS_START) & (full_df.date <= FULL_OOS_END)]
-    if full_oos_df.empty:
-        raise ValueError("Rolling OOS 数据为空，请检查时间范围或数据文件。")
-
-    stock_dim = len(full_oos_df.tic.unique())
-    tmp_env = StockTradingEnv(
-        df=full_oos_df,
-        stock_dim=stock_dim,
-        hmax=1000,
-        initial_amount=INITIAL_AMOUNT,
-        buy_cost_pct=[BUY_COST_PCT] * stock_dim,
-        sell_cost_pct=[SELL_COST_PCT] * stock_dim,
-        tech_indicator_list=TECHNICAL_INDICATORS,
-    )
-
-    hyperparams_log = {
-        "Rolling_OOS_Window": f"{FULL_OOS_START} to {FULL_OOS_END} (4 Years)",
-        "Rolling_Timesteps": ROLLING_TIMESTEPS,
-        "Rolling_Seeds": str(ROLLING_SEEDS),
-        "Base_Model_Path": DEFAULT_MODEL_PATH,
-        "Environment_Core": f"Top_K={tmp_env.top_k}, Rebalance={tmp_env.rebalance_window} days, Lot_Size={tmp_env.lot_size}",
-        "Reward_Shaping": f"Risk_Penalty={tmp_env.risk_penalty}, Turnover_Penalty={tmp_env.turnover_penalty}, Scaling={tmp_env.reward_scaling}",
-        "Trading_Costs": f"Buy: {BUY_COST_PCT}, Sell: {SELL_COST_PCT}, Initial_Amount: {INITIAL_AMOUNT}",
-        "State_Features": f"[{len(tmp_env.feature_cols)} cols] " + ", ".join(tmp_env.feature_cols),
-        "Market_Features": ", ".join(list(tmp_env.market_df.columns)),
-        "Processed_File": processed_path,
-        "Roll_Schedule": str(ROLL_SCHEDULE),
+def _stitch_rolling_nav(rolling_rows: list, rolling_nav: float, df_account_value: pd.DataFrame) -> float:
+    """按当年日收益率把分年净值接续到滚动净值序列末尾，返回最新滚动净值。"""
+    df_account_value = df_account_value.sort_values("date").reset_index(drop=True)
+    daily_ret = df_account_value["account_value"].pct_change().fillna(0.0).to_numpy()
+    for i, row in df_account_value.iterrows():
+        if not rolling_rows:
+            rolling_nav = float(INITIAL_AMOUNT)
+            rolling_rows.append({"date": row["date"], "account_value": rolling_nav})
+            continue
+        rolling_nav *= (1.0 + float(daily_ret[i]))
+        rolling_rows.append({"date": row["date"], "account_value": rolling_nav})
+    return rolling_nav
+
+
+def run_seed_chain(
+    seed: int,
+    chain_df: pd.DataFrame,
+    stock_dim: int,
+    exp_paths: dict,
+    exp_meta: dict,
+    task_control: dict,
+    hyperparams_log: dict,
+    benchmark_results: dict,
+    resume: bool = False,
+    profile: bool = False,
+) -> tuple:
+    """
+    子进程任务：单个 seed 的滚动链。
+    chain_df 只含滚动计划覆盖的交易日（首个微调窗口起点至末个测试窗口终点），避免向每个子进程序列化全量数据。
+    各窗口依次以上一窗口的模型为起点微调并测试，结果写入 seeds/seed_<n>，
+    返回 (该 seed 拼接净值表路径, 该 seed 的汇总行)。
+    每个窗口完成后登记到实验清单（seed_<n>/<window_name>），续跑时已完成的窗口直接复用其模型与净值。
+    """
+    manifest = RunManifest(exp_paths["root"])
+    exp_name = exp_meta["exp_name"]
+    seed_dir = os.path.join(exp_paths["seeds"], f"seed_{seed}")
+    seed_paths = {
+        "root": seed_dir,
+        "model": os.path.join(seed_dir, "checkpoints"),
+        "log": os.path.join(seed_dir, "logs"),
+        "plot": os.path.join(seed_dir, "plots"),
+        "table": os.path.join(seed_dir, "tables"),
+        "rolls": os.path.join(seed_dir, "rolls"),
     }
 
-    _init_rolling_experiment(exp_paths, exp_meta, task_control, hyperparams_log)
-    print(f"SUCCESS: Rolling 实验目录初始化成功: {exp_paths['root']}")
-
-    # ============== 1) 全周期 Benchmark ==============
-    print("INFO: 正在生成四年完整 Benchmark 曲线...")
-    df_bm_equal, bm_equal_stats = build_equal_weight_benchmark(
-        full_oos_df,
-        initial_amount=INITIAL_AMOUNT,
-        rebalance_window=REBALANCE_WINDOW,
-        buy_cost_pct=BUY_COST_PCT,
-        sell_cost_pct=SELL_COST_PCT,
-    )
-    df_bm_mom, bm_mom_stats = build_topk_momentum_benchmark(
-        full_oos_df,
-        initial_amount=INITIAL_AMOUNT,
-        top_k=TOP_K,
-        rebalance_window=REBALANCE_WINDOW,
-        momentum_window=20,
-        buy_cost_pct=BUY_COST_PCT,
-        sell_cost_pct=SELL_COST_PCT,
-    )
-
-    os.makedirs(exp_paths["table"], exist_ok=True)
-    df_bm_equal.to_csv(os.path.join(exp_paths["table"], "benchmark_equal_weight.csv"), index=False)
-    df_bm_mom.to_csv(os.path.join(exp_paths["table"], "benchmark_top5_momentum.csv"), index=False)
+    seed_meta = exp_meta.copy()
+    seed_meta["exp_name"] = f"{exp_name}_seed{seed}"
+    seed_meta["description"] = f"{exp_meta['description']} | Seed={seed}"
 
-    # ============== 2) 多 Seed 滚动重训与分年推理 ==============
-    seed_summary_rows = []
-    seed_log_path = os.path.join(exp_paths["root"], "experiment_log.md")
+    seed_hyper = hyperparams_log.copy()
+    seed_hyper["Rolling_Seed"] = seed
 
-    for seed in ROLLING_SEEDS:
-        seed_dir = os.path.join(exp_paths["seeds"], f"seed_{seed}")
-        seed_paths = {
-            "root": seed_dir,
-            "model": os.path.join(seed_dir, "checkpoints"),
-            "log": os.path.join(seed_dir, "logs"),
-            "plot": os.path.join(seed_dir, "plots"),
-            "table": os.path.join(seed_dir, "tables"),
-            "rolls": os.path.join(seed_dir, "rolls"),
-        }
+    _init_rolling_experiment(seed_paths, seed_meta, task_control, seed_hyper, resume=resume)
+    print(f"\n================ 开始 Seed={seed} 滚动流水线 ================")
 
-        seed_meta = exp_meta.copy()
-        seed_meta["exp_name"] = f"{exp_name}_seed{seed}"
-        seed_meta["description"] = f"{exp_meta['description']} | Seed={seed}"
-
-        seed_hyper = hyperparams_log.copy()
-        seed_hyper["Rolling_Seed"] = seed
-
-        _init_rolling_experiment(seed_paths, seed_meta, task_control, seed_hyper)
-        print(f"\n================ 开始 Seed={seed} 滚动流水线 ================")
-
-        current_model_path = DEFAULT_MODEL_PATH
-        rolling_rows = []
-        rolling_nav = float(INITIAL_AMOUNT)
-        roll_metrics = {}
-        total_turnover_ratio = 0.0
-        total_cost_ratio = 0.0
+    current_model_path = DEFAULT_MODEL_PATH
+    rolling_rows = []
+    rolling_nav = float(INITIAL_AMOUNT)
+    roll_metrics = {}
+    total_turnover_ratio = 0.0
+    total_cost_ratio = 0.0
+    model = None
 
+    # checkpoint 交给后台线程写盘，与回测推理重叠
+    ckpt_writer = AsyncCheckpointWriter()
+    try:
         for roll_idx, schedule in enumerate(ROLL_SCHEDULE, 1):
             window_name = schedule["window_name"]
             print(f"\n>>> Seed {seed} | 阶段 {roll_idx}/{len(ROLL_SCHEDULE)} : [{window_name}]")
             print(f"    - 微调窗口: {schedule['train_start']} ~ {schedule['train_end']}")
             print(f"    - 测试窗口: {schedule['test_start']} ~ {schedule['test_end']}")
 
-            train_df = full_df[(full_df.date >= schedule["train_start"]) & (full_df.date <= schedule["train_end"])][:]
-            test_df = full_df[(full_df.date >= schedule["test_start"]) & (full_df.date <= schedule["test_end"])][:]
+            roll_unit = f"seed_{seed}/{window_name}"
+            if manifest.is_complete(roll_unit):
+                entry = manifest.load(roll_unit)
+                current_model_path = os.path.join(exp_paths["root"], entry["artifacts"]["checkpoint"]["path"])
+                df_account_value = pd.read_csv(
+                    os.path.join(exp_paths["root"], entry["artifacts"]["account_value"]["path"]),
+                    parse_dates=["date"],
+                )
+                roll_turn = entry["summary"]["turnover_ratio"]
+                roll_cost = entry["summary"]["cost_ratio"]
+                roll_metrics[window_name] = entry["summary"]["metrics"]
+                total_turnover_ratio += roll_turn
+                total_cost_ratio += roll_cost
+                print("    - 清单校验通过，跳过微调与回测")
+                model = None
+                rolling_nav = _stitch_rolling_nav(rolling_rows, rolling_nav, df_account_value)
+                continue
+
+            train_df = chain_df[(chain_df.date >= schedule["train_start"]) & (chain_df.date <= schedule["train_end"])][:]
+            test_df = chain_df[(chain_df.date >= schedule["test_start"]) & (chain_df.date <= schedule["test_end"])][:]
             if train_df.empty or test_df.empty:
                 raise ValueError(f"数据为空: {window_name}")
 
@@ -484,6 +348,8 @@ def run_rolling():
                 buy_cost_pct=[BUY_COST_PCT] * stock_dim,
                 sell_cost_pct=[SELL_COST_PCT] * stock_dim,
                 tech_indicator_list=TECHNICAL_INDICATORS,
+                cache_dir=ENV_CACHE_DIR,
+                diagnostics=False,
             )
             sb3_train_env, _ = train_env.get_sb_env()
             try:
@@ -491,16 +357,25 @@ def run_rolling():
             except Exception:
                 pass
 
-            model = PPO.load(current_model_path, env=sb3_train_env)
+            # 首个窗口从基座模型的内存副本开始，之后沿用内存中的模型，只替换训练环境
+            if model is None:
+                model = load_model_cached(current_model_path)
+            model.set_env(TimedVecEnv(sb3_train_env) if profile else sb3_train_env)
             try:
                 model.set_random_seed(seed)
             except Exception:
                 pass
-            model.learn(total_timesteps=ROLLING_TIMESTEPS)
+            # 同一 model 跨窗口沿用，learn 异常退出时也要移除计时包装
+            throughput_cb = ThroughputCallback(seed_paths["log"], name=f"throughput_{window_name}") if profile else None
+            try:
+                model.learn(total_timesteps=ROLLING_TIMESTEPS, callback=throughput_cb)
+            finally:
+                if throughput_cb is not None:
+                    throughput_cb.unpatch()
 
             os.makedirs(seed_paths["model"], exist_ok=True)
             current_model_path = os.path.join(seed_paths["model"], f"ppo_{window_name}.zip")
-            model.save(current_model_path)
+            ckpt_writer.save(model, current_model_path)
 
             # --- 测试推理 (Inference) ---
             roll_dir = os.path.join(seed_paths["rolls"], window_name)
@@ -518,11 +393,11 @@ def run_rolling():
             df_account_value, _ = trainer.run_backtest(model)
 
             # 保存该年的净值表
-            df_account_value.to_csv(os.path.join(roll_paths["table"], "account_value.csv"), index=False)
+            roll_account_path = os.path.join(roll_paths["table"], "account_value.csv")
+            df_account_value.to_csv(roll_account_path, index=False)
 
             # 计算该年的绩效指标
-            trade_csv = os.path.join(roll_paths["table"], "backtest_trades.csv")
-            roll_turn, roll_cost = _collect_turnover_and_cost(trade_csv, INITIAL_AMOUNT)
+            roll_turn, roll_cost = _collect_turnover_and_cost(roll_paths["table"], INITIAL_AMOUNT)
             total_turnover_ratio += roll_turn
             total_cost_ratio += roll_cost
 
@@ -530,61 +405,230 @@ def run_rolling():
                 df_account_value, INITIAL_AMOUNT, roll_turn, roll_cost
             )
 
-            # 记录滚动净值
-            df_account_value = df_account_value.sort_values("date").reset_index(drop=True)
-            daily_ret = df_account_value["account_value"].pct_change().fillna(0.0).to_numpy()
-            for i, row in df_account_value.iterrows():
-                if not rolling_rows:
-                    rolling_nav = float(INITIAL_AMOUNT)
-                    rolling_rows.append({"date": row["date"], "account_value": rolling_nav})
-                    continue
-                rolling_nav *= (1.0 + float(daily_ret[i]))
-                rolling_rows.append({"date": row["date"], "account_value": rolling_nav})
-
-        # Seed 总体评估
-        df_rolling_full = pd.DataFrame(rolling_rows)
-        raw_rl_metrics = compute_metrics_raw(
-            df_rolling_full, INITIAL_AMOUNT, total_turnover_ratio, total_cost_ratio
+            ckpt_writer.wait(current_model_path)
+            artifacts = {"checkpoint": current_model_path, "account_value": roll_account_path}
+            if "trades" in trainer.backtest_paths:
+                artifacts["backtest_trades"] = trainer.backtest_paths["trades"]
+            manifest.mark_complete(
+                roll_unit,
+                artifacts,
+                {"turnover_ratio": roll_turn, "cost_ratio": roll_cost, "metrics": roll_metrics[window_name]},
+            )
+
+            rolling_nav = _stitch_rolling_nav(rolling_rows, rolling_nav, df_account_value)
+    finally:
+        ckpt_writer.close()
+
+    # Seed 总体评估
+    df_rolling_full = pd.DataFrame(rolling_rows)
+    raw_rl_metrics = compute_metrics_raw(
+        df_rolling_full, INITIAL_AMOUNT, total_turnover_ratio, total_cost_ratio
+    )
+    rl_metrics = format_metrics(raw_rl_metrics)
+
+    # 写入 seed 日志
+    seed_log = os.path.join(seed_paths["root"], "experiment_log.md")
+    per_roll_stats = {}
+    for roll_name, metrics in roll_metrics.items():
+        per_roll_stats[roll_name] = ""
+        for k, v in metrics.items():
+            per_roll_stats[f"{roll_name}_{k}"] = v
+    _append_section(seed_log, "4. 分窗口回测指标", per_roll_stats)
+
+    _append_section(seed_log, "5. 全周期回测性能指标", {"RL_Rolling_OOS_" + k: v for k, v in rl_metrics.items()})
+
+    # 保存净值与图表
+    os.makedirs(seed_paths["table"], exist_ok=True)
+    seed_account_path = os.path.join(seed_paths["table"], "account_value.csv")
+    df_rolling_full.to_csv(seed_account_path, index=False)
+
+    _plot_comparison(seed_paths, df_rolling_full, benchmark_results)
+
+    return (
+        seed_account_path,
+        {
+            "seed": seed,
+            "final_nav": raw_rl_metrics["final_nav"],
+            "annual_return": raw_rl_metrics["annual_return"] * 100.0,
+            "sharpe": raw_rl_metrics["sharpe"],
+            "max_drawdown": raw_rl_metrics["max_drawdown"] * 100.0,
+            "vol_annual": raw_rl_metrics["vol_annual"] * 100.0,
+            "turnover_ratio": raw_rl_metrics["turnover_ratio"] * 100.0,
+            "cost_ratio": raw_rl_metrics["cost_ratio"] * 100.0,
+        },
+    )
+
+
+def run_rolling(resume_dir: str = None, max_retries: int = MAX_RETRIES, profile: bool = False):
+    """
+    多 seed 滚动重训主流程。
+    resume_dir 指定已有实验目录时续跑：已完成的 seed 直接复用汇总行，未完成的 seed 从首个未完成窗口继续。
+    profile=True 时各窗口训练记录吞吐（seed 的 log 目录下 throughput_<window>.csv|json）。
+    """
+    if resume_dir:
+        exp_dir = os.path.abspath(resume_dir)
+        exp_name = os.path.basename(exp_dir)
+    else:
+        exp_name = f"{datetime.now().strftime('%Y%m%d_%H%M')}_rolling_experiment"
+        exp_dir = os.path.join(DOCS_DIR, "experiments", exp_name)
+    exp_paths = {
+        "root": exp_dir,
+        "model": os.path.join(exp_dir, "checkpoints"),
+        "log": os.path.join(exp_dir, "logs"),
+        "plot": os.path.join(exp_dir, "plots"),
+        "table": os.path.join(exp_dir, "tables"),
+        "rolls": os.path.join(exp_dir, "rolls"),
+        "seeds": os.path.join(exp_dir, "seeds"),
+    }
+
+    exp_meta = {
+        "exp_name": exp_name,
+        "task_name": "A-Share Rolling Retrain Backtest",
+        "description": f"滚动重训机制验证：4年 ({FULL_OOS_START} ~ {FULL_OOS_END})",
+        "indicators": "Standard FinRL Indicators (MACD, RSI, etc.)",
+        "benchmark": "Equal Weight + Top5 Momentum (with transaction costs)",
+    }
+
+    task_control = {
+        "do_preprocessing": False,
+        "do_training": True,
+        "do_backtesting": True,
+        "do_plotting": True,
+    }
+
+    processed_path = _resolve_processed_path()
+    if not os.path.exists(processed_path):
+        raise FileNotFoundError(f"找不到数据文件: {processed_path}")
+
+    full_df = pd.read_csv(processed_path)
+    full_oos_df = full_df[(full_df.date >= FULL_OOS_START) & (full_df.date <= FULL_OOS_END)]
+    if full_oos_df.empty:
+        raise ValueError("Rolling OOS 数据为空，请检查时间范围或数据文件。")
+
+    stock_dim = len(full_oos_df.tic.unique())
+    tmp_env = StockTradingEnv(
+        df=full_oos_df,
+        stock_dim=stock_dim,
+        hmax=1000,
+        initial_amount=INITIAL_AMOUNT,
+        buy_cost_pct=[BUY_COST_PCT] * stock_dim,
+        sell_cost_pct=[SELL_COST_PCT] * stock_dim,
+        tech_indicator_list=TECHNICAL_INDICATORS,
+        cache_dir=ENV_CACHE_DIR,
+    )
+
+    hyperparams_log = {
+        "Rolling_OOS_Window": f"{FULL_OOS_START} to {FULL_OOS_END} (4 Years)",
+        "Rolling_Timesteps": ROLLING_TIMESTEPS,
+        "Rolling_Seeds": str(ROLLING_SEEDS),
+        "Base_Model_Path": DEFAULT_MODEL_PATH,
+        "Environment_Core": f"Top_K={tmp_env.top_k}, Rebalance={tmp_env.rebalance_window} days, Lot_Size={tmp_env.lot_size}",
+        "Reward_Shaping": f"Risk_Penalty={tmp_env.risk_penalty}, Turnover_Penalty={tmp_env.turnover_penalty}, Scaling={tmp_env.reward_scaling}",
+        "Trading_Costs": f"Buy: {BUY_COST_PCT}, Sell: {SELL_COST_PCT}, Initial_Amount: {INITIAL_AMOUNT}",
+        "State_Features": f"[{len(tmp_env.feature_cols)} cols] " + ", ".join(tmp_env.feature_cols),
+        "Market_Features": ", ".join(list(tmp_env.market_df.columns)),
+        "Processed_File": processed_path,
+        "Roll_Schedule": str(ROLL_SCHEDULE),
+    }
+
+    _init_rolling_experiment(exp_paths, exp_meta, task_control, hyperparams_log, resume=bool(resume_dir))
+    if resume_dir:
+        print(f"SUCCESS: 续跑 Rolling 实验: {exp_paths['root']}")
+    else:
+        print(f"SUCCESS: Rolling 实验目录初始化成功: {exp_paths['root']}")
+    manifest = RunManifest(exp_paths["root"])
+
+    # ============== 1) 全周期 Benchmark ==============
+    bm_paths = {
+        "equal_weight": os.path.join(exp_paths["table"], "benchmark_equal_weight.csv"),
+        "top5_momentum": os.path.join(exp_paths["table"], "benchmark_top5_momentum.csv"),
+    }
+    if manifest.is_complete("benchmarks"):
+        print("INFO: 全周期 Benchmark 已生成（清单校验通过），直接读取。")
+        df_bm_equal = pd.read_csv(bm_paths["equal_weight"], float_precision="round_trip")
+        df_bm_mom = pd.read_csv(bm_paths["top5_momentum"], float_precision="round_trip")
+        bm_stats = manifest.summary("benchmarks")
+        bm_equal_stats, bm_mom_stats = bm_stats["equal_weight"], bm_stats["top5_momentum"]
+    else:
+        print("INFO: 正在生成四年完整 Benchmark 曲线...")
+        df_bm_equal, bm_equal_stats = build_equal_weight_benchmark(
+            full_oos_df,
+            initial_amount=INITIAL_AMOUNT,
+            rebalance_window=REBALANCE_WINDOW,
+            buy_cost_pct=BUY_COST_PCT,
+            sell_cost_pct=SELL_COST_PCT,
         )
-        rl_metrics = format_metrics(raw_rl_metrics)
-
-        # 写入 seed 日志
-        seed_log = os.path.join(seed_paths["root"], "experiment_log.md")
-        per_roll_stats = {}
-        for roll_name, metrics in roll_metrics.items():
-            per_roll_stats[roll_name] = ""
-            for k, v in metrics.items():
-                per_roll_stats[f"{roll_name}_{k}"] = v
-        _append_section(seed_log, "4. 分窗口回测指标", per_roll_stats)
-
-        _append_section(seed_log, "5. 全周期回测性能指标", {"RL_Rolling_OOS_" + k: v for k, v in rl_metrics.items()})
-
-        # 保存净值与图表
-        os.makedirs(seed_paths["table"], exist_ok=True)
-        df_rolling_full.to_csv(os.path.join(seed_paths["table"], "account_value.csv"), index=False)
-
-        _plot_comparison(
-            seed_paths,
-            df_rolling_full,
-            {
-                "Benchmark: Equal-Weight (5-day)": df_bm_equal,
-                "Benchmark: Top5 Momentum (5-day)": df_bm_mom,
-            },
+        df_bm_mom, bm_mom_stats = build_topk_momentum_benchmark(
+            full_oos_df,
+            initial_amount=INITIAL_AMOUNT,
+            top_k=TOP_K,
+            rebalance_window=REBALANCE_WINDOW,
+            momentum_window=20,
+            buy_cost_pct=BUY_COST_PCT,
+            sell_cost_pct=SELL_COST_PCT,
         )
 
-        seed_summary_rows.append(
-            {
-                "seed": seed,
-                "final_nav": raw_rl_metrics["final_nav"],
-                "annual_return": raw_rl_metrics["annual_return"] * 100.0,
-                "sharpe": raw_rl_metrics["sharpe"],
-                "max_drawdown": raw_rl_metrics["max_drawdown"] * 100.0,
-                "vol_annual": raw_rl_metrics["vol_annual"] * 100.0,
-                "turnover_ratio": raw_rl_metrics["turnover_ratio"] * 100.0,
-                "cost_ratio": raw_rl_metrics["cost_ratio"] * 100.0,
-            }
+        os.makedirs(exp_paths["table"], exist_ok=True)
+        df_bm_equal.to_csv(bm_paths["equal_weight"], index=False)
+        df_bm_mom.to_csv(bm_paths["top5_momentum"], index=False)
+        manifest.mark_complete(
+            "benchmarks", bm_paths, {"equal_weight": bm_equal_stats, "top5_momentum": bm_mom_stats}
         )
 
+    # ============== 2) 多 Seed 滚动重训与分年推理 ==============
+    seed_summary_rows = []
+    seed_log_path = os.path.join(exp_paths["root"], "experiment_log.md")
+
+    # 各 seed 的滚动链互相独立，分发到进程池并行；链内窗口保持先后依赖。
+    # 完成情况登记在清单中，续跑时跳过已完成的 seed。
+    benchmark_results = {
+        "Benchmark: Equal-Weight (5-day)": df_bm_equal,
+        "Benchmark: Top5 Momentum (5-day)": df_bm_mom,
+    }
+    # 子进程只需要滚动计划覆盖的区间
+    chain_start = min(s["train_start"] for s in ROLL_SCHEDULE)
+    chain_end = max(s["test_end"] for s in ROLL_SCHEDULE)
+    chain_df = full_df[(full_df.date >= chain_start) & (full_df.date <= chain_end)]
+    tasks = [
+        {
+            "seed": seed,
+            "chain_df": chain_df,
+            "stock_dim": stock_dim,
+            "exp_paths": exp_paths,
+            "exp_meta": exp_meta,
+            "task_control": task_control,
+            "hyperparams_log": hyperparams_log,
+            "benchmark_results": benchmark_results,
+            "resume": bool(resume_dir),
+            "profile": profile,
+        }
+        for seed in ROLLING_SEEDS
+    ]
+    for seed in ROLLING_SEEDS:
+        if manifest.is_complete(f"seed_{seed}"):
+            print(f"INFO: Seed={seed} 已完成（清单校验通过），跳过。")
+            seed_summary_rows.append(manifest.summary(f"seed_{seed}"))
+    done_seeds = {row["seed"] for row in seed_summary_rows}
+    tasks = [task for task in tasks if task["seed"] not in done_seeds]
+
+    failed_seeds = []
+    for task, result, error in run_with_retries(run_seed_chain, tasks, max_retries, MAX_WORKERS):
+        seed = task["seed"]
+        if error is not None:
+            print(f"   Seed={seed} 滚动链失败（已重试 {max_retries} 次）: {error}")
+            manifest.mark_failed(f"seed_{seed}", repr(error))
+            failed_seeds.append(seed)
+            continue
+        seed_account_path, summary_row = result
+        manifest.mark_complete(f"seed_{seed}", {"account_value": seed_account_path}, summary_row)
+        seed_summary_rows.append(summary_row)
+        print(f"INFO: Seed={seed} 滚动链完成 ({len(seed_summary_rows)}/{len(ROLLING_SEEDS)})")
+
+    if failed_seeds:
+        print(f"WARNING: 以下 Seed 最终失败: {failed_seeds}，可使用 --resume {exp_paths['root']} 续跑。")
+    if not seed_summary_rows:
+        return
+
     # ============== 3) 汇总统计与全局报告 ==============
     bm_equal_metrics = compute_six_metrics(
         df_bm_equal, INITIAL_AMOUNT, bm_equal_stats["turnover_ratio"], bm_equal_stats["cost_ratio"]
@@ -619,5 +663,93 @@ def run_rolling():
     print(f"SUCCESS: Rolling OOS(10 seeds) 完成！报告与绘图已写入: {exp_paths['root']}")
 
 
+def reevaluate_rolling(exp_dir: str, buy_cost_pct: float = BUY_COST_PCT, sell_cost_pct: float = SELL_COST_PCT):
+    """
+    不重新训练，按新的交易成本重算已完成滚动实验的 OOS 表现。
+    每个窗口载入全部 seed 的 checkpoint（seeds/seed_<n>/checkpoints/ppo_<window>.zip），
+    在同一份测试行情上锁步评估，再按 seed 接续成四年净值；汇总写入 tables/reevaluation_buy<..>_sell<..>.csv。
+    """
+    exp_dir = os.path.abspath(exp_dir)
+
+    def checkpoint_path(seed: int, window_name: str) -> str:
+        return os.path.join(exp_dir, "seeds", f"seed_{seed}", "checkpoints", f"ppo_{window_name}.zip")
+
+    seeds = [
+        seed for seed in ROLLING_SEEDS
+        if all(os.path.exists(checkpoint_path(seed, s["window_name"])) for s in ROLL_SCHEDULE)
+    ]
+    if not seeds:
+        raise FileNotFoundError(f"{exp_dir} 中没有窗口齐全的 seed checkpoint")
+    print(f"INFO: 重评估 {len(seeds)} 个 seed × {len(ROLL_SCHEDULE)} 个窗口 (Buy: {buy_cost_pct}, Sell: {sell_cost_pct})")
+
+    full_df = pd.read_csv(_resolve_processed_path())
+    chains = {seed: {"rows": [], "nav": float(INITIAL_AMOUNT), "turnover": 0.0, "cost": 0.0} for seed in seeds}
+    for schedule in ROLL_SCHEDULE:
+        test_df = full_df[(full_df.date >= schedule["test_start"]) & (full_df.date <= schedule["test_end"])]
+        if test_df.empty:
+            raise ValueError(f"数据为空: {schedule['window_name']}")
+        stock_dim = len(test_df.tic.unique())
+        env = StockTradingEnv(
+            df=test_df,
+            stock_dim=stock_dim,
+            hmax=1000,
+            initial_amount=INITIAL_AMOUNT,
+            buy_cost_pct=[buy_cost_pct] * stock_dim,
+            sell_cost_pct=[sell_cost_pct] * stock_dim,
+            tech_indicator_list=TECHNICAL_INDICATORS,
+            cache_dir=ENV_CACHE_DIR,
+            diagnostics=False,
+        )
+        models = [
+            PPO.load(checkpoint_path(seed, schedule["window_name"]), device=PPO_PARAMS["device"]) for seed in seeds
+        ]
+        result = evaluate_models_lockstep(models, env)
+        for k, seed in enumerate(seeds):
+            chain = chains[seed]
+            df_account_value = pd.DataFrame({"date": result["dates"], "account_value": result["nav"][:, k]})
+            chain["nav"] = _stitch_rolling_nav(chain["rows"], chain["nav"], df_account_value)
+            chain["turnover"] += float(result["turnover_ratio"][k])
+            chain["cost"] += float(result["cost_ratio"][k])
+        print(f"    - {schedule['window_name']} 完成")
+
+    summary_rows = []
+    for seed in seeds:
+        chain = chains[seed]
+        raw = compute_metrics_raw(pd.DataFrame(chain["rows"]), INITIAL_AMOUNT, chain["turnover"], chain["cost"])
+        summary_rows.append(
+            {
+                "seed": seed,
+                "final_nav": raw["final_nav"],
+                "annual_return": raw["annual_return"] * 100.0,
+                "sharpe": raw["sharpe"],
+                "max_drawdown": raw["max_drawdown"] * 100.0,
+                "vol_annual": raw["vol_annual"] * 100.0,
+                "turnover_ratio": raw["turnover_ratio"] * 100.0,
+                "cost_ratio": raw["cost_ratio"] * 100.0,
+            }
+        )
+    df_summary = pd.DataFrame(summary_rows)
+    table_dir = os.path.join(exp_dir, "tables")
+    os.makedirs(table_dir, exist_ok=True)
+    out_path = os.path.join(table_dir, f"reevaluation_buy{buy_cost_pct}_sell{sell_cost_pct}.csv")
+    df_summary.to_csv(out_path, index=False)
+    print(
+        f"SUCCESS: 年化收益率均值 {df_summary['annual_return'].mean():.2f}%，"
+        f"夏普均值 {df_summary['sharpe'].mean():.4f}，结果已写入: {out_path}"
+    )
+    return df_summary
+
+
 if __name__ == "__main__":
-    run_rolling()
+    parser = argparse.ArgumentParser(description="Rolling retrain OOS backtest (multi-seed).")
+    parser.add_argument("--resume", type=str, default=None, help="续跑已有实验目录")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--reevaluate", type=str, default=None, help="按新交易成本重评估已有实验目录（不训练）")
+    parser.add_argument("--buy-cost", type=float, default=BUY_COST_PCT)
+    parser.add_argument("--sell-cost", type=float, default=SELL_COST_PCT)
+    parser.add_argument("--profile", action="store_true", help="记录各窗口训练吞吐与耗时拆分")
+    args = parser.parse_args()
+    if args.reevaluate:
+        reevaluate_rolling(args.reevaluate, buy_cost_pct=args.buy_cost, sell_cost_pct=args.sell_cost)
+    else:
+        run_rolling(resume_dir=args.resume, max_retries=args.max_retries, profile=args.profile)
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 仓库脚本以仓库根目录为工作目录运行（from src... / from configs...），测试同样从根目录导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from configs.base_config import TECHNICAL_INDICATORS  # noqa: E402
+
+
+def make_market_df(n_days: int = 60, n_stocks: int = 6, seed: int = 0) -> pd.DataFrame:
+    """合成 (date, tic) 长表行情：几何随机游走收盘价 + 随机技术指标列，列名与预处理输出一致。"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2021-01-04", periods=n_days).strftime("%Y-%m-%d")
+    tickers = [f"{600000 + i}.SH" for i in range(n_stocks)]
+    close = (10.0 + 20.0 * rng.random(n_stocks)) * np.cumprod(
+        1.0 + rng.normal(0.0, 0.02, (n_days, n_stocks)), axis=0
+    )
+    df = pd.DataFrame(
+        {
+            "date": np.repeat(dates, n_stocks),
+            "tic": np.tile(tickers, n_days),
+            "close": close.reshape(-1),
+            "open": close.reshape(-1) * (1.0 + rng.normal(0.0, 0.005, n_days * n_stocks)),
+            "volume": rng.integers(10_000, 1_000_000, n_days * n_stocks).astype(float),
+        }
+    )
+    for col in TECHNICAL_INDICATORS:
+        df[col] = rng.normal(size=len(df))
+    return df
+
+
+def env_kwargs(stock_dim: int) -> dict:
+    """与 AgentTrainer._env_kwargs 一致的环境参数。"""
+    return dict(
+        stock_dim=stock_dim,
+        hmax=1000,
+        initial_amount=10000,
+        buy_cost_pct=[0.001] * stock_dim,
+        sell_cost_pct=[0.001] * stock_dim,
+        tech_indicator_list=TECHNICAL_INDICATORS,
+    )
+
+
+@pytest.fixture
+def market_df():
+    return make_market_df()
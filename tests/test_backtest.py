@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stable_baselines3 import PPO
+
+import src.training.train_agent as train_agent
+from conftest import make_market_df
+from src.training.backtest_records import read_holdings
+
+
+@pytest.fixture
+def trainer(tmp_path, monkeypatch):
+    monkeypatch.setattr(train_agent, "ENV_CACHE_DIR", str(tmp_path / "env_cache"))
+    df = make_market_df(n_days=48, n_stocks=6, seed=5)
+    return train_agent.AgentTrainer(df, df, {"table": str(tmp_path / "tables")})
+
+
+def _backtest(trainer, model, rebalance_only):
+    account, actions = trainer.run_backtest(model, rebalance_only=rebalance_only, table_format="csv")
+    frames = {name: pd.read_csv(path) for name, path in trainer.backtest_paths.items()}
+    return account, actions, frames, read_holdings(trainer.paths["table"])
+
+
+def test_rebalance_only_matches_per_day_inference(trainer):
+    env, _ = trainer.create_env(trainer.train_data, seed=0)
+    model = PPO("MlpPolicy", env, n_steps=32, batch_size=16, n_epochs=1, seed=0, verbose=0)
+    model.learn(total_timesteps=32)
+
+    daily = _backtest(trainer, model, rebalance_only=False)
+    fast = _backtest(trainer, model, rebalance_only=True)
+
+    pd.testing.assert_frame_equal(fast[0], daily[0], check_exact=True)
+    assert daily[0]["account_value"].nunique() > 1
+    assert (daily[2]["trades"]["executed_shares"] != 0).any()
+    for name in ("trades", "positions", "account"):
+        pd.testing.assert_frame_equal(fast[2][name], daily[2][name], check_exact=True)
+    pd.testing.assert_frame_equal(fast[3], daily[3], check_exact=True)
+
+    # 持仓日的动作打分由批量推理补记：不缺失，只允许 float32 尾差
+    assert not fast[1]["action_raw"].isna().any()
+    np.testing.assert_allclose(fast[1]["action_raw"], daily[1]["action_raw"], rtol=0, atol=1e-5)
+    np.testing.assert_array_equal(fast[1]["target_shares"], daily[1]["target_shares"])
@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_market_df
+from src.training.backtest_records import (
+    BacktestRecorder,
+    backtest_table_path,
+    read_backtest_table,
+    read_holdings,
+)
+
+
+def _recorded_episode(seed=0, n_days=30, n_stocks=6):
+    """按环境口径（float32 价格与持仓）填充一个回合：持仓每 5 日调整，约一半股票空仓。"""
+    rng = np.random.default_rng(seed)
+    price_pivot = make_market_df(n_days + 1, n_stocks, seed).pivot(index="date", columns="tic", values="close")
+    prices = price_pivot.to_numpy(dtype=np.float32)
+    recorder = BacktestRecorder(pd.to_datetime(price_pivot.index), price_pivot.columns, prices)
+
+    holdings = np.zeros(n_stocks, dtype=np.float32)
+    cash = 10_000.0
+    for t in range(n_days + 1):
+        if t % 5 == 0:
+            holdings = (rng.integers(1, 10, n_stocks) * 100 * (rng.random(n_stocks) < 0.5)).astype(np.float32)
+            cash = float(rng.uniform(0.0, 5_000.0))
+        if t < n_days:
+            recorder.record_trade(
+                t, rng.uniform(-1, 1, n_stocks), holdings.astype(np.int32), holdings.astype(np.int32), np.zeros(n_stocks)
+            )
+        total = cash + float(np.sum(prices[t].astype(np.float64) * holdings))
+        recorder.record_account(t, holdings, cash, total)
+    return recorder, price_pivot
+
+
+def _dense_holdings(recorder):
+    """旧版 BacktestRecorder 写出的稠密持仓表：每个估值日每只股票一行。"""
+    n = len(recorder.tickers)
+    holdings = recorder.holding_shares.astype(np.float64).reshape(-1)
+    prices = recorder.prices.astype(np.float64).reshape(-1)
+    return pd.DataFrame(
+        {
+            "date": recorder.dates.repeat(n),
+            "tic": np.tile(recorder.tickers, len(recorder.dates)),
+            "holding_shares": holdings,
+            "price": prices,
+            "position_value": holdings * prices,
+            "cash": recorder.cash.repeat(n),
+            "total_asset": recorder.total_asset.repeat(n),
+        }
+    )
+
+
+def _formats():
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+
+        formats.append("parquet")
+    except ImportError:
+        pass
+    return formats
+
+
+@pytest.mark.parametrize("fmt", _formats())
+def test_read_holdings_rebuilds_dense_table_exactly(tmp_path, fmt):
+    recorder, price_pivot = _recorded_episode()
+    recorder.save(str(tmp_path), fmt=fmt)
+
+    rebuilt = read_holdings(str(tmp_path), prices=price_pivot)
+    expected = _dense_holdings(recorder)
+    assert (expected["holding_shares"] == 0).mean() > 0.3
+    pd.testing.assert_frame_equal(rebuilt, expected, check_exact=True, check_dtype=False, check_index_type=False)
+
+
+def test_read_holdings_without_prices_covers_held_tickers(tmp_path):
+    recorder, _ = _recorded_episode(seed=1)
+    recorder.save(str(tmp_path))
+
+    rebuilt = read_holdings(str(tmp_path))
+    expected = _dense_holdings(recorder)
+    expected = expected[expected["tic"].isin(set(rebuilt["tic"]))]
+    held = expected["holding_shares"] != 0
+    rebuilt = rebuilt.set_index(["date", "tic"]).loc[pd.MultiIndex.from_frame(expected[["date", "tic"]])]
+    np.testing.assert_array_equal(rebuilt["holding_shares"].to_numpy(), expected["holding_shares"].to_numpy())
+    np.testing.assert_array_equal(rebuilt["price"].to_numpy()[held.to_numpy()], expected["price"][held].to_numpy())
+    assert np.isnan(rebuilt["price"].to_numpy()[~held.to_numpy()]).all()
+
+
+def test_save_keeps_other_files_and_reader_uses_latest(tmp_path, capsys):
+    recorder, _ = _recorded_episode(seed=2)
+    table_dir = str(tmp_path)
+    legacy = os.path.join(table_dir, "backtest_holdings.csv")
+    pd.DataFrame({"date": [], "tic": []}).to_csv(legacy, index=False)
+    stale = os.path.join(table_dir, "backtest_actions.parquet")
+    with open(stale, "wb") as f:
+        f.write(b"stale")
+    os.utime(stale, (0, 0))
+
+    paths = recorder.save(table_dir, fmt="csv")
+
+    assert os.path.exists(legacy) and os.path.exists(stale)
+    assert "WARNING" in capsys.readouterr().out
+    assert backtest_table_path(table_dir, "actions") == paths["actions"]
+    pd.testing.assert_frame_equal(
+        read_backtest_table(table_dir, "account").assign(date=lambda d: pd.to_datetime(d["date"])),
+        recorder.frames()["account"],
+        check_exact=True,
+        check_dtype=False,
+    )
+
+
+def test_recorder_rejects_mismatched_prices():
+    with pytest.raises(ValueError):
+        BacktestRecorder(pd.date_range("2021-01-01", periods=3), ["A", "B"], np.zeros((2, 2)))
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_market_df
+from src.training.benchmarks import (
+    build_equal_weight_benchmark,
+    build_topk_momentum_benchmark,
+    rebalance_days,
+)
+
+
+def _reference_loop(trade_df, target_fn, initial_amount, rebalance_window, buy_cost_pct, sell_cost_pct):
+    """旧版逐日 iloc 循环：每日按权重更新净值并漂移权重，rebalance_window 的倍数日调到 target_fn(i) 并扣费。"""
+    price_pivot = trade_df.pivot(index="date", columns="tic", values="close").sort_index()
+    daily_ret = price_pivot.pct_change().fillna(0.0)
+    nav = float(initial_amount)
+    weights = np.zeros(price_pivot.shape[1])
+    turnover_sum = fee_sum = 0.0
+    rows = [{"date": price_pivot.index[0], "account_value": nav}]
+    for i in range(1, len(price_pivot.index)):
+        r = daily_ret.iloc[i].to_numpy(dtype=np.float64)
+        nav *= 1.0 + float(np.dot(weights, r))
+        gross = weights * (1.0 + r)
+        weights = gross / gross.sum() if gross.sum() > 0 else np.zeros_like(weights)
+        if i % rebalance_window == 0:
+            target_w = target_fn(price_pivot, i)
+            buy_turnover = float(np.maximum(target_w - weights, 0.0).sum())
+            sell_turnover = float(np.maximum(weights - target_w, 0.0).sum())
+            fee_ratio = buy_turnover * buy_cost_pct + sell_turnover * sell_cost_pct
+            fee_sum += nav * fee_ratio
+            nav *= max(0.0, 1.0 - fee_ratio)
+            turnover_sum += buy_turnover + sell_turnover
+            weights = target_w
+        rows.append({"date": price_pivot.index[i], "account_value": nav})
+    return pd.DataFrame(rows), {"turnover_ratio": turnover_sum, "cost_ratio": fee_sum / float(initial_amount)}
+
+
+def _equal_weight(price_pivot, i):
+    return np.full(price_pivot.shape[1], 1.0 / price_pivot.shape[1])
+
+
+def _topk_momentum(top_k, momentum_window):
+    def target_fn(price_pivot, i):
+        close = price_pivot.to_numpy(dtype=np.float64)
+        start = max(0, i - 1 - momentum_window)
+        momentum = close[i - 1] / np.maximum(close[start], 1e-8) - 1.0
+        target_w = np.zeros(close.shape[1])
+        target_w[np.argsort(momentum)[::-1][:top_k]] = 1.0 / top_k
+        return target_w
+
+    return target_fn
+
+
+def _assert_same(actual, expected):
+    pd.testing.assert_series_equal(actual[0]["date"], expected[0]["date"])
+    np.testing.assert_allclose(actual[0]["account_value"], expected[0]["account_value"], rtol=1e-12)
+    for key, value in expected[1].items():
+        assert actual[1][key] == pytest.approx(value, rel=1e-12, abs=1e-15)
+
+
+@pytest.mark.parametrize("n_days, window", [(61, 5), (63, 5), (40, 1), (30, 7), (4, 5)])
+def test_equal_weight_matches_daily_loop(n_days, window):
+    df = make_market_df(n_days, 6, seed=n_days)
+    kwargs = dict(initial_amount=10_000, rebalance_window=window, buy_cost_pct=0.001, sell_cost_pct=0.002)
+    _assert_same(build_equal_weight_benchmark(df, **kwargs), _reference_loop(df, _equal_weight, **kwargs))
+
+
+@pytest.mark.parametrize("top_k, window, momentum_window", [(3, 5, 20), (2, 3, 10), (10, 5, 20)])
+def test_topk_momentum_matches_daily_loop(top_k, window, momentum_window):
+    df = make_market_df(80, 8, seed=top_k)
+    kwargs = dict(initial_amount=10_000, rebalance_window=window, buy_cost_pct=0.001, sell_cost_pct=0.001)
+    actual = build_topk_momentum_benchmark(df, top_k=top_k, momentum_window=momentum_window, **kwargs)
+    expected = _reference_loop(df, _topk_momentum(min(top_k, 8), momentum_window), **kwargs)
+    _assert_same(actual, expected)
+
+
+def test_empty_input_and_invalid_window():
+    empty = make_market_df(10, 3).iloc[0:0]
+    frame, stats = build_equal_weight_benchmark(empty)
+    assert frame.empty and stats == {"turnover_ratio": 0.0, "cost_ratio": 0.0}
+    with pytest.raises(ValueError):
+        rebalance_days(10, 0)
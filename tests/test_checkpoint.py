@@ -0,0 +1,79 @@
+import pytest
+import torch as th
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from conftest import env_kwargs, make_market_df
+from src.envs.env_stocktrading import StockTradingEnv
+from src.training.checkpoint import AsyncCheckpointWriter, clone_model, load_model_cached
+
+
+def _make_vec_env(df):
+    return DummyVecEnv([lambda: StockTradingEnv(df=df, **env_kwargs(df.tic.nunique()))])
+
+
+def _state_dicts_equal(a, b):
+    return a.keys() == b.keys() and all(th.equal(a[k], b[k]) for k in a)
+
+
+def _finetune(model, env, seed):
+    model.set_env(env)
+    model.set_random_seed(seed)
+    model.learn(total_timesteps=64, reset_num_timesteps=False)
+    return model.policy.state_dict()
+
+
+@pytest.fixture
+def trained(tmp_path):
+    df = make_market_df(n_days=40, n_stocks=4)
+    model = PPO("MlpPolicy", _make_vec_env(df), n_steps=32, batch_size=16, n_epochs=1, seed=0, verbose=0)
+    model.learn(total_timesteps=32)
+    path = str(tmp_path / "model.zip")
+    model.save(path)
+    return df, model, path
+
+
+def test_clone_copies_parameters_and_optimizer(trained):
+    _, model, _ = trained
+    clone = clone_model(model)
+    assert clone.policy is not model.policy
+    assert clone.env is None
+    assert _state_dicts_equal(clone.policy.state_dict(), model.policy.state_dict())
+    clone_opt = clone.policy.optimizer.state_dict()["state"]
+    model_opt = model.policy.optimizer.state_dict()["state"]
+    assert clone_opt.keys() == model_opt.keys()
+    assert all(_state_dicts_equal(clone_opt[k], model_opt[k]) for k in model_opt)
+
+    # 修改副本不影响原模型
+    with th.no_grad():
+        next(clone.policy.parameters()).add_(1.0)
+    assert not _state_dicts_equal(clone.policy.state_dict(), model.policy.state_dict())
+
+
+def test_clone_finetunes_like_ppo_load(trained):
+    """clone_model 依赖 PPO 私有的 _setup_model：升级 stable_baselines3 时此用例需保持通过。"""
+    df, _, path = trained
+    loaded = PPO.load(path)
+    expected = _finetune(PPO.load(path), _make_vec_env(df), seed=1)
+    actual = _finetune(clone_model(loaded), _make_vec_env(df), seed=1)
+    assert _state_dicts_equal(actual, expected)
+
+
+def test_load_model_cached_returns_independent_copies(trained):
+    _, _, path = trained
+    first = load_model_cached(path)
+    second = load_model_cached(path)
+    assert first is not second
+    assert _state_dicts_equal(first.policy.state_dict(), second.policy.state_dict())
+
+
+def test_async_writer_snapshot_is_isolated_from_later_training(trained, tmp_path):
+    df, model, _ = trained
+    before = {k: v.clone() for k, v in model.policy.state_dict().items()}
+    path = str(tmp_path / "snapshot.zip")
+    with AsyncCheckpointWriter() as writer:
+        writer.save(model, path)
+        model.learn(total_timesteps=32, reset_num_timesteps=False)
+    assert _state_dicts_equal(PPO.load(path).policy.state_dict(), before)
+    assert not _state_dicts_equal(model.policy.state_dict(), before)
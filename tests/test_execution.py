@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from src.envs.execution import execute_sell_then_buy
+
+
+def _reference_sell_then_buy(cash, holdings, prices, deltas, buy_cost_pct, sell_cost_pct, lot_size):
+    """旧版 StockTradingEnv.step 的逐只股票撮合：先按 ticker 顺序 _sell，再按 ticker 顺序 _buy。"""
+    holdings = np.array(holdings, dtype=np.float64)
+    executed = np.zeros(len(holdings), dtype=np.int64)
+    fees = np.zeros(len(holdings), dtype=np.float64)
+    for i in range(len(holdings)):
+        if deltas[i] < 0:
+            sold = min(int(holdings[i]), abs(int(deltas[i])))
+            sold = (sold // lot_size) * lot_size
+            if sold > 0:
+                cash += sold * float(prices[i]) * (1.0 - sell_cost_pct[i])
+                holdings[i] -= sold
+            executed[i] -= sold
+            fees[i] += sold * float(prices[i]) * sell_cost_pct[i]
+    for i in range(len(holdings)):
+        if deltas[i] > 0:
+            price = float(prices[i])
+            bought = min(int(cash // (price * (1.0 + buy_cost_pct[i]))), int(deltas[i]))
+            bought = (bought // lot_size) * lot_size
+            if bought > 0:
+                cash -= bought * price * (1.0 + buy_cost_pct[i])
+                holdings[i] += bought
+            executed[i] += bought
+            fees[i] += bought * price * buy_cost_pct[i]
+    return cash, holdings, executed, fees
+
+
+def _random_case(rng, n_stocks, top_k, lot_size=100):
+    """随机持仓与 Top-K 目标：目标外的持仓清仓，目标内随机加减仓，现金可能不足以完成全部买单。"""
+    prices = (5.0 + 95.0 * rng.random(n_stocks)).astype(np.float32)
+    holdings = (rng.integers(0, 20, n_stocks) * lot_size * (rng.random(n_stocks) < 0.5)).astype(np.float32)
+    target = np.zeros(n_stocks, dtype=np.int64)
+    chosen = rng.choice(n_stocks, size=top_k, replace=False)
+    target[chosen] = rng.integers(0, 30, top_k) * lot_size + rng.integers(0, lot_size, top_k)
+    deltas = target - holdings.astype(np.int64)
+    cash = float(rng.uniform(0.0, 50_000.0))
+    buy_cost = np.full(n_stocks, 0.001) + 0.002 * rng.random(n_stocks)
+    sell_cost = np.full(n_stocks, 0.001) + 0.002 * rng.random(n_stocks)
+    return cash, holdings, prices, deltas, buy_cost, sell_cost
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_single_account_matches_per_ticker_loop(seed):
+    rng = np.random.default_rng(seed)
+    cash, holdings, prices, deltas, buy_cost, sell_cost = _random_case(rng, n_stocks=12, top_k=5)
+
+    expected = _reference_sell_then_buy(cash, holdings, prices, deltas, buy_cost, sell_cost, 100)
+    new_cash, new_holdings, executed, fees, notional = execute_sell_then_buy(
+        cash, holdings, prices, deltas, buy_cost, sell_cost, 100
+    )
+
+    np.testing.assert_array_equal(executed, expected[2])
+    np.testing.assert_array_equal(new_holdings, expected[1])
+    # 卖出收入先求和再入账，与逐笔累加只差浮点尾数
+    assert new_cash == pytest.approx(expected[0], rel=1e-12, abs=1e-9)
+    np.testing.assert_allclose(fees, expected[3], rtol=1e-12)
+    np.testing.assert_allclose(notional, np.abs(executed) * prices.astype(np.float64), rtol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batched_accounts_match_per_account_loop(seed):
+    rng = np.random.default_rng(100 + seed)
+    cases = [_random_case(rng, n_stocks=10, top_k=int(rng.integers(1, 6))) for _ in range(7)]
+    cash = np.array([c[0] for c in cases])
+    holdings, prices, deltas = (np.stack([c[i] for c in cases]) for i in (1, 2, 3))
+    buy_cost, sell_cost = cases[0][4], cases[0][5]
+
+    new_cash, new_holdings, executed, fees, _ = execute_sell_then_buy(
+        cash, holdings, prices, deltas, buy_cost, sell_cost, 100
+    )
+    for m in range(len(cases)):
+        expected = _reference_sell_then_buy(cash[m], holdings[m], prices[m], deltas[m], buy_cost, sell_cost, 100)
+        np.testing.assert_array_equal(executed[m], expected[2])
+        np.testing.assert_array_equal(new_holdings[m], expected[1])
+        assert new_cash[m] == pytest.approx(expected[0], rel=1e-12, abs=1e-9)
+        np.testing.assert_allclose(fees[m], expected[3], rtol=1e-12)
+
+
+def test_cash_constraint_fills_orders_in_ticker_order():
+    """现金只够第一笔买单时，后面的买单不成交，与逐只股票顺序执行一致。"""
+    prices = np.array([10.0, 10.0, 10.0])
+    deltas = np.array([300, 300, -100])
+    holdings = np.array([0.0, 0.0, 100.0])
+    cash, new_holdings, executed, _, _ = execute_sell_then_buy(
+        2_000.0, holdings, prices, deltas, np.zeros(3), np.zeros(3), 100
+    )
+    np.testing.assert_array_equal(executed, [300, 0, -100])
+    np.testing.assert_array_equal(new_holdings, [300, 0, 0])
+    assert cash == pytest.approx(0.0)
@@ -0,0 +1,52 @@
+import json
+import os
+
+from src.training.manifest import RunManifest, file_sha256
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def test_complete_unit_roundtrip(tmp_path):
+    root = str(tmp_path)
+    model = _write(os.path.join(root, "seed_3", "model.zip"), "weights")
+    table = _write(os.path.join(root, "seed_3", "account.csv"), "date,total_asset\n")
+    manifest = RunManifest(root)
+
+    assert not manifest.is_complete("seed_3/Roll_1")
+    manifest.mark_complete("seed_3/Roll_1", {"model": model, "table": table}, {"sharpe": 1.5})
+
+    reopened = RunManifest(root)
+    assert reopened.is_complete("seed_3/Roll_1")
+    assert reopened.summary("seed_3/Roll_1") == {"sharpe": 1.5}
+    entry = reopened.load("seed_3/Roll_1")
+    assert entry["artifacts"]["model"] == {"path": os.path.join("seed_3", "model.zip"), "sha256": file_sha256(model)}
+    assert os.listdir(reopened.dir) == ["seed_3__Roll_1.json"]
+
+
+def test_changed_or_missing_artifact_is_incomplete(tmp_path):
+    root = str(tmp_path)
+    model = _write(os.path.join(root, "model.zip"), "weights")
+    table = _write(os.path.join(root, "table.csv"), "a\n")
+    manifest = RunManifest(root)
+    manifest.mark_complete("seed_1", {"model": model})
+    manifest.mark_complete("seed_2", {"table": table})
+
+    _write(model, "weights v2")
+    os.remove(table)
+    assert not manifest.is_complete("seed_1")
+    assert not manifest.is_complete("seed_2")
+
+
+def test_failed_unit_is_rerun(tmp_path):
+    manifest = RunManifest(str(tmp_path))
+    manifest.mark_failed("seed_5", "RuntimeError: boom")
+    assert not manifest.is_complete("seed_5")
+    assert manifest.summary("seed_5") == {}
+    with open(os.path.join(manifest.dir, "seed_5.json"), encoding="utf-8") as f:
+        assert json.load(f)["error"] == "RuntimeError: boom"
+    assert not [name for name in os.listdir(manifest.dir) if name.endswith(".tmp")]
@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+import pytest
+
+import src.envs.market_data as market_data
+from conftest import make_market_df
+from configs.base_config import TECHNICAL_INDICATORS
+from src.envs.market_data import MarketData, prune_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_memo(monkeypatch):
+    """每个用例使用独立的进程内缓存，互不影响。"""
+    monkeypatch.setattr(market_data, "_KEY_MEMO", {})
+    monkeypatch.setattr(market_data, "_LOADED", {})
+
+
+def _count_key_calls(monkeypatch):
+    calls = []
+    original = market_data.market_data_key
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(market_data, "market_data_key", counting)
+    return calls
+
+
+def test_from_dataframe_matches_pivot():
+    df = make_market_df(n_days=20, n_stocks=5)
+    df.loc[3, "macd"] = np.nan
+    df.loc[4, "rsi_30"] = np.inf
+    data = MarketData.from_dataframe(df.sample(frac=1.0, random_state=0), 5, TECHNICAL_INDICATORS)
+
+    pivot = df.pivot(index="date", columns="tic", values="close")
+    assert data.tickers == list(pivot.columns)
+    np.testing.assert_array_equal(data.prices, pivot.to_numpy(dtype=np.float32))
+    macd = df.pivot(index="date", columns="tic", values="macd").to_numpy(dtype=np.float32)
+    np.testing.assert_array_equal(data.features[..., data.feature_cols.index("macd")], np.nan_to_num(macd, nan=0.0))
+    assert np.isfinite(data.features).all()
+    assert data.market.shape == (20, 3)
+
+
+def test_from_dataframe_rejects_missing_rows():
+    df = make_market_df(n_days=10, n_stocks=4).drop(index=5)
+    with pytest.raises(ValueError):
+        MarketData.from_dataframe(df, 4, TECHNICAL_INDICATORS)
+
+
+def test_ragged_features_match_dense_rows():
+    df = make_market_df(n_days=15, n_stocks=4)
+    ragged_df = df.drop(index=df.index[(df["tic"] == df["tic"].iloc[0]) & (df["date"] > df["date"].iloc[40])])
+    dense = MarketData.from_dataframe(df, 4, TECHNICAL_INDICATORS)
+    ragged = MarketData.from_dataframe(ragged_df, 4, TECHNICAL_INDICATORS, allow_ragged=True)
+
+    assert ragged.ragged and not ragged.tradable[-1, 0] and ragged.tradable[-1, 1:].all()
+    features = ragged.features_at(np.arange(15))
+    np.testing.assert_array_equal(features[ragged.tradable], dense.features[ragged.tradable])
+    assert (features[~ragged.tradable] == 0).all()
+    # 调出后的价格沿用最近收盘价
+    last = np.flatnonzero(ragged.tradable[:, 0])[-1]
+    assert (ragged.prices[last:, 0] == dense.prices[last, 0]).all()
+
+
+def test_load_or_build_hashes_once_and_reuses_in_process(tmp_path, monkeypatch):
+    calls = _count_key_calls(monkeypatch)
+    df = make_market_df(n_days=30, n_stocks=4)
+    first = MarketData.load_or_build(df, 4, TECHNICAL_INDICATORS, str(tmp_path))
+    second = MarketData.load_or_build(df, 4, TECHNICAL_INDICATORS, str(tmp_path))
+    assert second is first
+    assert len(calls) == 1
+
+    # 内容相同的新 DataFrame 对象：重新哈希，命中同一缓存条目
+    assert MarketData.load_or_build(df.copy(), 4, TECHNICAL_INDICATORS, str(tmp_path)) is first
+    assert len(calls) == 2
+
+    # 新进程（空的进程内缓存）从磁盘 mmap 挂载，内容一致
+    monkeypatch.setattr(market_data, "_LOADED", {})
+    attached = MarketData.load_or_build(df, 4, TECHNICAL_INDICATORS, str(tmp_path))
+    assert attached is not first
+    for name in ("prices", "features", "market"):
+        np.testing.assert_array_equal(getattr(attached, name), getattr(first, name))
+
+
+def test_load_or_build_keys_on_content_and_config(tmp_path):
+    df = make_market_df(n_days=30, n_stocks=4)
+    MarketData.load_or_build(df, 4, TECHNICAL_INDICATORS, str(tmp_path))
+    MarketData.load_or_build(df, 4, TECHNICAL_INDICATORS[:2], str(tmp_path))
+    changed = df.copy()
+    changed.loc[0, "close"] += 1.0
+    data = MarketData.load_or_build(changed, 4, TECHNICAL_INDICATORS, str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 3
+    assert data.prices[0, 0] == np.float32(changed.loc[0, "close"])
+
+
+def _fill_cache(cache_dir, n_entries):
+    """写入 n_entries 个缓存条目，按写入先后设置递增的最近使用时间，返回由旧到新的目录列表。"""
+    paths = []
+    for i in range(n_entries):
+        MarketData.load_or_build(make_market_df(n_days=30, n_stocks=4, seed=i), 4, TECHNICAL_INDICATORS, cache_dir)
+    for i, name in enumerate(sorted(os.listdir(cache_dir), key=lambda n: os.path.getmtime(os.path.join(cache_dir, n)))):
+        path = os.path.join(cache_dir, name)
+        os.utime(os.path.join(path, "meta.json"), (1_000_000 + i, 1_000_000 + i))
+        paths.append(path)
+    return paths
+
+
+def test_prune_cache_evicts_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path)
+    paths = _fill_cache(cache_dir, 4)
+    size = market_data._dir_size(paths[0])
+
+    removed = prune_cache(cache_dir, max_bytes=2 * size + size // 2, max_age_days=None)
+    assert removed == paths[:2]
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(p) for p in paths[2:])
+
+    # keep 中的条目即使最旧也保留
+    removed = prune_cache(cache_dir, max_bytes=0, max_age_days=None, keep=(os.path.basename(paths[2]),))
+    assert removed == paths[3:]
+
+
+def test_prune_cache_by_age_and_stale_temp_dirs(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    paths = _fill_cache(cache_dir, 2)
+    os.utime(os.path.join(paths[1], "meta.json"))
+    temp = os.path.join(cache_dir, ".partial.abc")
+    os.makedirs(temp)
+    os.utime(temp, (0, 0))
+
+    removed = prune_cache(cache_dir, max_bytes=None, max_age_days=30)
+    assert sorted(removed) == sorted([paths[0], temp])
+    assert os.listdir(cache_dir) == [os.path.basename(paths[1])]
+
+
+def test_hit_refreshes_recency(tmp_path):
+    cache_dir = str(tmp_path)
+    paths = _fill_cache(cache_dir, 2)
+    market_data._LOADED.clear()
+    MarketData.load_or_build(make_market_df(n_days=30, n_stocks=4, seed=0), 4, TECHNICAL_INDICATORS, cache_dir)
+    size = market_data._dir_size(paths[0])
+    assert prune_cache(cache_dir, max_bytes=size, max_age_days=None) == [paths[1]]
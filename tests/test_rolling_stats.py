@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from src.envs.rolling_stats import RollingRiskStats
+
+
+def _recompute(returns, values, initial_value, window):
+    """按完整历史重算：最近 window 期收益的均值/标准差（ddof=0）与相对历史峰值的回撤。"""
+    recent = np.asarray(returns[-window:])
+    peak = max([initial_value] + list(values))
+    drawdown = max(0.0, (peak - values[-1]) / max(peak, 1e-8))
+    risk = float(np.std(recent, ddof=0)) if len(returns) >= window else 0.0
+    return float(recent.mean()), float(np.var(recent, ddof=0)), risk, drawdown
+
+
+@pytest.mark.parametrize("window", [1, 5, 20])
+def test_single_account_matches_full_window_recompute(window):
+    rng = np.random.default_rng(window)
+    stats = RollingRiskStats(window=window)
+    stats.reset(10_000.0)
+    returns, values, value = [], [], 10_000.0
+    for _ in range(200):
+        ret = float(rng.normal(0.0005, 0.02))
+        value *= 1.0 + ret
+        returns.append(ret)
+        values.append(value)
+        stats.update(ret, value)
+
+        mean, var, risk, drawdown = _recompute(returns, values, 10_000.0, window)
+        assert stats.mean[0] == pytest.approx(mean, rel=1e-9, abs=1e-12)
+        assert stats.var[0] == pytest.approx(var, rel=1e-6, abs=1e-12)
+        assert stats.risk_of(0) == pytest.approx(risk, rel=1e-6, abs=1e-12)
+        assert stats.drawdown[0] == pytest.approx(drawdown, rel=1e-12, abs=1e-15)
+
+
+def test_batched_accounts_match_single_account_updates():
+    rng = np.random.default_rng(7)
+    n_accounts, window = 4, 20
+    batched = RollingRiskStats(window=window, num_accounts=n_accounts)
+    singles = [RollingRiskStats(window=window) for _ in range(n_accounts)]
+    batched.reset(10_000.0)
+    for s in singles:
+        s.reset(10_000.0)
+
+    value = np.full(n_accounts, 10_000.0)
+    for _ in range(120):
+        ret = rng.normal(0.0, 0.02, n_accounts)
+        value = value * (1.0 + ret)
+        batched.update(ret, value)
+        for m, s in enumerate(singles):
+            s.update(ret[m], value[m])
+
+    for m, s in enumerate(singles):
+        assert batched.mean[m] == pytest.approx(s.mean[0], rel=1e-12, abs=1e-15)
+        assert batched.risk()[m] == pytest.approx(s.risk_of(0), rel=1e-12, abs=1e-15)
+        assert batched.drawdown[m] == pytest.approx(s.drawdown[0], rel=1e-12, abs=1e-15)
+
+
+def test_partial_reset_and_state_roundtrip():
+    rng = np.random.default_rng(3)
+    stats = RollingRiskStats(window=5, num_accounts=3)
+    stats.reset(100.0)
+    for _ in range(8):
+        stats.update(rng.normal(0.0, 0.02, 3), 100.0 * (1.0 + rng.normal(0.0, 0.05, 3)))
+
+    snapshot = stats.get_state()
+    stats.reset(50.0, rows=np.array([1]))
+    assert stats.count.tolist() == [8, 0, 8]
+    assert stats.peak[1] == 50.0 and stats.risk()[1] == 0.0
+
+    stats.set_state(snapshot)
+    assert stats.count.tolist() == [8, 8, 8]
+    np.testing.assert_array_equal(stats.get_state()["m2"], snapshot["m2"])
+    with pytest.raises(ValueError):
+        RollingRiskStats(window=4, num_accounts=3).set_state(snapshot)
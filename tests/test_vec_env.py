@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from conftest import env_kwargs, make_market_df
+from src.envs.env_stocktrading import StockTradingEnv
+from src.envs.vec_env_stocktrading import StockTradingVecEnv
+
+
+@pytest.mark.parametrize("reward_mode", ["return", "shaped"])
+def test_batched_accounts_match_single_envs(reward_mode):
+    """M 个账户的批量环境与 M 个独立 StockTradingEnv 在相同动作下逐步一致（含回合结束时的终止观测）。"""
+    n_stocks, n_envs = 6, 4
+    df = make_market_df(n_days=70, n_stocks=n_stocks, seed=11)
+    kwargs = dict(env_kwargs(n_stocks), top_k=3, reward_mode=reward_mode)
+    singles = [StockTradingEnv(df=df, **kwargs) for _ in range(n_envs)]
+    venv = StockTradingVecEnv(StockTradingEnv(df=df, **kwargs), n_envs, random_start=False)
+
+    obs = venv.reset()
+    np.testing.assert_allclose(obs, np.stack([e.reset()[0] for e in singles]), atol=1e-5)
+
+    rng = np.random.default_rng(0)
+    for _ in range(venv.max_step):
+        actions = rng.uniform(-1.0, 1.0, (n_envs, n_stocks)).astype(np.float32)
+        obs, rewards, dones, infos = venv.step(actions)
+        for m, env in enumerate(singles):
+            single_obs, reward, terminated, truncated, _ = env.step(actions[m])
+            assert dones[m] == (terminated or truncated)
+            # 单环境按 float32 估值持仓市值，批量环境按 float64，收益只差 float32 舍入
+            assert rewards[m] == pytest.approx(reward, abs=1e-6)
+            expected_obs = infos[m]["terminal_observation"] if dones[m] else obs[m]
+            np.testing.assert_allclose(single_obs, expected_obs, atol=1e-4)
+            if not dones[m]:
+                np.testing.assert_array_equal(venv.holdings[m], env.holdings)
+                assert venv.cash[m] == pytest.approx(env.cash, rel=1e-9)
+    assert dones.all()
+
+
+def test_seeded_random_starts_are_reproducible():
+    df = make_market_df(n_days=90, n_stocks=4, seed=2)
+    template = StockTradingEnv(df=df, **env_kwargs(4))
+    first = StockTradingVecEnv(template, 6, min_episode_steps=20, seed=3)
+    second = StockTradingVecEnv(template, 6, min_episode_steps=20, seed=3)
+    first.reset()
+    second.reset()
+    np.testing.assert_array_equal(first.start_days, second.start_days)
+    assert (first.end_days - first.start_days >= 20).all()
+    assert len(set(first.start_days.tolist())) > 1